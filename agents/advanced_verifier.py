@@ -1,23 +1,22 @@
 import sys
 import json
-import asyncio
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.gemini.client import GeminiClient
-from db.client import get_connection
+from utils.gemini.client import get_gemini_client
 from agents.prompts import ADVANCED_VERIFIER_PROMPT
 
-gemini_client = GeminiClient()
+gemini_client = get_gemini_client()
 
-async def verify(prompt, model_output):
+async def verify(prompt, model_output, client=None):
+    """Gemini's verdict on the answer; raises if Gemini is unavailable so callers don't score it 0."""
+    system_prompt = ADVANCED_VERIFIER_PROMPT.render(
+        q=prompt,
+        model_output=model_output,
+    )
+    response = await (client or gemini_client).agenerate_content(system_prompt)
     try:
-        system_prompt = ADVANCED_VERIFIER_PROMPT.format(
-            q=prompt,
-            model_output=model_output,
-        )
-        response = await asyncio.to_thread(gemini_client.generate_content, system_prompt)
         print(response)
         cleaned_response = response.replace("```json", "").replace("```", "").strip()
         data = json.loads(cleaned_response)
@@ -25,7 +24,7 @@ async def verify(prompt, model_output):
             "accuracy": float(data.get("accuracy", 0.0)),
             "passed": str(data.get("passed", "false")).lower() == "true"
         }
-    except Exception as e:
+    except (ValueError, TypeError, AttributeError) as e:
         print("Error during verification:", e)
         return {
             "accuracy": 0.0,
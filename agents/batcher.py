@@ -0,0 +1,75 @@
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.inference import arun, arun_batch, failed_result
+from agents.generation import profile_key
+
+
+class MicroBatcher:
+    """Coalesces concurrent completions for the same model into one list-prompt vLLM request.
+
+    A batch is sent once it holds `max_batch_size` prompts or `max_wait_ms` after its first
+    prompt arrived, whichever comes first. Only prompts with the same generation profile share
+    a batch, since sampling settings apply to the whole request. State is per instance and not thread-safe, so use
+    it from a single event loop (the shared one in utils.aio).
+    """
+
+    def __init__(self, max_batch_size=16, max_wait_ms=5, send=arun_batch):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.send = send
+        self._batches = {}  # (model_name, provider, profile key) -> [(prompt, future)]
+        self._timers = {}
+        self.stats = {"requests": 0, "batches": 0, "full_flushes": 0, "timed_flushes": 0, "max_batch": 0}
+
+    async def run(self, model_name, provider, prompt, profile=None):
+        """Same contract as agents.inference.arun, but may share the HTTP call with other prompts."""
+        self.stats["requests"] += 1
+        if self.max_batch_size <= 1:
+            self.stats["batches"] += 1
+            return await arun(model_name, provider, prompt, profile)
+
+        loop = asyncio.get_running_loop()
+        key = (model_name, provider, profile_key(profile))
+        future = loop.create_future()
+        batch = self._batches.setdefault(key, [])
+        batch.append((prompt, future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key, "full_flushes")
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait_ms / 1000, self._flush, key, "timed_flushes")
+        return await future
+
+    def _flush(self, key, reason):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(key, None)
+        if not batch:
+            return
+        self.stats["batches"] += 1
+        self.stats[reason] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        asyncio.ensure_future(self._send(key, batch))
+
+    async def _send(self, key, batch):
+        model_name, provider, profile = key
+        try:
+            # The key's tuples serialize to the same JSON as the profile's lists
+            results = await self.send(model_name, provider, [prompt for prompt, _ in batch], dict(profile or ()))
+        except Exception as e:
+            print(f"[BATCHER] {model_name} batch of {len(batch)} failed: {e}")
+            results = [failed_result() for _ in batch]
+        for (_, future), result in zip(batch, results):
+            # A caller may have been cancelled (client disconnect) while the batch was in flight
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["avg_batch"] = stats["requests"] / (stats["batches"] or 1)
+        stats["waiting"] = sum(len(batch) for batch in self._batches.values())
+        return stats
@@ -3,32 +3,84 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.gemini.client import GeminiClient
-from db.client import get_connection
+from utils.gemini.client import get_gemini_client
+from utils.router.config import load_config
+from utils.router.routing_table import get_routing_table
 from agents.prompts import DOMAIN_CLASSIFIER_PROMPT
+from agents.local_classifier import get_local_classifier, log_classification
 
-gemini_client = GeminiClient()
+FALLBACK_DOMAIN = "Open-Ended Q&A / Conversational Quality"
 
-def classify(prompt):
+config = load_config()
+gemini_client = get_gemini_client(config)
+
+def _classifier_prompt(prompt):
+    domains_list = get_routing_table(config).domain_names()
+    formatted_domains = "\n".join(f"- {name}" for name in domains_list)
+    system_prompt = DOMAIN_CLASSIFIER_PROMPT.render(
+        domains=formatted_domains,
+        prompt=prompt
+    )
+    return system_prompt, domains_list
+
+def _check_domain(domain, domains_list):
+    domain = domain.strip()
+    if domain not in domains_list:
+        raise ValueError(f"Unknown domain '{domain}' returned by classifier")
+    return domain
+
+def classify_llm(prompt):
+    """Ask Gemini for the domain; raises if the call fails or the answer is not a known domain."""
+    system_prompt, domains_list = _classifier_prompt(prompt)
+    return _check_domain(gemini_client.generate_content(system_prompt), domains_list)
+
+async def aclassify_llm(prompt):
+    system_prompt, domains_list = _classifier_prompt(prompt)
+    return _check_domain(await gemini_client.agenerate_content(system_prompt), domains_list)
+
+def _classify_local(prompt):
+    threshold = config.get("classifier", {}).get("confidence_threshold", 0.35)
+    domain, confidence = get_local_classifier().predict(prompt)
+    if domain is not None and confidence >= threshold:
+        return domain
+    return None
+
+def _log_llm(prompt, domain):
+    if config.get("classifier", {}).get("log_llm_classifications", True):
+        log_classification(prompt, domain)
+
+def classify_with_source(prompt):
+    """Return (domain, source) where source is 'local', 'llm' or 'fallback'."""
+    domain = _classify_local(prompt)
+    if domain is not None:
+        return domain, "local"
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM domains")
-        domains_list = [row['name'] for row in cur.fetchall()]
-        formatted_domains = "\n- ".join(domains_list)
-        system_prompt = DOMAIN_CLASSIFIER_PROMPT.format(
-            domains=formatted_domains,
-            prompt=prompt
-        )
-        return gemini_client.generate_content(system_prompt).strip()
+        domain = classify_llm(prompt)
+        _log_llm(prompt, domain)
+        return domain, "llm"
     except Exception as e:
         print("Error during domain classification:", e)
-        return "Open-Ended Q&A / Conversational Quality"
+        return FALLBACK_DOMAIN, "fallback"
+
+async def aclassify_with_source(prompt):
+    domain = _classify_local(prompt)
+    if domain is not None:
+        return domain, "local"
+    try:
+        domain = await aclassify_llm(prompt)
+        _log_llm(prompt, domain)
+        return domain, "llm"
+    except Exception as e:
+        print("Error during domain classification:", e)
+        return FALLBACK_DOMAIN, "fallback"
+
+def classify(prompt):
+    return classify_with_source(prompt)[0]
 
 def main():
     test_prompt = "How can I ensure my online accounts are secure?"
-    classification = classify(test_prompt)
-    print(f"Classified Domain: {classification}")
+    classification, source = classify_with_source(test_prompt)
+    print(f"Classified Domain: {classification} ({source})")
 
 if __name__ == "__main__":
     main()
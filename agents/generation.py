@@ -0,0 +1,53 @@
+import math
+
+
+def profile_key(profile):
+    """Hashable form of a profile, so requests are only batched with identical sampling settings."""
+    if not profile:
+        return None
+    return tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in sorted(profile.items()))
+
+
+class GenerationProfiles:
+    """Per-domain sampling settings (max_tokens, temperature, stop) for vLLM completions.
+
+    Configured profiles set the ceiling: `default` merged with `domains[<domain name>]`. Once a
+    model has served a domain `learned.min_usage` times, max_tokens shrinks to its observed p95
+    completion length times `learned.headroom`, so short-answer domains stop paying for decode
+    they never use. Truncated answers land at the cap and so pull the p95 up to it, which lets
+    the learned limit grow back by the headroom factor until it reaches the configured ceiling.
+    """
+
+    def __init__(self, settings, table=None):
+        self.default = settings.get("default", {})
+        self.domains = settings.get("domains") or {}
+        self.learned = settings.get("learned", {})
+        self.table = table
+        self.stats = {"profiles": 0, "learned": 0}
+
+    def configured(self, domain_name):
+        profile = dict(self.default)
+        profile.update(self.domains.get(domain_name) or {})
+        if not profile.get("stop"):
+            profile.pop("stop", None)
+        return profile
+
+    def get(self, model_id, domain_id):
+        self.stats["profiles"] += 1
+        profile = self.configured(self.table.domain_name(domain_id) if self.table else None)
+        if not self.learned.get("enabled") or self.table is None or "max_tokens" not in profile:
+            return profile
+        row = self.table.metrics(model_id, domain_id)
+        if not row or row.get("completion_tokens_p95") is None:
+            return profile
+        if (row.get("usage_count") or 0) < self.learned.get("min_usage", 20):
+            return profile
+        learned = math.ceil(row["completion_tokens_p95"] * self.learned.get("headroom", 1.5))
+        learned = max(learned, self.learned.get("min_tokens", 16))
+        if learned < profile["max_tokens"]:
+            profile["max_tokens"] = learned
+            self.stats["learned"] += 1
+        return profile
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -1,8 +1,28 @@
+import sys
 import math
-import requests
+import json
+import time
+import asyncio
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-URL = "http://localhost:8000/v1/completions" # TODO: Make configurable
+from agents.model_registry import get_registry
+
+
+def post_completion(model_name, payload):
+    """POST to the least-loaded healthy endpoint serving `model_name`; raises on HTTP errors."""
+    with get_registry().lease(model_name) as endpoint:
+        resp = endpoint.client().post(endpoint.completions_url, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+
+
+async def apost_completion(model_name, payload):
+    with get_registry().lease(model_name) as endpoint:
+        resp = await endpoint.async_client().post(endpoint.completions_url, json=payload)
+        resp.raise_for_status()
+        return resp.json()
 
 
 def compute_confidence(choice):
@@ -15,7 +35,8 @@ def compute_confidence(choice):
     return math.exp(avg_logprob)
 
 
-def run(model_name, provider, prompt):
+def build_payload(model_name, provider, prompt, profile=None):
+    """Completion request; `profile` (see agents.generation) overrides max_tokens, temperature and stop."""
     payload = {
         "model": f"{provider}/{model_name}",
         "prompt": prompt,
@@ -23,28 +44,222 @@ def run(model_name, provider, prompt):
         "temperature": 0.2,
         "logprobs": 1
     }
-    try:
-        resp = requests.post(URL, json=payload, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
-        confidence = compute_confidence(data["choices"][0])
-        text = data["choices"][0]["text"].strip()
-        usage = data.get("usage", {})
-        return {
-            "response_text": text,
-            "confidence": confidence,
-            "prompt_tokens": usage.get("prompt_tokens", 0),
-            "completion_tokens": usage.get("completion_tokens", 0),
-            "total_tokens": usage.get("total_tokens", 0),
+    if profile:
+        payload.update(profile)
+    return payload
+
+
+def parse_response(data):
+    confidence = compute_confidence(data["choices"][0])
+    text = data["choices"][0]["text"].strip()
+    usage = data.get("usage", {})
+    return {
+        "response_text": text,
+        "confidence": confidence,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "failed": 0
+    }
+
+
+def split_prompt_tokens(total, prompts):
+    """Apportion a batch's prompt_tokens across its prompts by character length."""
+    lengths = [max(len(p), 1) for p in prompts]
+    shares = [total * n // sum(lengths) for n in lengths]
+    shares[-1] += total - sum(shares)
+    return shares
+
+
+def parse_batch_response(data, prompts):
+    """Demultiplex a list-prompt completion into one result per prompt, in prompt order.
+
+    vLLM only reports usage for the whole batch, so completion tokens are counted from each
+    choice's logprobs and prompt tokens are apportioned by prompt length.
+    """
+    if len(prompts) == 1:
+        return [parse_response(data)]
+    choices = {choice["index"]: choice for choice in data["choices"]}
+    usage = data.get("usage", {})
+    prompt_tokens = split_prompt_tokens(usage.get("prompt_tokens", 0), prompts)
+    results = []
+    for i in range(len(prompts)):
+        choice = choices.get(i)
+        if choice is None:
+            results.append(failed_result())
+            continue
+        logprobs = (choice.get("logprobs") or {}).get("token_logprobs") or []
+        completion_tokens = len(logprobs)
+        results.append({
+            "response_text": choice["text"].strip(),
+            "confidence": compute_confidence(choice),
+            "prompt_tokens": prompt_tokens[i],
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens[i] + completion_tokens,
             "failed": 0
-        }
+        })
+    return results
+
+
+def failed_result():
+    return {
+        "response_text": "",
+        "confidence": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "failed": 1
+    }
+
+
+def run(model_name, provider, prompt, profile=None):
+    payload = build_payload(model_name, provider, prompt, profile)
+    try:
+        return parse_response(post_completion(model_name, payload))
     except Exception as e:
         print(f"[ERROR] {model_name} failed: {e}")
+        return failed_result()
+
+
+async def arun(model_name, provider, prompt, profile=None):
+    payload = build_payload(model_name, provider, prompt, profile)
+    try:
+        return parse_response(await apost_completion(model_name, payload))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[ERROR] {model_name} failed: {e}")
+        return failed_result()
+
+
+def run_batch(model_name, provider, prompts, profile=None):
+    """One /v1/completions call for a list of prompts; returns one result per prompt."""
+    payload = build_payload(model_name, provider, list(prompts), profile)
+    try:
+        return parse_batch_response(post_completion(model_name, payload), prompts)
+    except Exception as e:
+        if len(prompts) > 1:
+            # One bad prompt shouldn't fail its neighbours: fall back to single requests
+            print(f"[ERROR] {model_name} batch of {len(prompts)} failed, retrying singly: {e}")
+            return [run(model_name, provider, prompt, profile) for prompt in prompts]
+        print(f"[ERROR] {model_name} failed: {e}")
+        return [failed_result()]
+
+
+async def arun_batch(model_name, provider, prompts, profile=None):
+    payload = build_payload(model_name, provider, list(prompts), profile)
+    try:
+        return parse_batch_response(await apost_completion(model_name, payload), prompts)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if len(prompts) > 1:
+            print(f"[ERROR] {model_name} batch of {len(prompts)} failed, retrying singly: {e}")
+            return list(await asyncio.gather(*(arun(model_name, provider, p, profile) for p in prompts)))
+        print(f"[ERROR] {model_name} failed: {e}")
+        return [failed_result()]
+
+
+class StreamStats:
+    """Incremental confidence and token timing for a streamed completion."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.logprob_sum = 0.0
+        self.logprob_count = 0
+        self.tokens = 0
+        self.gap_sum = 0.0
+        self.chunks = []
+
+    def add(self, choice):
+        now = time.perf_counter()
+        text = choice.get("text") or ""
+        logprobs = (choice.get("logprobs") or {}).get("token_logprobs") or []
+        logprobs = [lp for lp in logprobs if lp is not None]
+        n_tokens = max(len(logprobs), 1 if text else 0)
+        if n_tokens == 0:
+            return ""
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            self.gap_sum += now - self.last_token_at
+        self.last_token_at = now
+        self.tokens += n_tokens
+        self.logprob_sum += sum(logprobs)
+        self.logprob_count += len(logprobs)
+        self.chunks.append(text)
+        return text
+
+    @property
+    def confidence(self):
+        if not self.logprob_count:
+            return 0.0
+        return math.exp(self.logprob_sum / self.logprob_count)
+
+    @property
+    def ttft_ms(self):
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started) * 1000
+
+    @property
+    def inter_token_ms(self):
+        # Average gap between consecutive streamed chunks
+        if len(self.chunks) < 2:
+            return None
+        return self.gap_sum / (len(self.chunks) - 1) * 1000
+
+    def result(self, usage=None):
+        usage = usage or {}
+        completion_tokens = usage.get("completion_tokens", self.tokens)
+        prompt_tokens = usage.get("prompt_tokens", 0)
         return {
-            "response_text": "",
-            "confidence": 0.0,
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "total_tokens": 0,
-            "failed": 1
+            "response_text": "".join(self.chunks).strip(),
+            "confidence": self.confidence,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": usage.get("total_tokens", prompt_tokens + completion_tokens),
+            "ttft_ms": self.ttft_ms,
+            "inter_token_ms": self.inter_token_ms,
+            "failed": 0
         }
+
+
+async def astream(model_name, provider, prompt, on_token=None, profile=None):
+    """Stream a completion over SSE, calling on_token(text, confidence) per chunk.
+
+    Returns the same result dict as arun() plus ttft_ms and inter_token_ms.
+    """
+    payload = build_payload(model_name, provider, prompt, profile)
+    payload["stream"] = True
+    payload["stream_options"] = {"include_usage": True}
+    stats = StreamStats()
+    usage = None
+    try:
+        with get_registry().lease(model_name) as endpoint:
+            async with endpoint.async_client().stream("POST", endpoint.completions_url, json=payload) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    for choice in chunk.get("choices") or []:
+                        text = stats.add(choice)
+                        if text and on_token:
+                            on_token(text, stats.confidence)
+        return stats.result(usage)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[ERROR] {model_name} stream failed: {e}")
+        result = failed_result()
+        result["ttft_ms"] = stats.ttft_ms
+        result["inter_token_ms"] = None
+        return result
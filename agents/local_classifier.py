@@ -0,0 +1,230 @@
+import re
+import sys
+import json
+import math
+import zlib
+import random
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ROOT = Path(__file__).parent.parent
+EVAL_SET_PATH = ROOT / "evaluation" / "eval_set.json"
+DATA_DIR = Path(__file__).parent / "data"
+MODEL_PATH = DATA_DIR / "local_classifier.json"
+SEED_PATH = DATA_DIR / "classifier_seed.jsonl"
+CLASSIFICATION_LOG_PATH = DATA_DIR / "classification_log.jsonl"
+
+# Seed order of the domains table (docs/db-schema.md); eval_set.json refers to domains by id
+DEFAULT_DOMAINS = {
+    1: "Math & Numerical Reasoning",
+    2: "Logic & Deductive Reasoning",
+    3: "General Knowledge",
+    4: "Summarization",
+    5: "Instruction Following",
+    6: "Classification",
+    7: "Code / Technical Reasoning",
+    8: "Safety & Compliance",
+    9: "Open-Ended Q&A / Conversational Quality",
+    10: "Stress / Edge Cases",
+}
+
+N_FEATURES = 1 << 18
+TOKEN_RE = re.compile(r"[a-z]+|\d+|[^\sa-z\d]")
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+
+def featurize(text):
+    """Hashed word, word-bigram, char-trigram and shape features with sublinear TF."""
+    text = text.lower()
+    tokens = TOKEN_RE.findall(text)
+    counts = {}
+
+    def add(feature):
+        idx = _hash(feature)
+        counts[idx] = counts.get(idx, 0) + 1
+
+    for token in tokens:
+        add("w:" + token)
+        if token.isdigit():
+            add("shape:num")
+        padded = f" {token} "
+        for i in range(len(padded) - 2):
+            add("c:" + padded[i:i + 3])
+    for a, b in zip(tokens, tokens[1:]):
+        add(f"b:{a}_{b}")
+    add(f"len:{min(len(tokens) // 5, 10)}")
+    if not text.rstrip().endswith(("?", ".", "!", '"', ")")):
+        add("shape:unterminated")
+    return {idx: 1.0 + math.log(c) for idx, c in counts.items()}
+
+
+class LocalDomainClassifier:
+    """TF-IDF over hashed n-grams with a multinomial logistic regression head."""
+
+    def __init__(self, labels=None, idf=None, weights=None, bias=None):
+        self.labels = labels or []
+        self.idf = idf or {}
+        self.weights = weights or {}  # feature -> per-label weights
+        self.bias = bias or [0.0] * len(self.labels)
+
+    def _vectorize(self, text):
+        features = featurize(text)
+        default_idf = self.idf.get(-1, 1.0)
+        vec = {idx: tf * self.idf.get(idx, default_idf) for idx, tf in features.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {idx: v / norm for idx, v in vec.items()}
+
+    def _logits(self, vec):
+        logits = list(self.bias)
+        for idx, value in vec.items():
+            row = self.weights.get(idx)
+            if row is None:
+                continue
+            for k, w in enumerate(row):
+                logits[k] += w * value
+        return logits
+
+    @staticmethod
+    def _softmax(logits):
+        top = max(logits)
+        exps = [math.exp(l - top) for l in logits]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def fit(self, texts, labels, epochs=40, lr=0.5, l2=1e-4, seed=0):
+        self.labels = sorted(set(labels))
+        label_index = {label: k for k, label in enumerate(self.labels)}
+        n_labels = len(self.labels)
+
+        doc_freq = {}
+        for text in texts:
+            for idx in featurize(text):
+                doc_freq[idx] = doc_freq.get(idx, 0) + 1
+        n_docs = len(texts)
+        self.idf = {idx: math.log((1 + n_docs) / (1 + df)) + 1.0 for idx, df in doc_freq.items()}
+        self.idf[-1] = math.log(1 + n_docs) + 1.0
+
+        data = [(self._vectorize(text), label_index[label]) for text, label in zip(texts, labels)]
+        self.weights = {}
+        self.bias = [0.0] * n_labels
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch * 0.1)
+            for vec, target in data:
+                probs = self._softmax(self._logits(vec))
+                grads = [p - (1.0 if k == target else 0.0) for k, p in enumerate(probs)]
+                for k in range(n_labels):
+                    self.bias[k] -= step * grads[k]
+                for idx, value in vec.items():
+                    row = self.weights.setdefault(idx, [0.0] * n_labels)
+                    for k in range(n_labels):
+                        row[k] -= step * (grads[k] * value + l2 * row[k])
+        return self
+
+    def predict(self, text):
+        """Return (label, probability) for the most likely domain."""
+        if not self.labels:
+            return None, 0.0
+        probs = self._softmax(self._logits(self._vectorize(text)))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[best], probs[best]
+
+    def save(self, path=MODEL_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "labels": self.labels,
+                "idf": {str(k): v for k, v in self.idf.items()},
+                "weights": {str(k): v for k, v in self.weights.items()},
+                "bias": self.bias,
+            }, f)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            labels=data["labels"],
+            idf={int(k): v for k, v in data["idf"].items()},
+            weights={int(k): v for k, v in data["weights"].items()},
+            bias=data["bias"],
+        )
+
+
+def _read_jsonl(path, texts, labels):
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            texts.append(entry["prompt"])
+            labels.append(entry["domain"])
+
+
+def load_training_data(eval_set_path=EVAL_SET_PATH, log_path=CLASSIFICATION_LOG_PATH,
+                       seed_path=SEED_PATH, domain_names=None):
+    """Labelled prompts from eval_set.json, the seed set and classifications logged from the LLM classifier."""
+    domain_names = domain_names or DEFAULT_DOMAINS
+    texts, labels = [], []
+    if eval_set_path:
+        with open(eval_set_path) as f:
+            for item in json.load(f):
+                texts.append(item["q"])
+                labels.append(domain_names[item["domain"]])
+    if seed_path:
+        _read_jsonl(seed_path, texts, labels)
+    if log_path:
+        _read_jsonl(log_path, texts, labels)
+    return texts, labels
+
+
+_log_lock = threading.Lock()
+
+def log_classification(prompt, domain, log_path=CLASSIFICATION_LOG_PATH):
+    log_path = Path(log_path)
+    with _log_lock:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            f.write(json.dumps({"prompt": prompt, "domain": domain}) + "\n")
+
+
+def train(save=True):
+    texts, labels = load_training_data()
+    model = LocalDomainClassifier().fit(texts, labels)
+    if save:
+        model.save()
+    return model
+
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_local_classifier():
+    """Load the saved model, training one from the available data if none exists yet."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    _model = LocalDomainClassifier.load()
+                except (OSError, ValueError, KeyError):
+                    _model = train()
+    return _model
+
+
+if __name__ == "__main__":
+    model = train()
+    print(f"[LOCAL CLASSIFIER] Trained on {len(load_training_data()[0])} prompts, saved to {MODEL_PATH}")
+    for prompt in ["What is 12 * 12?", "Summarize this article in two sentences.", "hello there!"]:
+        print(prompt, "->", model.predict(prompt))
@@ -0,0 +1,278 @@
+import re
+import ast
+import sys
+import math
+import time
+import operator
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.router.config import load_config
+
+NUMBER = r"-?\d+(?:,\d{3})*(?:\.\d+)?(?:\s*/\s*\d+)?%?"
+NUMBER_RE = re.compile(NUMBER)
+# Operands in an expression, where "100 / 4" is a division and not the fraction NUMBER reads
+OPERAND_RE = re.compile(r"\d+(?:\.\d+)?")
+# Where models state their result, most specific first; otherwise the last number is used
+ANSWER_NUMBER_RES = [
+    re.compile(r"\\boxed\{\s*(" + NUMBER + r")\s*\}"),
+    re.compile(r"\b(?:answer|result|total)\s*(?:is|=|:)\s*\$?\s*(" + NUMBER + r")", re.IGNORECASE),
+    re.compile(r"=\s*\$?\s*(" + NUMBER + r")"),
+]
+WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# A match right after one of these ("not Paris", "isn't 391") is a rejection, not an answer
+NEGATIONS = {"not", "no", "never", "nor", "isn't", "aren't", "wasn't", "weren't", "doesn't", "cannot", "can't"}
+YES_NO = {"yes": "yes", "true": "yes", "correct": "yes", "no": "no", "false": "no", "incorrect": "no"}
+# "B", "(B)", "B)", "B." or "B: Paris" as an expected answer
+CHOICE_EXPECTED_RE = re.compile(r"^\(?([A-Ea-e])\)?(?:[).:]\s*.*)?$")
+CHOICE_OUTPUT_RES = [
+    re.compile(r"\b(?i:answer|option|choice)\s*(?:is)?\s*:?\s*\(?([A-E])\b\)?"),
+    re.compile(r"^\s*\(?([A-E])(?:[).:]|\s*$)"),
+]
+
+# Spoken operators in arithmetic questions
+ARITHMETIC_WORDS = [
+    (re.compile(r"\b(?:the\s+)?square root of\s*"), "sqrt "),
+    (re.compile(r"\bmultiplied by\b|\btimes\b|×|(?<=\d)\s*x\s*(?=\d)"), " * "),
+    (re.compile(r"\bdivided by\b|÷"), " / "),
+    (re.compile(r"\bplus\b"), " + "),
+    (re.compile(r"\bminus\b"), " - "),
+    (re.compile(r"\^"), " ** "),
+    (re.compile(r"\bsquared\b"), " ** 2"),
+]
+# The whole prompt has to be an arithmetic question, so numbers in word problems or dates never are
+ARITHMETIC_PROMPT_RE = re.compile(
+    r"^\s*(?:what\s+is|what's|calculate|compute|evaluate|solve|find)?\s*:?\s*(?:the\s+value\s+of\s+)?"
+    r"(?P<expr>(?:[\d\s.+\-*/%()]|sqrt)+?)[\s?.=]*$",
+    re.IGNORECASE,
+)
+SQRT_RE = re.compile(r"sqrt\s*(\d+(?:\.\d+)?|\([^()]*\))")
+
+BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+UNARY_OPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+def words(text):
+    return WORD_RE.findall(str(text).lower())
+
+
+def parse_number(text):
+    """'1,234', '-3.5', '3/4' and '75%' as floats; None for anything else."""
+    text = str(text).strip().replace(",", "").rstrip(".")
+    scale = 1.0
+    if text.endswith("%"):
+        text, scale = text[:-1], 0.01
+    try:
+        if "/" in text:
+            numerator, denominator = text.split("/", 1)
+            return float(numerator) / float(denominator) * scale
+        return float(text) * scale
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def extract_number(output):
+    """The number an answer commits to: boxed, after 'answer is' or '=', else the last one."""
+    output = str(output)
+    for pattern in ANSWER_NUMBER_RES:
+        matches = pattern.findall(output)
+        if matches:
+            return parse_number(matches[-1])
+    matches = NUMBER_RE.findall(output)
+    return parse_number(matches[-1]) if matches else None
+
+
+def first_yes_no(text):
+    for word in words(text):
+        if word in YES_NO:
+            return YES_NO[word]
+    return None
+
+
+def extract_choice(output):
+    for pattern in CHOICE_OUTPUT_RES:
+        match = pattern.search(str(output))
+        if match:
+            return match.group(1).upper()
+    return None
+
+
+def negated(preceding_words):
+    return any(word in NEGATIONS for word in preceding_words[-2:])
+
+
+def find_phrase(text, phrase):
+    """'found', 'negated' when any occurrence follows a negation, or None when absent."""
+    text_words, phrase_words = words(text), words(phrase)
+    n = len(phrase_words)
+    starts = [i for i in range(len(text_words) - n + 1) if n > 0 and text_words[i:i + n] == phrase_words]
+    if not starts:
+        return None
+    return "negated" if any(negated(text_words[:i]) for i in starts) else "found"
+
+
+def arithmetic_expression(prompt):
+    """The expression in a pure arithmetic question ('What is 17 * 23?'), or None."""
+    text = str(prompt).lower()
+    for pattern, replacement in ARITHMETIC_WORDS:
+        text = pattern.sub(replacement, text)
+    match = ARITHMETIC_PROMPT_RE.match(text)
+    if not match:
+        return None
+    expr = SQRT_RE.sub(r"(\1) ** 0.5", match.group("expr").strip())
+    if len(OPERAND_RE.findall(expr)) < 2 and "**" not in expr:
+        return None  # a bare number is not a calculation
+    return expr
+
+
+def result_bits(op, left, right):
+    """Upper bound on the bit length of an int result, so huge ones are refused before computing them."""
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return 0  # floats overflow quickly on their own
+    if isinstance(op, ast.Pow):
+        return abs(left).bit_length() * abs(right)
+    if isinstance(op, ast.Mult):
+        return abs(left).bit_length() + abs(right).bit_length()
+    return 0
+
+
+def safe_eval(expr, max_exponent=100, max_bits=1024):
+    """Evaluate + - * / // % ** on numbers only (no names, calls or attributes); None if invalid.
+
+    Exponents are capped at max_exponent and int results at max_bits, since nested powers like
+    ((10**100)**100)**100 would otherwise tie up the caller computing an enormous integer.
+    """
+    def walk(node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+            return UNARY_OPS[type(node.op)](walk(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            left, right = walk(node.left), walk(node.right)
+            if isinstance(node.op, ast.Pow) and abs(right) > max_exponent:
+                raise ValueError("exponent too large")
+            if result_bits(node.op, left, right) > max_bits:
+                raise ValueError("result too large")
+            return BINARY_OPS[type(node.op)](left, right)
+        raise ValueError(f"unsupported expression: {ast.dump(node)}")
+
+    try:
+        value = walk(ast.parse(expr, mode="eval").body)
+        # Huge ints are exact, but do not fit in a float
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, complex) else None
+    except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError):
+        return None
+
+
+class LocalVerifier:
+    """Decides objective answers without an LLM call, in microseconds; None means escalate.
+
+    In order: arithmetic questions are computed (no expected answer needed), numeric answers
+    are compared within tolerance, yes/no and multiple-choice answers are normalized, and
+    short expected answers pass when they appear in the output. A short answer that does not
+    appear, or appears right after a negation ("not Paris"), is left to the judge, since the
+    output may paraphrase or reject it. Counts every decision by method, so get_stats() shows
+    how many judge calls it saved.
+    """
+
+    METHODS = ("empty", "arithmetic", "numeric", "yes_no", "choice", "phrase")
+
+    def __init__(self, rel_tol=1e-4, abs_tol=1e-6, short_answer_words=4, max_exponent=100,
+                 max_bits=1024):
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.short_answer_words = short_answer_words
+        self.max_exponent = max_exponent
+        self.max_bits = max_bits
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "decided": 0, "escalated": 0, "time_us": 0.0}
+        self.by_method = {method: 0 for method in self.METHODS}
+
+    def close(self, a, b):
+        return math.isclose(a, b, rel_tol=self.rel_tol, abs_tol=self.abs_tol)
+
+    def check_number(self, target, output):
+        """1.0 / 0.0, or None when the target is in the output but not the number picked as the answer.
+
+        Working often ends on another number ("It is 25, since 4 x 25 = 100"), so a wrong pick
+        that still mentions the target is left to the judge rather than failed. A target right
+        after a negation ("Not 391") is left to the judge too, rather than passed.
+        """
+        output = str(output)
+        mentions = []  # whether each occurrence of the target follows a negation
+        for match in NUMBER_RE.finditer(output):
+            number = parse_number(match.group())
+            if number is not None and self.close(number, target):
+                mentions.append(negated(words(output[:match.start()])))
+        found = extract_number(output)
+        if found is not None and self.close(found, target) and not any(mentions):
+            return 1.0
+        return None if mentions else 0.0
+
+    def decide(self, q, output, expected=None):
+        """(accuracy, method) or None."""
+        if not str(output).strip():
+            return 0.0, "empty"
+        if expected is None:
+            expr = arithmetic_expression(q) if q else None
+            value = safe_eval(expr, self.max_exponent, self.max_bits) if expr else None
+            accuracy = None if value is None else self.check_number(value, output)
+            return None if accuracy is None else (accuracy, "arithmetic")
+        expected = str(expected).strip()
+        number = parse_number(expected)
+        if number is not None:
+            accuracy = self.check_number(number, output)
+            return None if accuracy is None else (accuracy, "numeric")
+        answer = YES_NO.get(expected.lower().rstrip("."))
+        if answer is not None:
+            found = first_yes_no(output)
+            return None if found is None else (float(found == answer), "yes_no")
+        choice = CHOICE_EXPECTED_RE.match(expected)
+        if choice:
+            found = extract_choice(output)
+            return None if found is None else (float(found == choice.group(1).upper()), "choice")
+        if len(words(expected)) <= self.short_answer_words and find_phrase(output, expected) == "found":
+            return 1.0, "phrase"
+        return None
+
+    def verify(self, q, output, expected=None):
+        """Accuracy 1.0 / 0.0 when the answer can be checked mechanically, None to escalate."""
+        t1 = time.perf_counter()
+        decision = self.decide(q, output, expected)
+        elapsed_us = (time.perf_counter() - t1) * 1e6
+        with self._lock:
+            self.stats["checked"] += 1
+            self.stats["time_us"] += elapsed_us
+            if decision is None:
+                self.stats["escalated"] += 1
+            else:
+                self.stats["decided"] += 1
+                self.by_method[decision[1]] += 1
+        return None if decision is None else decision[0]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, by_method=dict(self.by_method))
+        stats["avg_us"] = stats.pop("time_us") / (stats["checked"] or 1)
+        # Every decided item is one LLM judge call that was not made
+        stats["judge_calls_saved"] = stats["decided"]
+        return stats
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+def get_local_verifier(config=None):
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                settings = (config or load_config()).get("local_verifier", {})
+                _verifier = LocalVerifier(**settings)
+    return _verifier
+
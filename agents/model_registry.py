@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import weakref
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.router.config import load_config
+
+TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=30.0)
+
+load_dotenv()
+
+
+def parse_vllm_metrics(text):
+    """(running, waiting) sequences from vLLM's Prometheus /metrics, summed over served models."""
+    totals = {"vllm:num_requests_running": 0.0, "vllm:num_requests_waiting": 0.0}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in totals:
+            try:
+                totals[name] += float(line.rsplit(" ", 1)[-1])
+            except ValueError:
+                pass
+    return totals["vllm:num_requests_running"], totals["vllm:num_requests_waiting"]
+
+
+def is_endpoint_failure(exc):
+    """Connection errors and 5xx count against an endpoint; 4xx are the request's fault."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return False
+
+
+class Endpoint:
+    """One vLLM server with its own keep-alive connection pools and health state."""
+
+    def __init__(self, url):
+        base_url = url.rstrip("/")
+        for suffix in ("/v1/completions", "/v1"):
+            if base_url.endswith(suffix):
+                base_url = base_url[:-len(suffix)]
+        self.base_url = base_url
+        self.completions_url = base_url + "/v1/completions"
+        self.health_url = base_url + "/health"
+        self.metrics_url = base_url + "/metrics"
+        self.healthy = True
+        self.outstanding = 0
+        # Scheduler queue reported by vLLM itself (None until /metrics has been scraped)
+        self.running = None
+        self.waiting = None
+        self.consecutive_failures = 0
+        self.stats = {"requests": 0, "errors": 0, "marked_down": 0}
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+
+    def client(self):
+        """Shared keep-alive client for synchronous callers."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(timeout=TIMEOUT, limits=LIMITS)
+        return self._client
+
+    def async_client(self):
+        """Keep-alive client bound to the running event loop (httpx clients cannot cross loops)."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+            self._async_clients[loop] = client
+        return client
+
+
+class ModelRegistry:
+    """Maps each model to the vLLM endpoints serving it and balances requests across them.
+
+    Requests go to the healthy endpoint with the fewest outstanding requests. An endpoint is
+    marked down after `failure_threshold` consecutive connection errors or 5xx responses and
+    comes back once the health checker sees /health answer again. With `scrape_metrics` the
+    checker also reads each server's running/waiting sequences from /metrics.
+    """
+
+    def __init__(self, default_urls, model_urls=None, failure_threshold=3, health_interval_s=10, health_timeout_s=2,
+                 scrape_metrics=False):
+        self.failure_threshold = failure_threshold
+        self.scrape_metrics = scrape_metrics
+        self.health_interval_s = health_interval_s
+        self.health_timeout_s = health_timeout_s
+        self._endpoints = {}  # base url -> Endpoint, shared by models served from the same server
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.default = [self._endpoint(url) for url in default_urls]
+        self.models = {
+            model_name: [self._endpoint(url) for url in urls]
+            for model_name, urls in (model_urls or {}).items()
+        }
+
+    def _endpoint(self, url):
+        endpoint = Endpoint(url)
+        return self._endpoints.setdefault(endpoint.base_url, endpoint)
+
+    def endpoints(self, model_name):
+        return self.models.get(model_name) or self.default
+
+    def healthy_endpoints(self, model_name):
+        with self._lock:
+            return [e for e in self.endpoints(model_name) if e.healthy]
+
+    def pick(self, model_name):
+        with self._lock:
+            endpoints = self.endpoints(model_name)
+            # With every replica down keep trying them rather than failing every request
+            candidates = [e for e in endpoints if e.healthy] or endpoints
+            fewest = min(e.outstanding for e in candidates)
+            endpoint = random.choice([e for e in candidates if e.outstanding == fewest])
+            endpoint.outstanding += 1
+            endpoint.stats["requests"] += 1
+            return endpoint
+
+    def release(self, endpoint, failed=False):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if not failed:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.stats["errors"] += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+                self._mark(endpoint, False)
+
+    @contextmanager
+    def lease(self, model_name):
+        """Pick an endpoint for one request and account for it until the block exits."""
+        endpoint = self.pick(model_name)
+        failed = False
+        try:
+            yield endpoint
+        except Exception as e:
+            failed = is_endpoint_failure(e)
+            raise
+        finally:
+            self.release(endpoint, failed)
+
+    def _mark(self, endpoint, healthy):
+        endpoint.healthy = healthy
+        endpoint.consecutive_failures = 0
+        if healthy:
+            print(f"[REGISTRY] {endpoint.base_url} is back up")
+        else:
+            endpoint.stats["marked_down"] += 1
+            print(f"[REGISTRY] {endpoint.base_url} marked down")
+
+    def check(self):
+        for endpoint in list(self._endpoints.values()):
+            try:
+                resp = endpoint.client().get(endpoint.health_url, timeout=self.health_timeout_s)
+                healthy = resp.status_code == 200
+            except Exception:
+                healthy = False
+            with self._lock:
+                if healthy != endpoint.healthy:
+                    self._mark(endpoint, healthy)
+            if healthy and self.scrape_metrics:
+                self.scrape(endpoint)
+
+    def scrape(self, endpoint):
+        try:
+            resp = endpoint.client().get(endpoint.metrics_url, timeout=self.health_timeout_s)
+            resp.raise_for_status()
+            endpoint.running, endpoint.waiting = parse_vllm_metrics(resp.text)
+        except Exception:
+            # Stale queue numbers are worse than none
+            endpoint.running = endpoint.waiting = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._health_loop, name="model-registry-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval_s):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[REGISTRY] Health check failed: {e}")
+                time.sleep(1)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                endpoint.base_url: dict(
+                    endpoint.stats, healthy=endpoint.healthy, outstanding=endpoint.outstanding,
+                    running=endpoint.running, waiting=endpoint.waiting,
+                )
+                for endpoint in self._endpoints.values()
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry(config=None):
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                settings = (config or load_config()).get("inference", {})
+                endpoints = settings.get("endpoints", {})
+                health = settings.get("health_check", {})
+                # VLLM_URLS (comma separated) overrides the configured default replicas
+                default_urls = os.getenv("VLLM_URLS")
+                default_urls = default_urls.split(",") if default_urls else endpoints.get("default", ["http://localhost:8000"])
+                registry = ModelRegistry(
+                    default_urls,
+                    model_urls=endpoints.get("models"),
+                    failure_threshold=health.get("failure_threshold", 3),
+                    health_interval_s=health.get("interval_s", 10),
+                    health_timeout_s=health.get("timeout_s", 2),
+                    scrape_metrics=health.get("scrape_metrics", False),
+                )
+                registry.start()
+                _registry = registry
+    return _registry
@@ -0,0 +1,292 @@
+import sys
+import math
+import random
+import atexit
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from psycopg2.extras import execute_values
+
+from db.client import connection, cursor
+from agents.scorer import DEFAULT_LATENCY_BOUNDS, get_engine, normalize_latency
+
+UPSERT_SQL = """
+    INSERT INTO bandit_stats AS b (model_id, domain_id, pulls, reward_sum, reward_sq_sum, updated_at)
+    VALUES %s
+    ON CONFLICT (model_id, domain_id) DO UPDATE SET
+        pulls = b.pulls + EXCLUDED.pulls,
+        reward_sum = b.reward_sum + EXCLUDED.reward_sum,
+        reward_sq_sum = b.reward_sq_sum + EXCLUDED.reward_sq_sum,
+        updated_at = NOW();
+"""
+
+
+def compute_reward(passed, latency_ms, cost, latency_weight, latency_bounds=DEFAULT_LATENCY_BOUNDS):
+    """Close to 1 for a fast, free, adequate answer; 0 for a failed or rejected one.
+
+    Pass the scorer's fleet-derived `latency_bounds` so rewards and scores share one latency scale.
+    """
+    if not passed:
+        return 0.0
+    speed = float(normalize_latency(latency_ms, *latency_bounds))
+    return ((1.0 - latency_weight) + latency_weight * speed) / (1.0 + cost)
+
+
+def metric_priors(config, max_pulls=20):
+    """(model_id, domain_id) -> pseudo (pulls, reward_sum, reward_sq_sum) from model_metrics.
+
+    Each served pair counts as up to `max_pulls` observations of its expected reward
+    (accuracy x compute_reward of its mean latency and cost), so bandits start from what the
+    scorer already knows instead of treating every model as untried.
+    """
+    engine = get_engine(config)
+    latency_bounds = engine.latency_scale()
+    _, candidates = engine.table.snapshot()
+    priors = {}
+    for domain_id, rows in candidates.items():
+        for row in rows:
+            if not row["usage_count"]:
+                continue
+            pulls = min(row["usage_count"], max_pulls)
+            reward = row["accuracy_score"] * compute_reward(
+                True, row["latency_ms"], row["cost"], config["weights"]["latency"], latency_bounds
+            )
+            priors[(row["id"], domain_id)] = (pulls, pulls * reward, pulls * reward * reward)
+    return priors
+
+
+class BanditStats:
+    """Per-(model, domain) sufficient statistics: pulls, reward sum and reward sum of squares.
+
+    Updates land in memory immediately and are persisted as deltas to bandit_stats by a
+    background thread, so several router processes can share (and add to) the same counts.
+    Priors (see metric_priors) are added to what get() returns but never persisted.
+    """
+
+    def __init__(self, flush_interval_s=10.0, persist=True):
+        self.flush_interval_s = flush_interval_s
+        self.persist = persist
+        self._stats = {}  # (model_id, domain_id) -> [pulls, reward_sum, reward_sq_sum]
+        self._dirty = {}  # same shape, not yet flushed
+        self._priors = {}  # same shape, pseudo-observations only seen by get()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, model_id, domain_id):
+        with self._lock:
+            stats = self._stats.get((model_id, domain_id)) or (0, 0.0, 0.0)
+            prior = self._priors.get((model_id, domain_id)) or (0, 0.0, 0.0)
+            return tuple(a + b for a, b in zip(stats, prior))
+
+    def set_priors(self, priors):
+        with self._lock:
+            self._priors = dict(priors)
+
+    def add(self, model_id, domain_id, reward):
+        with self._lock:
+            for target in (self._stats, self._dirty):
+                stats = target.setdefault((model_id, domain_id), [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += reward
+                stats[2] += reward * reward
+
+    def load(self):
+        with cursor() as cur:
+            cur.execute("SELECT model_id, domain_id, pulls, reward_sum, reward_sq_sum FROM bandit_stats;")
+            rows = cur.fetchall()
+        with self._lock:
+            self._stats = {
+                (row["model_id"], row["domain_id"]): [row["pulls"], row["reward_sum"], row["reward_sq_sum"]]
+                for row in rows
+            }
+            # Anything recorded before the load is not in the table yet
+            for key, (pulls, reward_sum, reward_sq_sum) in self._dirty.items():
+                stats = self._stats.setdefault(key, [0, 0.0, 0.0])
+                stats[0] += pulls
+                stats[1] += reward_sum
+                stats[2] += reward_sq_sum
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        rows = [(model_id, domain_id, *stats) for (model_id, domain_id), stats in dirty.items()]
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                execute_values(cur, UPSERT_SQL, rows, template="(%s, %s, %s, %s, %s, NOW())")
+                cur.close()
+        except Exception as e:
+            print(f"[BANDIT] Flush failed, will retry: {e}")
+            with self._lock:
+                for key, (pulls, reward_sum, reward_sq_sum) in dirty.items():
+                    stats = self._dirty.setdefault(key, [0, 0.0, 0.0])
+                    stats[0] += pulls
+                    stats[1] += reward_sum
+                    stats[2] += reward_sq_sum
+            return 0
+        return len(rows)
+
+    def start(self):
+        if not self.persist or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="bandit-stats", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval_s):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        if self.persist:
+            self.flush()
+
+
+class RoutingPolicy:
+    """Chooses which models to try for a domain and learns from the verified outcome."""
+
+    name = "base"
+
+    def rank(self, domain_id, candidates, k=None, penalty=None):
+        """Model ids from `candidates`, best first, at most k of them.
+
+        `penalty(model_id)` in [0, 1) scales a model's score down, e.g. by its live load.
+        """
+        raise NotImplementedError
+
+    def update(self, model_id, domain_id, reward):
+        pass
+
+    def get_stats(self):
+        return {"policy": self.name}
+
+
+class ScorerPolicy(RoutingPolicy):
+    """The weighted metric score from agents.scorer: greedy on rolling averages, no exploration."""
+
+    name = "scorer"
+
+    def __init__(self, config):
+        self.config = config
+
+    def rank(self, domain_id, candidates, k=None, penalty=None):
+        allowed = set(candidates)
+        scored = [
+            (score * (1.0 - penalty(model_id)) if penalty else score, model_id)
+            for score, model_id, _ in get_engine(self.config).rank(domain_id, self.config["weights"])
+            if model_id in allowed
+        ]
+        return [model_id for _, model_id in sorted(scored, key=lambda item: item[0], reverse=True)][:k]
+
+
+class BanditPolicy(RoutingPolicy):
+    """Ranks candidates by an index over the per-(model, domain) reward statistics."""
+
+    def __init__(self, stats, seed=None):
+        self.stats = stats
+        self._rng = random.Random(seed)
+        self.counters = {"ranked": 0, "updates": 0, "explored": 0}
+
+    def index(self, pulls, reward_sum, reward_sq_sum, total_pulls):
+        raise NotImplementedError
+
+    def rank(self, domain_id, candidates, k=None, penalty=None):
+        per_model = [(model_id, self.stats.get(model_id, domain_id)) for model_id in candidates]
+        total_pulls = sum(stats[0] for _, stats in per_model)
+        # The random tiebreak spreads traffic over equally untried models
+        scored = sorted(
+            (
+                (self.index(*stats, total_pulls) * (1.0 - penalty(model_id) if penalty else 1.0),
+                 self._rng.random(), model_id)
+                for model_id, stats in per_model
+            ),
+            reverse=True
+        )
+        ranked = [model_id for _, _, model_id in scored][:k]
+        self.counters["ranked"] += 1
+        # Count picks that are not the empirically best model, i.e. exploration traffic
+        means = {model_id: stats[1] / stats[0] for model_id, stats in per_model if stats[0]}
+        if ranked and means and means.get(ranked[0], -1.0) < max(means.values()):
+            self.counters["explored"] += 1
+        return ranked
+
+    def update(self, model_id, domain_id, reward):
+        self.stats.add(model_id, domain_id, reward)
+        self.counters["updates"] += 1
+
+    def get_stats(self):
+        return dict(self.counters, policy=self.name)
+
+
+class GreedyPolicy(BanditPolicy):
+    """Highest mean reward; untried models get `prior_mean`, like the 0.5 COALESCE defaults."""
+
+    name = "greedy"
+
+    def __init__(self, stats, prior_mean=0.5, seed=None):
+        super().__init__(stats, seed)
+        self.prior_mean = prior_mean
+
+    def index(self, pulls, reward_sum, reward_sq_sum, total_pulls):
+        return reward_sum / pulls if pulls else self.prior_mean
+
+
+class ThompsonPolicy(BanditPolicy):
+    """Samples each model's reward from Beta(prior + successes, prior + failures)."""
+
+    name = "thompson"
+
+    def __init__(self, stats, prior_alpha=1.0, prior_beta=1.0, seed=None):
+        super().__init__(stats, seed)
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+
+    def index(self, pulls, reward_sum, reward_sq_sum, total_pulls):
+        # Fractional rewards in [0, 1] update the Beta posterior proportionally
+        return self._rng.betavariate(self.prior_alpha + reward_sum, self.prior_beta + pulls - reward_sum)
+
+
+class UCBPolicy(BanditPolicy):
+    """UCB1-Tuned: mean reward plus a variance-aware exploration bonus; untried models go first."""
+
+    name = "ucb"
+
+    def __init__(self, stats, c=1.0, seed=None):
+        super().__init__(stats, seed)
+        self.c = c
+
+    def index(self, pulls, reward_sum, reward_sq_sum, total_pulls):
+        if not pulls:
+            return math.inf
+        mean = reward_sum / pulls
+        log_term = math.log(max(total_pulls, 1)) / pulls
+        variance = max(reward_sq_sum / pulls - mean * mean, 0.0) + math.sqrt(2 * log_term)
+        return mean + self.c * math.sqrt(log_term * min(0.25, variance))
+
+
+def build_policy(settings, config=None, stats=None, seed=None):
+    """Policy named by config `policy.name`; bandit policies share `stats` (loaded from the DB if omitted)."""
+    name = settings.get("name", "scorer")
+    if name == "scorer":
+        return ScorerPolicy(config)
+    if stats is None:
+        stats = BanditStats(flush_interval_s=settings.get("persist_interval_s", 10))
+        stats.load()
+        if config is not None and settings.get("seed_max_pulls", 20):
+            priors = metric_priors(config, settings.get("seed_max_pulls", 20))
+            stats.set_priors(priors)
+            print(f"[BANDIT] Seeded {len(priors)} (model, domain) pairs from model_metrics")
+        stats.start()
+    if name == "greedy":
+        return GreedyPolicy(stats, prior_mean=settings.get("prior_mean", 0.5), seed=seed)
+    if name == "thompson":
+        return ThompsonPolicy(stats, settings.get("prior_alpha", 1.0), settings.get("prior_beta", 1.0), seed=seed)
+    if name == "ucb":
+        return UCBPolicy(stats, c=settings.get("ucb_c", 1.0), seed=seed)
+    raise ValueError(f"Unknown routing policy '{name}'")
@@ -1,7 +1,15 @@
-DOMAIN_CLASSIFIER_PROMPT = """
-You are an expert domain classifier. Assign the given prompt to exactly one domain from the list below:
+import sys
+from pathlib import Path
 
-{domains}
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.prompt_template import PromptTemplate
+
+# Instructions first, then the (rarely changing) domain list, then the per-call text, so
+# prompt caches can reuse everything up to the first per-call field.
+
+DOMAIN_CLASSIFIER_PROMPT = PromptTemplate("domain_classifier", """
+You are an expert domain classifier. Assign the given prompt to exactly one domain from the domain list at the end.
 
 Rules:
 - Output only the domain name exactly as it appears in the list.
@@ -13,16 +21,16 @@ Rules:
 3. **Open-Ended Q&A / Conversational Quality:** Select this for casual greetings, personality questions, or general small talk.
 4. **Task Matching:** For all other prompts, select the domain that best fits the primary task.
 
+Domains:
+{domains}
+
 Prompt to classify:
 "{prompt}"
-"""
+""")
 
-VERIFIER_PROMPT = """
+VERIFIER_PROMPT = PromptTemplate("verifier", """
 You are an expert answer verifier. Compare the Model Output against the Expected Output.
 
-Model Output: "{model_output}"
-Expected Output: "{expected_output}"
-
 Verification Rules:
 1. **Core Fact Matching:** If the key information (entities, numbers, dates) in the Expected Output is present in the Model Output, return "true".
 2. **Verbosity Handling:** Treat concise answers (e.g., "Paris") as equivalent to verbose answers (e.g., "The capital is Paris") provided the core fact is the same.
@@ -31,36 +39,26 @@ Verification Rules:
 Output Requirements:
 - Return strictly "true" or "false".
 - No punctuation or explanation.
-"""
 
-ADVANCED_VERIFIER_PROMPT = """
-You are an expert evaluation model. Your task is to evaluate whether the Model Output is a correct, relevant, and complete answer to the given Question.
+Model Output: "{model_output}"
+Expected Output: "{expected_output}"
+""")
 
-Input Data:
-- Question: "{q}"
-- Model Output: "{model_output}"
+ADVANCED_VERIFIER_PROMPT = PromptTemplate("advanced_verifier", """
+You are an expert evaluation model. Your task is to evaluate whether the Model Output is a correct, relevant, and complete answer to the Question given at the end.
 
 Evaluation Rules:
 1. Faithfulness: Ensure the response answers the specific question asked without drifting.
-2. Factual Correctness:
-    - Rely on your internal knowledge base to verify facts, numbers, dates, and entities.
-    - Penalize hallucinations or invented information heavily.
+2. Factual Correctness: Rely on your internal knowledge base to verify facts, numbers, dates, and entities. Penalize hallucinations or invented information heavily.
 3. Completeness: The answer should address all parts of the question.
 
 Scoring Rubric:
-- Accuracy (Float):
-    - 1.0: Factually correct, precise, and fully addresses the question.
-    - 0.5 - 0.9: Mostly correct but contains minor errors, fluff, or slight omissions.
-    - 0.0 - 0.4: Factually incorrect, hallucinates, or completely irrelevant.
-
-- Passed (Boolean):
-    - Return "true" if the answer is factually accurate and sufficient.
-    - Return "false" if the answer contains factual errors or misses the core intent.
+- Accuracy (float): 1.0 factually correct, precise, and fully addresses the question; 0.5-0.9 mostly correct but with minor errors, fluff, or slight omissions; 0.0-0.4 factually incorrect, hallucinated, or completely irrelevant.
+- Passed (boolean): true if the answer is factually accurate and sufficient; false if it contains factual errors or misses the core intent.
 
 Return ONLY a valid JSON object with no markdown formatting:
-{{
-    "reason": "<short 1-sentence explanation of the score>",
-    "accuracy": <float between 0.0 and 1.0>,
-    "passed": <boolean>
-}}
-"""
\ No newline at end of file
+{{"reason": "<short 1-sentence explanation of the score>", "accuracy": <float between 0.0 and 1.0>, "passed": <boolean>}}
+
+Question: "{q}"
+Model Output: "{model_output}"
+""")
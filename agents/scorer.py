@@ -1,61 +1,175 @@
 import sys
+import threading
 from pathlib import Path
 
+import numpy as np
+
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from db.client import get_connection
+from utils.router.routing_table import get_routing_table
+
+# Feature order of the last axis of ScoringEngine.metrics
+FEATURES = ("accuracy_score", "fluency_score", "confidence", "latency_ms", "cost")
+ACCURACY, FLUENCY, CONFIDENCE, LATENCY, COST = range(len(FEATURES))
 
-conn = get_connection()
+# Latency normalization bounds until enough models have been observed to derive them
+DEFAULT_LATENCY_BOUNDS = (300.0, 1500.0)
+# The fleet's 5th / 95th latency percentiles become the "fast" / "slow" ends of the scale
+FLEET_PERCENTILES = (5, 95)
+MIN_FLEET_SAMPLES = 3
 
 def normalize_latency(latency_ms, min_ms=300, max_ms=1500):
-    # 1.0 = fast, 0.0 = slow
-    latency_clamped = max(min(latency_ms, max_ms), min_ms)
+    # 1.0 = fast, 0.0 = slow; works on scalars and arrays
+    latency_clamped = np.clip(latency_ms, min_ms, max_ms)
     return (max_ms - latency_clamped) / (max_ms - min_ms)
 
-def compute_score(row, weights):
-    lat_norm = normalize_latency(row["latency_ms"])
-    quality_score = (
-        weights["accuracy"]   * row["accuracy_score"] +
-        weights["fluency"]    * row["fluency_score"] +
-        weights["confidence"] * row["confidence"] +
-        weights["latency"]    * lat_norm
-    )
-    cost_factor = 1.0 / (1.0 + row["cost"])
-    return quality_score * cost_factor
-
-
-def get_best_model(domain_id, config):
-    weights = config["weights"]
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT 
-            m.id, m.model_name, m.cost,
-            COALESCE(mm.accuracy_score, 0.5) AS accuracy_score,
-            COALESCE(mm.fluency_score, 0.5) AS fluency_score,
-            COALESCE(mm.confidence, 0.5) AS confidence,
-            COALESCE(mm.latency_ms, 1000) AS latency_ms
-        FROM models m
-        LEFT JOIN model_metrics mm
-            ON mm.model_id = m.id AND mm.domain_id = %s;
-    """, (domain_id,))
-    rows = cur.fetchall()
-    scored = []
-    for row in rows:
-        model_id = row["id"]
-        model_name = row["model_name"]
-        metrics = {
-            "accuracy_score": row["accuracy_score"],
-            "fluency_score": row["fluency_score"],
-            "confidence": row["confidence"],
-            "latency_ms": row["latency_ms"],
-            "cost": row["cost"]
-        }
-        score = compute_score(metrics, weights)
-        scored.append((score, model_id, model_name))
-    scored.sort(reverse=True, key=lambda x: x[0])
-    best_score, best_model_id, best_model_name = scored[0]
+
+def candidate_latency(row, tail_ratio=1.0):
+    """Tail latency: p95 from the latency sketch, or the decayed mean scaled up to a p95 estimate."""
+    if row.get("latency_p95_ms") is not None:
+        return row["latency_p95_ms"]
+    return row["latency_ms"] * tail_ratio
+
+
+def fleet_tail_ratio(rows):
+    """Median p95 / mean latency over rows that have both, so models without a sketch are not
+    compared by their mean against everyone else's tail; 1.0 until any sketch exists."""
+    ratios = [
+        row["latency_p95_ms"] / row["latency_ms"] for row in rows
+        if row.get("latency_p95_ms") is not None and row["usage_count"] and row["latency_ms"] > 0
+    ]
+    return max(float(np.median(ratios)), 1.0) if ratios else 1.0
+
+
+def fleet_latency_bounds(latencies):
+    """(min_ms, max_ms) for normalize_latency from the observed latencies of every (model, domain)."""
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if latencies.size < MIN_FLEET_SAMPLES:
+        return DEFAULT_LATENCY_BOUNDS
+    low, high = np.percentile(latencies, FLEET_PERCENTILES)
+    if high - low < 1.0:
+        return DEFAULT_LATENCY_BOUNDS
+    return float(low), float(high)
+
+
+class ScoringEngine:
+    """Vectorized model scoring for every domain in the routing table.
+
+    Metrics live in one contiguous (domains x models x features) array that is rebuilt when
+    the routing table version changes. Scores for all domains are one NumPy expression, cached
+    per weight set, and top-k selection uses argpartition instead of a full sort. The latency
+    scale is re-derived from the observed fleet on every rebuild.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.version = None
+        self.domain_index = {}  # domain_id -> row of metrics / scores
+        self.model_ids = np.empty(0, dtype=np.int64)
+        self.model_names = []
+        self.metrics = np.empty((0, 0, len(FEATURES)))
+        self.latency_bounds = DEFAULT_LATENCY_BOUNDS
+        self._scores = {}  # weights key -> (domains x models) scores for self.version
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        if self.table.version == self.version:
+            return
+        version, candidates = self.table.snapshot()
+        domain_ids = list(candidates)
+        models = candidates[domain_ids[0]] if domain_ids else []
+        metrics = np.array(
+            [[[row[feature] for feature in FEATURES] for row in candidates[domain_id]] for domain_id in domain_ids],
+            dtype=np.float64,
+        ).reshape(len(domain_ids), len(models), len(FEATURES))
+        observed = []
+        tail_ratio = fleet_tail_ratio(row for rows in candidates.values() for row in rows)
+        for d, domain_id in enumerate(domain_ids):
+            for m, row in enumerate(candidates[domain_id]):
+                metrics[d, m, LATENCY] = candidate_latency(row, tail_ratio)
+                if row["usage_count"]:
+                    observed.append(metrics[d, m, LATENCY])
+        latency_bounds = fleet_latency_bounds(observed)
+        with self._lock:
+            self.domain_index = {domain_id: i for i, domain_id in enumerate(domain_ids)}
+            self.model_ids = np.array([row["id"] for row in models], dtype=np.int64)
+            self.model_names = [row["model_name"] for row in models]
+            self.metrics = np.ascontiguousarray(metrics)
+            self.latency_bounds = latency_bounds
+            self._scores = {}
+            self.version = version
+
+    def latency_scale(self):
+        """The current (min_ms, max_ms) for normalize_latency, so other latency scores match the scorer's."""
+        self._sync()
+        with self._lock:
+            return self.latency_bounds
+
+    def scores(self, weights):
+        """(domains x models) score matrix for `weights`, computed in one pass over all domains."""
+        self._sync()
+        key = tuple(sorted(weights.items()))
+        with self._lock:
+            scores = self._scores.get(key)
+            if scores is None:
+                m = self.metrics
+                quality = (
+                    weights["accuracy"]   * m[..., ACCURACY] +
+                    weights["fluency"]    * m[..., FLUENCY] +
+                    weights["confidence"] * m[..., CONFIDENCE] +
+                    weights["latency"]    * normalize_latency(m[..., LATENCY], *self.latency_bounds)
+                )
+                scores = quality / (1.0 + m[..., COST])
+                self._scores[key] = scores
+            return scores
+
+    def top_k(self, scores, k):
+        """Column indices of the k best scores in each row, best first."""
+        n = scores.shape[-1]
+        k = n if k is None else min(k, n)
+        if k < n:
+            idx = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        else:
+            idx = np.broadcast_to(np.arange(n), scores.shape).copy()
+        order = np.argsort(-np.take_along_axis(scores, idx, axis=-1), axis=-1, kind="stable")
+        return np.take_along_axis(idx, order, axis=-1)
+
+    def rank(self, domain_id, weights, k=None):
+        """[(score, model_id, model_name)] for one domain, best first."""
+        scores = self.scores(weights)
+        row = scores[self.domain_index[domain_id]]
+        return [(float(row[i]), int(self.model_ids[i]), self.model_names[i]) for i in self.top_k(row, k)]
+
+    def rank_batch(self, domain_ids, weights, k=1):
+        """Top-k model ids for each domain of a batch of (prompt, domain) pairs, in one argpartition."""
+        scores = self.scores(weights)
+        rows = scores[[self.domain_index[domain_id] for domain_id in domain_ids]]
+        return self.model_ids[self.top_k(rows, k)].tolist()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine(config=None):
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ScoringEngine(get_routing_table(config))
+    return _engine
+
+
+def get_best_model(domain_id, config, limit=None):
+    """Model ids for the domain, best first; the router falls back down this list."""
+    ranked = get_engine(config).rank(domain_id, config["weights"], k=limit)
+    best_score, best_model_id, best_model_name = ranked[0]
     print(f"[SCORER] Best model = {best_model_name} (score={best_score:.4f})")
-    return best_model_id
+    return [model_id for _, model_id, _ in ranked]
+
+
+def get_best_models(domain_ids, config, limit=1):
+    """Ranked model ids for every domain in a batch routing request."""
+    return get_engine(config).rank_batch(domain_ids, config["weights"], k=limit)
 
 def main():
     domain_id = 1
@@ -71,6 +185,7 @@ def main():
         }
     }
     get_best_model(domain_id, config)
+    print(get_best_models([1, 2, 1], config, limit=2))
 
 if __name__ == "__main__":
     main()
@@ -3,20 +3,25 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.gemini.client import GeminiClient
-from db.client import get_connection
+from utils.gemini.client import get_gemini_client, is_unavailable
+from utils.ratelimit import CircuitOpen
 from agents.prompts import VERIFIER_PROMPT
 
-gemini_client = GeminiClient()
+gemini_client = get_gemini_client()
 
-def verify(model_output, expected_output):
+def verify(model_output, expected_output, client=None):
+    """Gemini's true/false verdict; raises if Gemini is unavailable so callers don't score it False."""
     try:
-        system_prompt = VERIFIER_PROMPT.format(
+        system_prompt = VERIFIER_PROMPT.render(
             model_output=model_output,
             expected_output=expected_output
         )
-        return bool(gemini_client.generate_content(system_prompt).strip().lower() == "true")
+        return bool((client or gemini_client).generate_content(system_prompt).strip().lower() == "true")
+    except CircuitOpen:
+        raise
     except Exception as e:
+        if is_unavailable(e):
+            raise
         print("Error during verification:", e)
         return False
 
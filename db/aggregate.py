@@ -0,0 +1,135 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db.client import connection
+from db.schema import ensure_schema
+
+WATERMARK_NAME = "model_metric_events"
+
+# Events are only aggregated once they are a few seconds old, so a COPY that has been
+# assigned ids but not yet committed is not skipped past by the watermark.
+SETTLE_INTERVAL_S = 10
+
+# Merges the new events into the running rollups using the parallel mean/variance
+# update, so each run only scans events past the watermark.
+ROLLUP_SQL = """
+    INSERT INTO model_metric_rollups AS r
+    (model_id, domain_id, event_count, success_count, latency_mean, latency_m2,
+    confidence_mean, tokens_output_mean, updated_at)
+    SELECT model_id, domain_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE success),
+        AVG(latency_ms),
+        COALESCE(VAR_POP(latency_ms), 0) * COUNT(latency_ms),
+        AVG(confidence),
+        AVG(tokens_output),
+        NOW()
+    FROM model_metric_events
+    WHERE id > %s AND id <= %s
+    GROUP BY model_id, domain_id
+    ON CONFLICT (model_id, domain_id) DO UPDATE SET
+        event_count = r.event_count + EXCLUDED.event_count,
+        success_count = r.success_count + EXCLUDED.success_count,
+        latency_mean = COALESCE(r.latency_mean, EXCLUDED.latency_mean)
+            + (COALESCE(EXCLUDED.latency_mean, r.latency_mean) - COALESCE(r.latency_mean, EXCLUDED.latency_mean))
+            * EXCLUDED.event_count / (r.event_count + EXCLUDED.event_count),
+        latency_m2 = COALESCE(r.latency_m2, 0) + COALESCE(EXCLUDED.latency_m2, 0)
+            + POWER(COALESCE(EXCLUDED.latency_mean - r.latency_mean, 0), 2)
+            * r.event_count * EXCLUDED.event_count / (r.event_count + EXCLUDED.event_count),
+        confidence_mean = (COALESCE(r.confidence_mean, 0) * r.event_count
+            + COALESCE(EXCLUDED.confidence_mean, 0) * EXCLUDED.event_count)
+            / (r.event_count + EXCLUDED.event_count),
+        tokens_output_mean = (COALESCE(r.tokens_output_mean, 0) * r.event_count
+            + COALESCE(EXCLUDED.tokens_output_mean, 0) * EXCLUDED.event_count)
+            / (r.event_count + EXCLUDED.event_count),
+        updated_at = NOW()
+    RETURNING model_id, domain_id;
+"""
+
+# Only the event-derived columns are written here; the rolling quality averages stay
+# owned by the router's metrics writer so observations are not counted twice.
+PUBLISH_SQL = """
+    INSERT INTO model_metrics AS mm
+    (model_id, domain_id, latency_ms, latency_variance, failure_rate, usage_count, failure_count, last_updated)
+    SELECT r.model_id, r.domain_id, r.latency_mean,
+        r.latency_m2 / NULLIF(r.event_count - 1, 0),
+        1.0 - r.success_count::float / NULLIF(r.event_count, 0),
+        0, 0, NOW()
+    FROM model_metric_rollups r
+    WHERE (r.model_id, r.domain_id) IN (SELECT * FROM UNNEST(%s::int[], %s::int[]))
+    ON CONFLICT (model_id, domain_id) DO UPDATE SET
+        latency_variance = EXCLUDED.latency_variance,
+        failure_rate = EXCLUDED.failure_rate,
+        last_updated = NOW();
+"""
+
+
+def ensure_watermark():
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO metric_watermarks (name, last_event_id)
+            VALUES (%s, 0)
+            ON CONFLICT (name) DO NOTHING;
+        """, (WATERMARK_NAME,))
+        cur.close()
+
+
+def aggregate():
+    """Fold events past the watermark into the rollups and publish them to model_metrics."""
+    t0 = time.time()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT last_event_id FROM metric_watermarks WHERE name = %s FOR UPDATE;",
+            (WATERMARK_NAME,)
+        )
+        last_event_id = cur.fetchone()["last_event_id"]
+        cur.execute("""
+            SELECT COALESCE(MAX(id), %s) AS max_id
+            FROM model_metric_events
+            WHERE id > %s AND created_at < NOW() - make_interval(secs => %s);
+        """, (last_event_id, last_event_id, SETTLE_INTERVAL_S))
+        max_id = cur.fetchone()["max_id"]
+        if max_id <= last_event_id:
+            cur.close()
+            return 0
+
+        cur.execute(ROLLUP_SQL, (last_event_id, max_id))
+        pairs = cur.fetchall()
+        model_ids = [row["model_id"] for row in pairs]
+        domain_ids = [row["domain_id"] for row in pairs]
+        cur.execute(PUBLISH_SQL, (model_ids, domain_ids))
+        cur.execute("""
+            UPDATE metric_watermarks
+            SET last_event_id = %s, updated_at = NOW()
+            WHERE name = %s;
+        """, (max_id, WATERMARK_NAME))
+        cur.close()
+    print(f"[AGGREGATE] Events {last_event_id + 1}..{max_id} -> {len(pairs)} pairs in {(time.time() - t0)*1000:.1f} ms")
+    return max_id - last_event_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate model_metric_events into model_metrics")
+    parser.add_argument("--loop", type=float, default=0, help="Re-run every N seconds instead of once")
+    args = parser.parse_args()
+
+    ensure_schema()
+    ensure_watermark()
+    while True:
+        try:
+            aggregate()
+        except Exception as e:
+            print("[AGGREGATE] Error:", e)
+        if not args.loop:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
 import os
+import time
+import threading
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
@@ -22,14 +26,205 @@ def get_connection():
     )
     return conn
 
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections."""
+
+    def __init__(self, min_size=1, max_size=10, timeout=10.0, max_idle_s=300.0, connect=get_connection):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle_s = max_idle_s
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []  # (conn, returned_at)
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "timeouts": 0,
+            "saturated": 0,
+            "connects": 0,
+            "discarded": 0,
+        }
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._lock:
+            self._size += 1
+            self._stats["connects"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._stats["discarded"] += 1
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if idle_for < self.max_idle_s:
+            return True
+        # Connection sat idle long enough that the server or proxy may have dropped it
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        if self._closed:
+            raise PoolTimeout("Connection pool is closed")
+        t0 = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["saturated"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(f"No connection available after {self.timeout}s (max_size={self.max_size})")
+        waited_ms = (time.monotonic() - t0) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            if waited_ms > 0.1:
+                self._stats["waits"] += 1
+            self._stats["wait_ms_total"] += waited_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._new_connection()
+                conn, returned_at = item
+                if self._is_healthy(conn, time.monotonic() - returned_at):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard=False):
+        try:
+            if not discard and not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commit on success, roll back on error, always return it."""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard or conn.closed)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+            })
+        checkouts = stats["checkouts"] or 1
+        stats["wait_ms_avg"] = stats["wait_ms_total"] / checkouts
+        stats["saturation_ratio"] = stats["saturated"] / checkouts
+        return stats
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                    max_size=int(os.getenv("DB_POOL_MAX", "10")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                )
+    return _pool
+
+def connection():
+    return get_pool().connection()
+
+def cursor():
+    return get_pool().cursor()
+
+def pool_stats():
+    return get_pool().stats() if _pool is not None else {}
+
 if __name__ == "__main__":
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT NOW() AS server_time;")
-        row = cur.fetchone()
+        with cursor() as cur:
+            cur.execute("SELECT NOW() AS server_time;")
+            row = cur.fetchone()
         print("Connected successfully!")
         print("Server time:", row["server_time"])
-        conn.close()
+        print("Pool stats:", pool_stats())
     except Exception as e:
         print("Error:", e)
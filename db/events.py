@@ -0,0 +1,152 @@
+import io
+import csv
+import sys
+import time
+import atexit
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db.client import connection
+
+EVENT_COLUMNS = (
+    "model_id", "domain_id", "latency_ms", "tokens_input", "tokens_output",
+    "cost", "success", "confidence", "benchmark_id", "correct",
+)
+
+COPY_SQL = f"""
+    COPY model_metric_events ({", ".join(EVENT_COLUMNS)})
+    FROM STDIN WITH (FORMAT csv, NULL '')
+"""
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return value
+
+
+class EventSink:
+    """Buffers one model_metric_events row per query and bulk-loads them with COPY."""
+
+    def __init__(self, flush_interval_s=5.0, batch_size=1000, max_buffer=50000):
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            "recorded": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "rows_copied": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def record(self, model_id, domain_id, latency_ms, tokens_input, tokens_output,
+               cost, success, confidence, benchmark_id=None, correct=None):
+        row = (model_id, domain_id, latency_ms, tokens_input, tokens_output,
+               cost, success, confidence, benchmark_id, correct)
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.stats["dropped"] += 1
+                return
+            self._buffer.append(row)
+            self.stats["recorded"] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            copied = 0
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                if not self._copy(batch):
+                    with self._lock:
+                        # Keep unsent rows for the next attempt, oldest first, within the buffer cap
+                        retained = rows[start:] + self._buffer
+                        self.stats["dropped"] += max(len(retained) - self.max_buffer, 0)
+                        self._buffer = retained[:self.max_buffer]
+                    break
+                copied += len(batch)
+            return copied
+
+    def _copy(self, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+        buf.seek(0)
+        t0 = time.monotonic()
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                cur.copy_expert(COPY_SQL, buf)
+                cur.close()
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            print(f"[EVENTS] COPY of {len(rows)} events failed, will retry: {e}")
+            return False
+        elapsed_ms = (time.monotonic() - t0) * 1000
+        self.stats["flushes"] += 1
+        self.stats["rows_copied"] += len(rows)
+        self.stats["last_flush_ms"] = elapsed_ms
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["buffered"] = len(self._buffer)
+        return stats
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            if self._buffer:
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval_s + 1)
+        self.flush()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+def get_event_sink(config=None):
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                settings = (config or {}).get("event_sink", {})
+                sink = EventSink(
+                    flush_interval_s=settings.get("flush_interval_s", 5.0),
+                    batch_size=settings.get("batch_size", 1000),
+                    max_buffer=settings.get("max_buffer", 50000),
+                )
+                sink.start()
+                _sink = sink
+    return _sink
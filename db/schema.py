@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db.client import connection
+
+# Additive migrations on top of docs/db-schema.md; safe to run repeatedly.
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS metric_watermarks (
+        name TEXT PRIMARY KEY,
+        last_event_id BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT NOW()
+    );
+    CREATE TABLE IF NOT EXISTS model_metric_rollups (
+        model_id INTEGER REFERENCES models(id),
+        domain_id INTEGER REFERENCES domains(id),
+        event_count BIGINT NOT NULL DEFAULT 0,
+        success_count BIGINT NOT NULL DEFAULT 0,
+        latency_mean FLOAT,
+        latency_m2 FLOAT,
+        confidence_mean FLOAT,
+        tokens_output_mean FLOAT,
+        updated_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (model_id, domain_id)
+    );
+    CREATE TABLE IF NOT EXISTS bandit_stats (
+        model_id INTEGER REFERENCES models(id),
+        domain_id INTEGER REFERENCES domains(id),
+        pulls BIGINT NOT NULL DEFAULT 0,
+        reward_sum FLOAT NOT NULL DEFAULT 0,
+        reward_sq_sum FLOAT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (model_id, domain_id)
+    );
+    CREATE TABLE IF NOT EXISTS model_metric_sketches (
+        model_id INTEGER REFERENCES models(id),
+        domain_id INTEGER REFERENCES domains(id),
+        metric TEXT NOT NULL,
+        sketch BYTEA,
+        updated_at TIMESTAMP DEFAULT NOW(),
+        PRIMARY KEY (model_id, domain_id, metric)
+    );
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS latency_variance FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS failure_rate FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS ttft_ms FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS inter_token_ms FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS stream_count BIGINT DEFAULT 0;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS decay_weight FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS decayed_at TIMESTAMP;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS verified_weight FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS latency_p50_ms FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS latency_p95_ms FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS latency_p99_ms FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS tokens_per_s_p50 FLOAT;
+    ALTER TABLE model_metrics ADD COLUMN IF NOT EXISTS completion_tokens_p95 FLOAT;
+"""
+
+
+def ensure_schema():
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_SQL)
+        cur.close()
+
+
+if __name__ == "__main__":
+    ensure_schema()
+    print("[SCHEMA] Up to date.")
@@ -3,15 +3,30 @@ import sys
 from pathlib import Path
 import time
 import json
-import requests
-import math
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from evaluation.evaluator import judge_accuracy, judge_fluency
-from db.client import get_connection
-
-VLLM_URL = "http://localhost:8000/v1/completions"
+from evaluation.judges import get_judges, JUDGE_BACKEND_ENV
+from agents.local_verifier import get_local_verifier
+from agents.inference import post_completion, build_payload, parse_batch_response, run_batch
+from agents.generation import GenerationProfiles, profile_key
+from db.client import pool_stats
+from db.events import get_event_sink
+from utils.aio import run_sync
+from utils.ratelimit import TokenBucket, retry
+from utils.router.config import load_config
+from utils.router.metrics_writer import MetricsWriter
+from utils.router.routing_table import RoutingTable
+
+EVAL_SET_PATH = Path(__file__).parent / "eval_set.json"
+CHECKPOINT_PATH = Path(__file__).parent / "checkpoints" / "benchmark.jsonl"
+
+# Judge accuracy at or above this counts as a correct benchmark answer in model_metric_events
+CORRECT_THRESHOLD = 0.5
 
 MODELS = [
     # "Qwen2.5-1.5B-Instruct",
@@ -23,171 +38,309 @@ MODELS = [
     "Qwen2.5-0.5B-Instruct"
 ]
 
-def get_model_row(conn, model_name):
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM models WHERE model_name = %s", (model_name,))
-    row = cur.fetchone()
-    if not row:
-        raise Exception(f"Model '{model_name}' not found in models table.")
-    return row
-
-
-def get_existing_metrics(conn, model_id, domain_id):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT *
-        FROM model_metrics
-        WHERE model_id = %s AND domain_id = %s
-    """, (model_id, domain_id))
-    return cur.fetchone()
-
-
-def insert_new_metrics(
-    conn, model_id, domain_id,
-    accuracy, fluency, latency_ms,
-    confidence, tokens, failure_count
-):
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO model_metrics
-        (model_id, domain_id, accuracy_score, fluency_score, latency_ms,
-        confidence, tokens_per_query, usage_count, failure_count)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, 1, %s)
-    """, (model_id, domain_id, accuracy, fluency, latency_ms, confidence, tokens, failure_count))
-    conn.commit()
-
-
-def update_metrics_rolling(
-    conn, existing, model_id, domain_id,
-    new_accuracy, new_fluency, new_latency,
-    new_confidence, new_tokens, failure_inc
-):
-
-    old_usage = existing["usage_count"]
-    new_usage = old_usage + 1
-
-    accuracy = (existing["accuracy_score"] * old_usage + new_accuracy) / new_usage
-    fluency  = (existing["fluency_score"] * old_usage + new_fluency) / new_usage
-    latency  = (existing["latency_ms"] * old_usage + new_latency) / new_usage
-    conf     = (existing["confidence"] * old_usage + new_confidence) / new_usage
-    tokens   = (existing["tokens_per_query"] * old_usage + new_tokens) / new_usage
-
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE model_metrics
-        SET accuracy_score = %s,
-            fluency_score = %s,
-            latency_ms = %s,
-            confidence = %s,
-            tokens_per_query = %s,
-            usage_count = usage_count + 1,
-            failure_count = failure_count + %s,
-            last_updated = NOW()
-        WHERE model_id = %s AND domain_id = %s
-    """, (accuracy, fluency, latency, conf, tokens, failure_inc,model_id, domain_id))
-    conn.commit()
-
-def compute_confidence(choice):
-    if "logprobs" not in choice or choice["logprobs"] is None:
-        return 0.0
-    logprobs = choice["logprobs"].get("token_logprobs", [])
-    if not logprobs:
-        return 0.0
-    avg_logprob = sum(logprobs) / len(logprobs)
-    return math.exp(avg_logprob)
-
-def query_model(model_name, provider, prompt):
-    payload = {
-        "model": f"{provider}/{model_name}",
-        "prompt": prompt,
-        "max_tokens": 128,
-        "temperature": 0.2,
-        "logprobs": 1
-    }
 
-    try:
-        resp = requests.post(VLLM_URL, json=payload, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
-
-        confidence = compute_confidence(data["choices"][0])
-        text = data["choices"][0]["text"].strip()
-        usage = data.get("usage", {})
-
-        return {
-            "response_text": text,
-            "confidence": confidence,
-            "prompt_tokens": usage.get("prompt_tokens", 0),
-            "completion_tokens": usage.get("completion_tokens", 0),
-            "total_tokens": usage.get("total_tokens", 0),
-            "failed": 0
-        }
+class Checkpoint:
+    """Append-only JSONL of finished (model, question) pairs so an interrupted run can resume."""
 
-    except Exception as e:
-        print(f"[ERROR] {model_name} failed: {e}")
-        return {
-            "response_text": "",
-            "confidence": 0.0,
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "total_tokens": 0,
-            "failed": 1
-        }
+    def __init__(self, path, fresh=False):
+        self.path = Path(path)
+        self.done = set()
+        self._lock = threading.Lock()
+        if fresh and self.path.exists():
+            self.path.unlink()
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        continue  # a line cut short by the interruption
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
 
+    def __contains__(self, key):
+        return key in self.done
 
-def benchmark(conn, model_name, domain_id, question, expected_answer):
-    model_row = get_model_row(conn, model_name)
-    model_id = model_row["id"]
-    provider = model_row["provider"]
+    def add(self, key, record):
+        with self._lock:
+            self._file.write(json.dumps({"key": key, **record}) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done.add(key)
 
-    t1 = time.time()
-    result = query_model(model_name, provider, question)
-    t2 = time.time()
-
-    latency_ms = (t2 - t1) * 1000
-    response_text = result["response_text"]
-
-    accuracy = judge_accuracy(domain_id, question, expected_answer, response_text)
-    fluency = judge_fluency(response_text)
-    tokens = result["total_tokens"]
-    confidence = result["confidence"]
-    failures = result["failed"]
-
-    existing = get_existing_metrics(conn, model_id, domain_id)
-
-    if existing is None:
-        insert_new_metrics(
-            conn, model_id, domain_id,
-            accuracy, fluency, latency_ms,
-            confidence, tokens, failures
-        )
-    else:
-        update_metrics_rolling(
-            conn, existing, model_id, domain_id,
-            accuracy, fluency, latency_ms,
-            confidence, tokens, failures
-        )
+    def close(self):
+        self._file.close()
 
 
-def main():
-    conn = get_connection()
-    eval_set = json.load(open("eval_set.json"))
+def log_retry(label):
+    def on_retry(e, attempt, delay):
+        print(f"[RETRY] {label} attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+    return on_retry
+
+
+def query_models(model_name, provider, prompts, retries=3, profile=None):
+    """Send `prompts` as one batched completion, retrying 429 / 5xx; one result per prompt."""
+    payload = build_payload(model_name, provider, list(prompts), profile)
+
+    try:
+        data = retry(post_completion, model_name, payload, retries=retries, on_retry=log_retry(model_name))
+        return parse_batch_response(data, prompts)
+    except Exception as e:
+        print(f"[ERROR] {model_name} batch of {len(prompts)} failed: {e}")
+        return run_batch(model_name, provider, prompts, profile)
 
-    for item in eval_set:
-        domain_id = item["domain"]
-        q = item["q"]
-        a = item["a"]
 
-        for model in MODELS:
+def infer(batch, retries):
+    """Every result in a batch shares the batch's wall-clock latency, as it would when served."""
+    model = batch[0]["model"]
+    t1 = time.time()
+    results = query_models(
+        model["model_name"], model["provider"], [task["q"] for task in batch], retries, batch[0]["profile"]
+    )
+    latency_ms = (time.time() - t1) * 1000
+    for result in results:
+        result["latency_ms"] = latency_ms
+    return results
+
+
+def batch_tasks(tasks, batch_size):
+    # Sampling settings apply to a whole request, so only tasks with the same profile share one
+    by_model = {}
+    for task in tasks:
+        by_model.setdefault((task["model"]["id"], profile_key(task["profile"])), []).append(task)
+    return [
+        model_tasks[i:i + batch_size]
+        for model_tasks in by_model.values()
+        for i in range(0, len(model_tasks), batch_size)
+    ]
+
+
+def judge(task, result, bucket, retries):
+    """Score one answer with the single-item judges; every Gemini call waits on the shared bucket."""
+    if result["failed"]:
+        # Nothing to grade, so don't spend judge quota on it
+        return 0.0, 0.0
+
+    def throttled(fn, *args):
+        bucket.acquire()
+        return fn(*args)
+
+    label = f"judge {task['model']['model_name']}:{task['index']}"
+    accuracy = retry(
+        throttled, judge_accuracy, task["domain_name"], task["q"], task["a"], result["response_text"],
+        retries=retries, on_retry=log_retry(label)
+    )
+    fluency = retry(
+        throttled, lambda text: run_sync(judge_fluency(text)), result["response_text"],
+        retries=retries, on_retry=log_retry(label)
+    )
+    return accuracy, fluency
+
+
+def judge_batch(tasks, results, bucket, retries):
+    """Score a chunk of answers in one batched judge call; items the judge drops are scored singly.
+
+    Returns one (accuracy, fluency) tuple, or the exception that stopped it, per task.
+    """
+    outcomes = [(0.0, 0.0) if result["failed"] else None for result in results]
+    pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    items = [
+        {"domain": tasks[i]["domain_name"], "q": tasks[i]["q"], "expected": tasks[i]["a"],
+         "output": results[i]["response_text"]}
+        for i in pending
+    ]
+    if items:
+        def throttled():
+            bucket.acquire()
+            return run_sync(get_judges().ajudge_batch(items, fallback=False))
+
+        label = f"judge batch {tasks[pending[0]]['key']}+{len(items) - 1}"
+        try:
+            verdicts = retry(throttled, retries=retries, on_retry=log_retry(label))
+        except Exception as e:
+            print(f"[ERROR] {label} failed, judging individually: {e}")
+            verdicts = [None] * len(items)
+        for i, verdict in zip(pending, verdicts):
+            if verdict is not None:
+                outcomes[i] = (verdict["accuracy"], verdict["fluency"])
+
+    for i, outcome in enumerate(outcomes):
+        if outcome is None:
             try:
-                benchmark(conn, model, domain_id, q, a)
+                outcomes[i] = judge(tasks[i], results[i], bucket, retries)
             except Exception as e:
-                print(f"[ERROR] Benchmarking {model} failed for question {q}: {e}")
+                outcomes[i] = e
+    return outcomes
+
+
+def record(task, result, accuracy, fluency, metrics_writer):
+    model = task["model"]
+    metrics_writer.record(
+        model["id"], task["domain_id"],
+        {
+            "accuracy": accuracy,
+            "fluency": fluency,
+            "latency_ms": result["latency_ms"],
+            "confidence": result["confidence"],
+            "tokens": result["total_tokens"],
+            "completion_tokens": result["completion_tokens"],
+        },
+        passed=True, failed=bool(result["failed"])
+    )
+    get_event_sink().record(
+        model["id"], task["domain_id"], result["latency_ms"],
+        result["prompt_tokens"], result["completion_tokens"],
+        model["cost"], not result["failed"], result["confidence"],
+        correct=accuracy >= CORRECT_THRESHOLD
+    )
+
+
+def build_tasks(eval_set, table, models, domains, checkpoint, profiles):
+    model_rows = []
+    for model_name in models:
+        row = table.model_by_name(model_name)
+        if not row:
+            raise Exception(f"Model '{model_name}' not found in models table.")
+        model_rows.append(row)
+
+    domain_ids = None
+    if domains:
+        domain_ids = {int(d) if d.isdigit() else table.domain_id(d) for d in domains}
+        if None in domain_ids:
+            raise Exception(f"Unknown domain in {domains}; known: {table.domain_names()}")
+
+    tasks, skipped = [], 0
+    for index, item in enumerate(eval_set):
+        if domain_ids is not None and item["domain"] not in domain_ids:
+            continue
+        for model in model_rows:
+            key = f"{model['model_name']}:{index}"
+            if key in checkpoint:
+                skipped += 1
                 continue
-        time.sleep(20)
+            tasks.append({
+                "key": key,
+                "index": index,
+                "model": model,
+                "domain_id": item["domain"],
+                "domain_name": table.domain_name(item["domain"]),
+                "profile": profiles.get(model["id"], item["domain"]),
+                "q": item["q"],
+                "a": item["a"],
+            })
+    return tasks, skipped
+
+
+def run_benchmark(tasks, args, checkpoint, metrics_writer):
+    """Batched inference fans out over `workers`; answers go to the smaller judge pool as they land."""
+    bucket = TokenBucket.per_minute(args.judge_rpm, burst=args.judge_burst)
+    counts = {"done": 0, "errors": 0}
+    total = len(tasks)
+
+    def judge_and_record(tasks, results):
+        outcomes = judge_batch(tasks, results, bucket, args.retries)
+        for task, result, outcome in zip(tasks, results, outcomes):
+            if isinstance(outcome, Exception):
+                continue
+            accuracy, fluency = outcome
+            record(task, result, accuracy, fluency, metrics_writer)
+            checkpoint.add(task["key"], {
+                "model": task["model"]["model_name"],
+                "domain_id": task["domain_id"],
+                "accuracy": accuracy,
+                "fluency": fluency,
+                "latency_ms": result["latency_ms"],
+                "failed": result["failed"],
+            })
+        return outcomes
+
+    with ThreadPoolExecutor(args.workers, thread_name_prefix="bench-infer") as infer_pool, \
+            ThreadPoolExecutor(args.judge_workers, thread_name_prefix="bench-judge") as judge_pool:
+        inferences = {
+            infer_pool.submit(infer, batch, args.retries): batch
+            for batch in batch_tasks(tasks, args.batch_size)
+        }
+        judgements = {}
+        for future in as_completed(inferences):
+            batch, results = inferences[future], future.result()
+            for i in range(0, len(batch), args.judge_batch_size):
+                chunk = (batch[i:i + args.judge_batch_size], results[i:i + args.judge_batch_size])
+                judgements[judge_pool.submit(judge_and_record, *chunk)] = chunk
+
+        for future in as_completed(judgements):
+            chunk_tasks, chunk_results = judgements[future]
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                outcomes = [e] * len(chunk_tasks)
+            for task, result, outcome in zip(chunk_tasks, chunk_results, outcomes):
+                if isinstance(outcome, Exception):
+                    counts["errors"] += 1
+                    print(f"[ERROR] Benchmarking {task['key']} failed for question {task['q']}: {outcome}")
+                    continue
+                counts["done"] += 1
+                print(f"[BENCHMARK] {counts['done']}/{total} {task['key']} "
+                      f"acc={outcome[0]:.2f} flu={outcome[1]:.2f} lat={result['latency_ms']:.0f}ms")
+
+    counts["judge_throttle"] = bucket.stats
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark models on the eval set and update model_metrics")
+    parser.add_argument("--models", nargs="+", default=MODELS, help="Model names to benchmark")
+    parser.add_argument("--domains", nargs="+", help="Domain ids or names to include (default: all)")
+    parser.add_argument("--eval-set", default=str(EVAL_SET_PATH))
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent inference requests")
+    parser.add_argument("--batch-size", type=int, help="Prompts per vLLM request (default: inference.batching.max_batch_size, 1 disables)")
+    parser.add_argument("--judge-workers", type=int, default=4, help="Concurrent judge requests")
+    parser.add_argument("--judge-batch-size", type=int, default=8, help="Answers scored per judge call")
+    parser.add_argument("--judge-rpm", type=float, default=30, help="Judge requests per minute")
+    parser.add_argument("--judge-burst", type=float, default=5, help="Judge requests allowed back to back")
+    parser.add_argument("--judge", help="Judge every domain with this backend from config judges.backends, e.g. stub for offline runs")
+    parser.add_argument("--retries", type=int, default=5, help="Retries on 429 / 5xx before giving up")
+    parser.add_argument("--checkpoint", default=str(CHECKPOINT_PATH))
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and start over")
+    return parser.parse_args()
+
 
-    conn.close()
-    print("[DONE] Metrics updated in PostgreSQL.")
+def main():
+    args = parse_args()
+    if args.judge:
+        os.environ[JUDGE_BACKEND_ENV] = args.judge
+    eval_set = json.load(open(args.eval_set))
+    config = load_config()
+    args.batch_size = max(args.batch_size or config["inference"]["batching"]["max_batch_size"], 1)
+
+    table = RoutingTable()
+    table.load()
+    checkpoint = Checkpoint(args.checkpoint, fresh=args.fresh)
+    profiles = GenerationProfiles(config["generation"], table)
+    tasks, skipped = build_tasks(eval_set, table, args.models, args.domains, checkpoint, profiles)
+    print(f"[BENCHMARK] {len(tasks)} tasks to run, {skipped} already in {args.checkpoint}")
+
+    metrics_writer = MetricsWriter(
+        penalty_multiplier=config["penalties"]["verification_fail_multiplier"],
+        flush_interval_s=config["metrics_writer"]["flush_interval_s"],
+        max_batch=config["metrics_writer"]["max_batch"],
+        queue_size=max(config["metrics_writer"]["queue_size"], len(tasks)),
+        half_life_s=config["metrics_writer"]["half_life_s"],
+        sketch_relative_accuracy=config["metrics_writer"]["sketch_relative_accuracy"],
+    )
+    metrics_writer.start()
+    try:
+        counts = run_benchmark(tasks, args, checkpoint, metrics_writer)
+    finally:
+        metrics_writer.close()
+        get_event_sink().close()
+        checkpoint.close()
+
+    print(f"[DONE] {counts['done']} scored, {counts['errors']} failed (rerun to resume). Metrics updated in PostgreSQL.")
+    print("[JUDGE THROTTLE]", counts["judge_throttle"])
+    print("[JUDGES]", get_judges().get_stats())
+    print("[LOCAL VERIFIER]", get_local_verifier().get_stats())
+    print("[METRICS WRITER]", metrics_writer.get_stats())
+    print("[POOL]", pool_stats())
 
 
 if __name__ == "__main__":
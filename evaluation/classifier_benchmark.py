@@ -0,0 +1,108 @@
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.local_classifier import LocalDomainClassifier, load_training_data, EVAL_SET_PATH
+
+THRESHOLDS = [0.0, 0.2, 0.3, 0.35, 0.4, 0.5, 0.6]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[k]
+
+
+def run_local(train_texts, train_labels, eval_texts, eval_labels):
+    t1 = time.time()
+    model = LocalDomainClassifier().fit(train_texts, train_labels)
+    train_s = time.time() - t1
+
+    predictions, latencies = [], []
+    for text in eval_texts:
+        t1 = time.perf_counter()
+        predictions.append(model.predict(text))
+        latencies.append((time.perf_counter() - t1) * 1000)
+
+    by_threshold = {}
+    for threshold in THRESHOLDS:
+        kept = [(p, l) for (p, c), l in zip(predictions, eval_labels) if c >= threshold]
+        by_threshold[threshold] = {
+            "coverage": len(kept) / len(eval_labels),
+            "accuracy": sum(p == l for p, l in kept) / len(kept) if kept else None,
+        }
+    return {
+        "train_size": len(train_texts),
+        "train_s": train_s,
+        "accuracy": sum(p == l for (p, _), l in zip(predictions, eval_labels)) / len(eval_labels),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "by_threshold": by_threshold,
+    }, predictions
+
+
+def run_llm(eval_texts, eval_labels):
+    from agents.domain_classifier import classify_llm
+
+    predictions, latencies = [], []
+    for text in eval_texts:
+        t1 = time.perf_counter()
+        try:
+            predictions.append(classify_llm(text))
+        except Exception as e:
+            print(f"[ERROR] LLM classification failed for {text!r}: {e}")
+            predictions.append(None)
+        latencies.append((time.perf_counter() - t1) * 1000)
+    return {
+        "accuracy": sum(p == l for p, l in zip(predictions, eval_labels)) / len(eval_labels),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+    }, predictions, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local domain classifier against the Gemini classifier")
+    parser.add_argument("--llm", action="store_true", help="Also run the Gemini classifier (network + DB required)")
+    parser.add_argument("--threshold", type=float, default=0.35, help="Local confidence threshold for the hybrid result")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    # eval_set.json is held out: the local model is trained on the seed set and logged classifications only
+    train_texts, train_labels = load_training_data(eval_set_path=None)
+    eval_texts, eval_labels = load_training_data(eval_set_path=EVAL_SET_PATH, log_path=None, seed_path=None)
+
+    report = {"eval_size": len(eval_texts)}
+    report["local"], local_predictions = run_local(train_texts, train_labels, eval_texts, eval_labels)
+
+    if args.llm:
+        report["llm"], llm_predictions, llm_latencies = run_llm(eval_texts, eval_labels)
+        hybrid_correct, hybrid_latency, escalated = 0, [], 0
+        for (local, confidence), llm, llm_ms, label in zip(local_predictions, llm_predictions, llm_latencies, eval_labels):
+            if confidence >= args.threshold:
+                hybrid_correct += local == label
+                hybrid_latency.append(report["local"]["latency_ms_p50"])
+            else:
+                escalated += 1
+                hybrid_correct += llm == label
+                hybrid_latency.append(llm_ms)
+        report["hybrid"] = {
+            "threshold": args.threshold,
+            "accuracy": hybrid_correct / len(eval_labels),
+            "llm_calls_avoided": 1 - escalated / len(eval_labels),
+            "latency_ms_mean": sum(hybrid_latency) / len(hybrid_latency),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import asyncio
 import json
@@ -7,46 +8,189 @@ import requests
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.gemini.client import GeminiClient
-from evaluation.prompts import FLUENCY_JUDGE_PROMPT, ACCURARY_JUDGE_PROMPT, SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT
+from utils.gemini.client import get_gemini_client
+from agents.advanced_verifier import verify as advanced_verify
+from agents.local_verifier import get_local_verifier
+from evaluation.prompts import (
+    FLUENCY_JUDGE_PROMPT, ACCURARY_JUDGE_PROMPT, SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT, BATCH_JUDGE_PROMPT
+)
 
 SUBJECTIVE_DOMAINS = ["Open-Ended Q&A / Conversational Quality", "Stress / Edge Cases"]
 
-gemini_client = GeminiClient()
+# Above this accuracy a reference-graded item counts as passed when the judge omits "passed"
+PASS_THRESHOLD = 0.5
+
+JSON_OBJECT_RE = re.compile(r"\{[^{}]*\}", re.DOTALL)
+
+gemini_client = get_gemini_client()
+local_verifier = get_local_verifier()
 
 def sanitize(response):
     cleaned = response.replace("```json", "").replace("```", "").strip()
     return json.loads(cleaned)
 
-async def judge_fluency(output):
-    prompt = FLUENCY_JUDGE_PROMPT.format(output=output)
-    response = await asyncio.to_thread(gemini_client.generate_content, prompt)
+def parse_json_array(response):
+    """Best-effort parse of a judge's JSON array; falls back to salvaging the objects one by one."""
+    cleaned = response.replace("```json", "").replace("```", "").strip()
+    start, end = cleaned.find("["), cleaned.rfind("]")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(cleaned[start:end + 1])
+            if isinstance(data, list):
+                return [item for item in data if isinstance(item, dict)]
+        except ValueError:
+            pass
+    objects = []
+    for match in JSON_OBJECT_RE.finditer(cleaned):
+        try:
+            objects.append(json.loads(match.group(0)))
+        except ValueError:
+            continue
+    return objects
+
+def clamp_score(value):
+    return min(max(float(value), 0.0), 1.0)
+
+async def judge_fluency(output, client=None):
+    prompt = FLUENCY_JUDGE_PROMPT.render(output=output)
+    response = await (client or gemini_client).agenerate_content(prompt)
     sanitized_response = sanitize(response)
     return sanitized_response.get("score", 0.0)
 
-def judge_accuracy(domain, q, expected, output):
+def accuracy_prompt(domain, q, expected, output):
     if domain in SUBJECTIVE_DOMAINS:
-        prompt = SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT.format(
-            q=q,
-            output=output
-        )
-    else:
-        prompt = ACCURARY_JUDGE_PROMPT.format(
+        return SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT.render(
             q=q,
-            expected=expected,
             output=output
         )
-    response = gemini_client.generate_content(prompt)
+    return ACCURARY_JUDGE_PROMPT.render(
+        q=q,
+        expected=expected,
+        output=output
+    )
+
+def local_accuracy(domain, q, expected, output):
+    """Score from the local verifier when the answer is objective and checkable, else None."""
+    if domain in SUBJECTIVE_DOMAINS:
+        return None
+    return local_verifier.verify(q, output, expected)
+
+def judge_accuracy(domain, q, expected, output):
+    score = local_accuracy(domain, q, expected, output)
+    if score is not None:
+        return score
+    response = gemini_client.generate_content(accuracy_prompt(domain, q, expected, output))
     sanitized_response = sanitize(response)
     return sanitized_response.get("score", 0.0)
 
+async def allm_accuracy(domain, q, expected, output, client=None):
+    response = await (client or gemini_client).agenerate_content(accuracy_prompt(domain, q, expected, output))
+    sanitized_response = sanitize(response)
+    return sanitized_response.get("score", 0.0)
+
+async def ajudge_accuracy(domain, q, expected, output, client=None):
+    score = local_accuracy(domain, q, expected, output)
+    if score is not None:
+        return score
+    return await allm_accuracy(domain, q, expected, output, client)
+
+def judge_mode(item):
+    if item.get("domain") in SUBJECTIVE_DOMAINS:
+        return "subjective"
+    return "reference" if item.get("expected") is not None else "verify"
+
+def build_batch_prompt(items):
+    entries = []
+    for i, item in enumerate(items):
+        entry = {"id": i, "mode": judge_mode(item), "question": item["q"], "output": item["output"]}
+        if entry["mode"] == "reference":
+            entry["expected"] = item["expected"]
+        entries.append(entry)
+    # One compact JSON object per line: no indentation tokens, still easy to tell items apart
+    return BATCH_JUDGE_PROMPT.render(items="\n".join(json.dumps(entry, ensure_ascii=False) for entry in entries))
+
+def parse_verdict(data):
+    accuracy = clamp_score(data["accuracy"])
+    passed = data.get("passed")
+    if passed is None:
+        passed = accuracy >= PASS_THRESHOLD
+    return {
+        "accuracy": accuracy,
+        "fluency": clamp_score(data["fluency"]),
+        "passed": str(passed).lower() == "true",
+    }
+
+async def ajudge_item(item, client=None):
+    """Per-item fallback: the original single-purpose judge calls, minus what the local verifier decides."""
+    accuracy = local_accuracy(item.get("domain"), item["q"], item.get("expected"), item["output"])
+    if accuracy is not None:
+        fluency = await judge_fluency(item["output"], client)
+    elif judge_mode(item) == "verify":
+        verify_result, fluency = await asyncio.gather(
+            advanced_verify(item["q"], item["output"], client=client),
+            judge_fluency(item["output"], client)
+        )
+        return {"accuracy": verify_result["accuracy"], "fluency": fluency, "passed": verify_result["passed"]}
+    else:
+        accuracy, fluency = await asyncio.gather(
+            allm_accuracy(item.get("domain"), item["q"], item.get("expected"), item["output"], client),
+            judge_fluency(item["output"], client)
+        )
+    return {"accuracy": accuracy, "fluency": fluency, "passed": accuracy >= PASS_THRESHOLD}
+
+async def ajudge_batch(items, fallback=True, client=None):
+    """Score accuracy, fluency and pass/fail for every item in a single LLM judge call.
+
+    Each item is a dict with q, output and optionally expected and domain (a domain name).
+    Items without an expected answer are fact-checked like the advanced verifier. Returns one
+    {accuracy, fluency, passed} per item in order. Items the judge skipped or garbled are
+    re-judged individually when `fallback` is set, otherwise left as None for the caller.
+    Items that could not be judged at all (Gemini unavailable) are None either way, so a judge
+    outage is never recorded as a wrong answer. `client` is any object with agenerate_content
+    (Gemini by default; see evaluation.judges for the per-domain choice of judge).
+    """
+    client = client or gemini_client
+    if not items:
+        return []
+    verdicts = [None] * len(items)
+    try:
+        response = await client.agenerate_content(build_batch_prompt(items))
+        for data in parse_json_array(response):
+            try:
+                i = int(data["id"])
+                if 0 <= i < len(items) and verdicts[i] is None:
+                    verdicts[i] = parse_verdict(data)
+            except (KeyError, TypeError, ValueError):
+                continue
+    except Exception as e:
+        if not fallback:
+            raise
+        print(f"[JUDGE] Batch of {len(items)} failed, judging individually: {e}")
+
+    missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    if missing:
+        print(f"[JUDGE] {len(missing)}/{len(items)} items missing from batch verdict")
+    if missing and fallback:
+        results = await asyncio.gather(*(ajudge_item(items[i], client) for i in missing), return_exceptions=True)
+        for i, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"[JUDGE] Item {i} failed: {result}")
+                result = None
+            verdicts[i] = result
+    return verdicts
+
 def main():
     domain = "Open-Ended Q&A / Conversational Quality"
     q = "What are some ways to reduce stress?"
     expected = "391"
     output = "Choose the most suitable option to answer the above question. Options:  A. meditation  B. exercise  C. eat more chocolate  D. talk on phone  E. drink alcohol\nA:\n\nA. Meditation, B. Exercise, and C. Eat more chocolate."
     print(judge_accuracy(domain, q, expected, output))
-    print(judge_fluency(output))
+    print(asyncio.run(judge_fluency(output)))
+    print(asyncio.run(ajudge_batch([
+        {"domain": domain, "q": q, "expected": expected, "output": output},
+        {"q": "What is 17 * 23?", "expected": "391", "output": "17 * 23 = 391"},
+        {"q": "What is the capital of Australia?", "output": "Sydney"},
+    ])))
 
 if __name__ == "__main__":
     main()
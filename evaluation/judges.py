@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from agents.model_registry import Endpoint
+from agents.local_verifier import get_local_verifier, words
+from utils.ratelimit import CircuitBreaker, is_retryable, retry, aretry
+from utils.router.config import load_config
+
+# Offline runs: JUDGE_BACKEND=stub judges every domain with the deterministic stub
+JUDGE_BACKEND_ENV = "JUDGE_BACKEND"
+
+# Above this accuracy a verdict counts as passed (same threshold as evaluation.evaluator)
+PASS_THRESHOLD = 0.5
+
+
+def token_f1(expected, output):
+    expected_words, output_words = words(expected), words(output)
+    if not expected_words or not output_words:
+        return 0.0
+    common = sum(min(expected_words.count(w), output_words.count(w)) for w in set(expected_words))
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(output_words), common / len(expected_words)
+    return 2 * precision * recall / (precision + recall)
+
+
+def heuristic_fluency(output):
+    """1.0 for ordinary text, lower the more the text repeats itself, 0.0 when empty."""
+    tokens = words(output)
+    if not tokens:
+        return 0.0
+    if len(tokens) < 6:
+        return 1.0
+    trigrams = [tuple(tokens[i:i + 3]) for i in range(len(tokens) - 2)]
+    return round(len(set(trigrams)) / len(trigrams), 2)
+
+
+class RuleJudge:
+    """Deterministic judge for objective answers: no network, no cost, same verdict every time.
+
+    The checks themselves are agents.local_verifier's. Leaves items it cannot decide as None
+    so the next judge in the domain's chain takes them. Its verdicts carry no fluency (None),
+    so only judged fluency reaches model_metrics. With `stub` set it decides everything (token
+    overlap with the expected answer, or heuristic fluency when there is none) and scores
+    fluency heuristically, which is only meant for offline runs and smoke tests.
+    """
+
+    def __init__(self, name="rules", stub=False):
+        self.name = name
+        self.stub = stub
+
+    def judge(self, item):
+        accuracy = get_local_verifier().verify(item["q"], item["output"], item.get("expected"))
+        fluency = heuristic_fluency(item["output"]) if self.stub else None
+        if accuracy is None and self.stub:
+            expected = item.get("expected")
+            accuracy = round(token_f1(expected, item["output"]), 2) if expected is not None else fluency
+        if accuracy is None:
+            return None
+        return {"accuracy": accuracy, "fluency": fluency, "passed": accuracy >= PASS_THRESHOLD}
+
+    async def ajudge_batch(self, items, fallback=True):
+        # Off the shared loop, so one slow check never stalls in-flight routes
+        return await asyncio.to_thread(lambda: [self.judge(item) for item in items])
+
+
+class LLMJudge:
+    """Batch judge prompt sent to any client with agenerate_content (Gemini or a local model)."""
+
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+
+    async def ajudge_batch(self, items, fallback=True):
+        from evaluation.evaluator import ajudge_batch
+        return await ajudge_batch(items, fallback=fallback, client=self.client)
+
+
+class OpenAICompatibleClient:
+    """Chat completions client for a local OpenAI-compatible server (e.g. a vLLM model as judge).
+
+    Same generate_content / agenerate_content interface as the Gemini client, with retries on
+    429 / 5xx / transport errors and a circuit breaker so a dead judge fails fast.
+    """
+
+    def __init__(self, url, model, api_key_env=None, timeout_s=60, max_tokens=1024, temperature=0.0, retries=2,
+                 backoff_base_s=0.5, backoff_max_s=10.0, failure_threshold=5, reset_timeout_s=30):
+        self.endpoint = Endpoint(url)  # keep-alive connection pools, as for the routed models
+        self.url = self.endpoint.base_url + "/v1/chat/completions"
+        self.model = model
+        self.timeout = httpx.Timeout(timeout_s, connect=5.0)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.retries = retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        api_key = os.getenv(api_key_env) if api_key_env else None
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.breaker = CircuitBreaker(f"judge {model}", failure_threshold, reset_timeout_s)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "succeeded": 0, "failed": 0, "retried": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _retryable(self, exc):
+        return isinstance(exc, httpx.TransportError) or is_retryable(exc)
+
+    def _on_retry(self, e, attempt, delay):
+        self._count("retried")
+        print(f"[JUDGE] {self.model} attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+
+    def _payload(self, prompt):
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+        }
+
+    def _post(self, prompt):
+        resp = self.endpoint.client().post(self.url, json=self._payload(prompt), headers=self.headers, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"]
+
+    async def _apost(self, prompt):
+        resp = await self.endpoint.async_client().post(
+            self.url, json=self._payload(prompt), headers=self.headers, timeout=self.timeout
+        )
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"]
+
+    def _finish(self, error=None):
+        if error is None:
+            self._count("succeeded")
+            self.breaker.record_success()
+            return
+        self._count("failed")
+        if self._retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def generate_content(self, prompt):
+        self.breaker.allow()
+        self._count("calls")
+        try:
+            text = retry(
+                self._post, prompt, retries=self.retries, base_s=self.backoff_base_s, max_s=self.backoff_max_s,
+                retry_on=self._retryable, on_retry=self._on_retry
+            )
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return text
+
+    async def agenerate_content(self, prompt):
+        self.breaker.allow()
+        self._count("calls")
+        try:
+            text = await aretry(
+                self._apost, prompt, retries=self.retries, base_s=self.backoff_base_s, max_s=self.backoff_max_s,
+                retry_on=self._retryable, on_retry=self._on_retry
+            )
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return text
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["circuit"] = self.breaker.get_stats()
+        return stats
+
+
+def build_judge(name, settings):
+    kind = settings.get("type", name)
+    params = {key: value for key, value in settings.items() if key != "type"}
+    if kind == "rules":
+        return RuleJudge(name)
+    if kind == "stub":
+        return RuleJudge(name, stub=True)
+    if kind == "gemini":
+        from utils.gemini.client import get_gemini_client
+        return LLMJudge(name, get_gemini_client())
+    if kind == "openai":
+        return LLMJudge(name, OpenAICompatibleClient(**params))
+    raise ValueError(f"Unknown judge type '{kind}' for judge '{name}'")
+
+
+class JudgePanel:
+    """Picks the judges for each item from its domain and merges their verdicts.
+
+    Every domain has a chain of judge backends (config `judges`); an item goes to the first
+    judge in its chain, and whatever that judge leaves undecided (or fails on) goes to the
+    next. Objective domains put the rule judge first, so only answers it cannot check
+    mechanically ever reach an LLM. Same contract as evaluator.ajudge_batch.
+    """
+
+    def __init__(self, settings, force=None):
+        self.settings = settings
+        self.force = force or settings.get("force")
+        self.default_chain = list(settings.get("default", ["gemini"]))
+        self.domain_chains = {domain: list(chain) for domain, chain in (settings.get("domains") or {}).items()}
+        self._backends = dict(settings.get("backends") or {})
+        self._judges = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+        if self.force:
+            print(f"[JUDGE] All domains judged by '{self.force}'")
+
+    def chain(self, domain):
+        if self.force:
+            return [self.force]
+        return self.domain_chains.get(domain, self.default_chain)
+
+    def judge(self, name):
+        with self._lock:
+            if name not in self._judges:
+                self._judges[name] = build_judge(name, self._backends.get(name, {"type": name}))
+                self.stats[name] = {"items": 0, "decided": 0, "errors": 0, "time_ms": 0.0}
+            return self._judges[name]
+
+    def _count(self, name, items, decided, errors, elapsed_ms):
+        with self._lock:
+            stats = self.stats[name]
+            stats["items"] += items
+            stats["decided"] += decided
+            stats["errors"] += errors
+            stats["time_ms"] += elapsed_ms
+
+    async def _run(self, name, items, fallback):
+        judge = self.judge(name)
+        t1 = time.perf_counter()
+        try:
+            verdicts = await judge.ajudge_batch(items, fallback=fallback)
+        except Exception as e:
+            self._count(name, len(items), 0, 1, (time.perf_counter() - t1) * 1000)
+            return e
+        decided = sum(verdict is not None for verdict in verdicts)
+        self._count(name, len(items), decided, 0, (time.perf_counter() - t1) * 1000)
+        return verdicts
+
+    async def ajudge_batch(self, items, fallback=True):
+        """One {accuracy, fluency, passed} or None per item, in order; fluency may be None.
+
+        Judges at the same step of their chains run concurrently. With `fallback` off, an
+        error from the last judge in a chain is raised (so callers can retry) instead of
+        leaving its items as None.
+        """
+        verdicts = [None] * len(items)
+        step = {i: 0 for i in range(len(items))}
+        while step:
+            groups = {}
+            for i, position in step.items():
+                groups.setdefault(self.chain(items[i].get("domain"))[position], []).append(i)
+            names = list(groups)
+            results = await asyncio.gather(*(
+                self._run(name, [items[i] for i in groups[name]], fallback) for name in names
+            ))
+            for name, result in zip(names, results):
+                if isinstance(result, Exception):
+                    print(f"[JUDGE] {name} failed on {len(groups[name])} items: {result}")
+                for n, i in enumerate(groups[name]):
+                    if isinstance(result, Exception) or result[n] is None:
+                        step[i] += 1
+                        if step[i] < len(self.chain(items[i].get("domain"))):
+                            continue
+                        if isinstance(result, Exception) and not fallback:
+                            raise result
+                    else:
+                        verdicts[i] = result[n]
+                    del step[i]
+        return verdicts
+
+    def get_stats(self):
+        with self._lock:
+            judges = {name: dict(stats) for name, stats in self.stats.items()}
+            clients = {
+                name: judge.client for name, judge in self._judges.items()
+                if isinstance(getattr(judge, "client", None), OpenAICompatibleClient)
+            }
+        # Gemini reports its own stats (shared with the classifier); local judges report here
+        for name, client in clients.items():
+            judges[name]["client"] = client.get_stats()
+        return {"force": self.force, "judges": judges}
+
+
+_panel = None
+_panel_lock = threading.Lock()
+
+def get_judges(config=None):
+    global _panel
+    if _panel is None:
+        with _panel_lock:
+            if _panel is None:
+                settings = (config or load_config()).get("judges", {})
+                _panel = JudgePanel(settings, force=os.getenv(JUDGE_BACKEND_ENV))
+    return _panel
@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from evaluation.mocks import MockVLLM, MockGenAI, vary
+from evaluation.prompt_benchmark import percentile
+from utils.router.config import load_config
+
+EVAL_SET_PATH = Path(__file__).parent / "eval_set.json"
+PROMPT_FIELDS = ("q", "prompt", "query", "body", "title")
+STAGES = ("classification_ms", "selection_ms", "inference_ms", "total_ms")
+
+
+def load_prompts(path):
+    """Prompts from eval_set.json (a JSON list) or a JSONL file, with (domain id or None) per prompt."""
+    with open(path) as f:
+        text = f.read()
+    rows = json.loads(text) if text.lstrip().startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    prompts = []
+    for row in rows:
+        prompt = row if isinstance(row, str) else next((row[field] for field in PROMPT_FIELDS if row.get(field)), None)
+        if prompt:
+            prompts.append((prompt, None if isinstance(row, str) else row.get("domain")))
+    return prompts
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+class Recorder:
+    """Outcome of every request, appended from driver and completion threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, scheduled, sent, finished, status, response=None, ttft_ms=None):
+        response = response or {}
+        timings = response.get("timings") or {}
+        metrics = response.get("metrics") or {}
+        sample = {
+            "status": status,
+            "cached": bool(response.get("cached")),
+            "schedule_lag_ms": (sent - scheduled) * 1000,
+            "end_to_end_ms": (finished - sent) * 1000,
+            "ttft_ms": ttft_ms if ttft_ms is not None else metrics.get("ttft_ms"),
+            "model_latency_ms": metrics.get("latency_ms"),
+            "attempts": (response.get("attempts") or {}).get("attempts"),
+        }
+        sample.update({stage: timings.get(stage) for stage in STAGES})
+        with self._lock:
+            self.samples.append(sample)
+
+    def report(self, elapsed_s):
+        with self._lock:
+            samples = list(self.samples)
+        ok = [s for s in samples if s["status"] == "ok"]
+        # Cache hits skip the pipeline, so stage latencies are over the routed requests only
+        routed = [s for s in ok if not s["cached"]]
+        statuses = {}
+        for s in samples:
+            statuses[s["status"]] = statuses.get(s["status"], 0) + 1
+        return {
+            "requests": len(samples),
+            "ok": len(ok),
+            "cached": len(ok) - len(routed),
+            "statuses": statuses,
+            "error_rate": 1 - len(ok) / len(samples) if samples else 0.0,
+            "duration_s": elapsed_s,
+            "achieved_qps": len(samples) / elapsed_s if elapsed_s else 0.0,
+            "throughput_rps": len(ok) / elapsed_s if elapsed_s else 0.0,
+            "latency_ms": {
+                "end_to_end": summarize([s["end_to_end_ms"] for s in ok]),
+                "schedule_lag": summarize([s["schedule_lag_ms"] for s in samples]),
+                **{stage[:-len("_ms")]: summarize([s[stage] for s in routed]) for stage in STAGES},
+                "ttft": summarize([s["ttft_ms"] for s in routed]),
+                "model": summarize([s["model_latency_ms"] for s in routed]),
+            },
+            "attempts": summarize([s["attempts"] for s in routed]),
+        }
+
+
+def start_mocks(args):
+    """Mock vLLM and Gemini have to be in place before the router is imported."""
+    mocks = {}
+    if args.mock_vllm:
+        mocks["vllm"] = MockVLLM(
+            ttft_ms=args.vllm_ttft_ms, ttft_sigma=args.vllm_sigma, token_ms=args.vllm_token_ms,
+            token_sigma=args.vllm_sigma, max_tokens=args.vllm_max_tokens, error_rate=args.vllm_error_rate,
+            rate_limit_rate=args.vllm_429_rate, hang_rate=args.vllm_hang_rate, seed=args.seed,
+        ).start()
+        os.environ["VLLM_URLS"] = mocks["vllm"].url
+        print(f"[LOADTEST] Mock vLLM at {mocks['vllm'].url}")
+    if args.mock_gemini:
+        from utils.gemini.client import GeminiClient, set_gemini_client
+
+        mocks["gemini"] = MockGenAI(
+            latency_ms=args.gemini_latency_ms, latency_sigma=args.gemini_sigma, error_rate=args.gemini_error_rate,
+            seed=args.seed,
+        )
+        settings = dict(load_config().get("gemini", {}))
+        if args.gemini_rpm:
+            settings["rpm"] = args.gemini_rpm
+        set_gemini_client(GeminiClient(**settings, client=mocks["gemini"]))
+        print(f"[LOADTEST] Mock Gemini ({settings.get('rpm')} rpm limit still applies)")
+    return mocks
+
+
+def start_server():
+    """Serve the Flask API in-process on a free port; returns its base url."""
+    from werkzeug.serving import make_server
+    from server.server import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-api", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def route_sender(args, recorder):
+    """Calls aroute() on the shared loop; completions are recorded from its done callback."""
+    from utils.aio import submit
+    from utils.router.router import aroute
+    from utils.router.load import Overloaded
+
+    def send(prompt, scheduled, done):
+        first_token = []
+
+        def on_token(text, confidence):
+            if not first_token:
+                first_token.append(time.time())
+
+        sent = time.time()
+        future = submit(aroute(prompt, on_token=on_token if args.stream else None))
+
+        def on_done(f):
+            finished = time.time()
+            ttft_ms = (first_token[0] - sent) * 1000 if first_token else None
+            try:
+                recorder.add(scheduled, sent, finished, "ok", f.result(), ttft_ms)
+            except Overloaded:
+                recorder.add(scheduled, sent, finished, "shed")
+            except Exception as e:
+                recorder.add(scheduled, sent, finished, type(e).__name__)
+            done()
+
+        future.add_done_callback(on_done)
+
+    return send
+
+
+def http_sender(args, recorder, base_url):
+    """POSTs to /api/generate_answer (or /api/stream) from a thread pool."""
+    import httpx
+
+    client = httpx.Client(timeout=args.timeout_s, limits=httpx.Limits(max_connections=args.max_in_flight))
+    pool = ThreadPoolExecutor(args.max_in_flight, thread_name_prefix="loadtest")
+
+    def post(prompt):
+        if not args.stream:
+            resp = client.post(f"{base_url}/api/generate_answer", json={"query": prompt})
+            return resp.status_code, resp.json() if resp.status_code == 200 else None, None
+        ttft, event = None, None
+        with client.stream("POST", f"{base_url}/api/stream", json={"query": prompt}) as resp:
+            if resp.status_code != 200:
+                return resp.status_code, None, None
+            for line in resp.iter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                    if event == "token" and ttft is None:
+                        ttft = time.time()
+                elif line.startswith("data:") and event in ("result", "overloaded", "error"):
+                    result = json.loads(line[len("data:"):])
+                    status = {"result": 200, "overloaded": 503}.get(event, 500)
+                    return status, result if event == "result" else None, ttft
+        return 500, None, ttft
+
+    def run(prompt, scheduled, sent, done):
+        try:
+            status, response, ttft = post(prompt)
+            finished = time.time()
+            ttft_ms = (ttft - sent) * 1000 if ttft else None
+            outcome = "ok" if status == 200 else ("shed" if status == 503 else f"http_{status}")
+            recorder.add(scheduled, sent, finished, outcome, response, ttft_ms)
+        except Exception as e:
+            recorder.add(scheduled, sent, time.time(), type(e).__name__)
+        finally:
+            done()
+
+    def send(prompt, scheduled, done):
+        pool.submit(run, prompt, scheduled, time.time(), done)
+
+    return send
+
+
+def drive(send, prompts, args):
+    """Open-loop replay: request i is sent at start + i / qps whatever the latency of earlier ones.
+
+    Requests that would exceed `max_in_flight` are counted as dropped rather than delaying the
+    schedule, so overload shows up in the report instead of silently lowering the offered QPS.
+    """
+    total = args.requests or int(args.qps * args.duration_s)
+    in_flight = [0]
+    lock = threading.Lock()
+    idle = threading.Condition(lock)
+    dropped = 0
+
+    def done():
+        with idle:
+            in_flight[0] -= 1
+            idle.notify_all()
+
+    start = time.time()
+    for i in range(total):
+        scheduled = start + i / args.qps
+        delay = scheduled - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        prompt = prompts[i % len(prompts)]
+        if args.vary:
+            # Defeats the classification and response caches so every request runs the pipeline
+            prompt = vary(prompt, i)
+        with lock:
+            if in_flight[0] >= args.max_in_flight:
+                dropped += 1
+                continue
+            in_flight[0] += 1
+        send(prompt, scheduled, done)
+    with idle:
+        idle.wait_for(lambda: in_flight[0] == 0, timeout=args.timeout_s)
+        unfinished = in_flight[0]
+    return time.time() - start, dropped, unfinished
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay prompts at a target QPS against route() or the HTTP API and report latency per stage")
+    parser.add_argument("--target", choices=("route", "http"), default="route")
+    parser.add_argument("--url", help="Base url of a running server for --target http (default: serve the API in-process)")
+    parser.add_argument("--prompts", default=str(EVAL_SET_PATH), help="eval_set.json or a JSONL file with q/prompt/query/body per line")
+    parser.add_argument("--qps", type=float, default=5.0)
+    parser.add_argument("--duration-s", type=float, default=30.0)
+    parser.add_argument("--requests", type=int, help="Send exactly this many requests (overrides --duration-s)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Requests beyond this are dropped and reported")
+    parser.add_argument("--timeout-s", type=float, default=120.0)
+    parser.add_argument("--stream", action="store_true", help="Stream tokens (route on_token / /api/stream) and report client-side TTFT")
+    parser.add_argument("--vary", action="store_true", help="Make every prompt unique so caches never answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock-vllm", action="store_true", help="Serve /v1/completions from an in-process mock")
+    parser.add_argument("--vllm-ttft-ms", type=float, default=80.0)
+    parser.add_argument("--vllm-token-ms", type=float, default=8.0)
+    parser.add_argument("--vllm-sigma", type=float, default=0.5, help="Lognormal spread of mock vLLM latencies")
+    parser.add_argument("--vllm-max-tokens", type=int, default=48)
+    parser.add_argument("--vllm-error-rate", type=float, default=0.0, help="Share of completions answered with 500")
+    parser.add_argument("--vllm-429-rate", type=float, default=0.0, help="Share of completions answered with 429")
+    parser.add_argument("--vllm-hang-rate", type=float, default=0.0, help="Share of completions that hang past the client timeout")
+    parser.add_argument("--mock-gemini", action="store_true", help="Answer Gemini calls from a local stub (rate limits, retries and breaker stay real)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    parser.add_argument("--gemini-sigma", type=float, default=0.4)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-rpm", type=float, help="Override gemini.rpm for the run")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    mocks = start_mocks(args)
+    prompts = load_prompts(args.prompts)
+
+    from utils.router import router
+
+    if "gemini" in mocks:
+        # eval_set prompts are classified into their labelled domain, everything else by a stable hash
+        mocks["gemini"].domains = {
+            prompt: router.routing_table.domain_name(domain) for prompt, domain in prompts if domain is not None
+        }
+    recorder = Recorder()
+    if args.target == "route":
+        send = route_sender(args, recorder)
+    else:
+        base_url = args.url or start_server()
+        send = http_sender(args, recorder, base_url)
+    print(f"[LOADTEST] {args.target}: {args.requests or int(args.qps * args.duration_s)} requests at {args.qps} qps "
+          f"from {len(prompts)} prompts in {args.prompts}")
+
+    elapsed_s, dropped, unfinished = drive(send, [prompt for prompt, _ in prompts], args)
+    report = recorder.report(elapsed_s)
+    report["dropped"] = dropped
+    report["unfinished"] = unfinished
+    report["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    report["router"] = {
+        "batcher": router.batcher.get_stats(),
+        "load": router.load_tracker.get_stats(),
+        "evaluation_pool": router.evaluation_pool.get_stats(),
+        "judges": router.judges.get_stats(),
+        "gemini": router.gemini_client.get_stats(),
+    }
+    report["mocks"] = {name: mock.get_stats() for name, mock in mocks.items()}
+
+    latency = report["latency_ms"]
+    print(f"[LOADTEST] {report['ok']}/{report['requests']} ok ({report['cached']} cached, {dropped} dropped, "
+          f"{unfinished} unfinished), "
+          f"error rate {report['error_rate']:.1%}, {report['throughput_rps']:.2f} req/s over {elapsed_s:.1f}s")
+    for stage, stats in latency.items():
+        if stats["count"]:
+            print(f"[LOADTEST] {stage:<16} p50={stats['p50']:.1f}ms p95={stats['p95']:.1f}ms p99={stats['p99']:.1f}ms")
+    print("[LOADTEST] Statuses:", report["statuses"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[LOADTEST] Report written to {args.output}")
+    router.metrics_writer.close()
+    router.event_sink.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.local_verifier import arithmetic_expression, safe_eval
+from agents.prompts import DOMAIN_CLASSIFIER_PROMPT, VERIFIER_PROMPT, ADVANCED_VERIFIER_PROMPT
+from evaluation.prompts import BATCH_JUDGE_PROMPT
+from utils.prompt_template import estimate_tokens
+
+VARY_RE = re.compile(r" \[\d+\]$")
+
+FILLER = ("this is a simulated answer from the mock inference server used for load testing the "
+          "router end to end without any real model behind it").split()
+
+
+def lognormal_ms(median_ms, sigma, rng=random):
+    """A latency sample: lognormal around `median_ms`, `sigma` sets the tail (0 is constant)."""
+    if median_ms <= 0:
+        return 0.0
+    return median_ms * math.exp(rng.gauss(0.0, sigma)) if sigma > 0 else median_ms
+
+
+def vary(prompt, i):
+    """A unique copy of a prompt (defeats caches); the mocks still answer it as the original."""
+    return f"{prompt} [{i}]"
+
+
+def unvary(prompt):
+    return VARY_RE.sub("", prompt)
+
+
+def canned_answer(prompt, max_tokens):
+    """Arithmetic prompts get the right number (so verification passes), others filler text."""
+    expr = arithmetic_expression(unvary(prompt))
+    value = safe_eval(expr) if expr else None
+    if value is not None:
+        words = [f"{value:g}"]
+    else:
+        words = [FILLER[i % len(FILLER)] for i in range(max(max_tokens, 1))]
+    return [" " + word for word in words[:max(max_tokens, 1)]]
+
+
+class MockVLLM:
+    """In-process HTTP server speaking vLLM's /v1/completions, /health and /metrics.
+
+    Completions (single, list-prompt batches and SSE streams) return filler tokens with
+    logprobs and usage after a lognormal time to first token plus a per-token delay. A
+    fraction of requests can be made to fail with 500, 429 or a hang past the client timeout.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ttft_ms=80.0, ttft_sigma=0.5, token_ms=8.0, token_sigma=0.3,
+                 max_tokens=48, error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_s=90.0, seed=None):
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.token_ms = token_ms
+        self.token_sigma = token_sigma
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.hang_s = hang_s
+        self.healthy = True
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.stats = {"requests": 0, "prompts": 0, "streams": 0, "tokens": 0, "errors": 0, "rate_limited": 0, "hangs": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-vllm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, running=self.running)
+
+    def fault(self):
+        """None, or the injected failure for this request: 'error', 'rate_limited' or 'hang'."""
+        roll = self.random.random()
+        for kind, rate in (("error", self.error_rate), ("rate_limited", self.rate_limit_rate), ("hang", self.hang_rate)):
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    def completion(self, payload):
+        """(choices as lists of tokens, prompt token count) for a request, before any delay."""
+        prompts = payload.get("prompt", "")
+        prompts = prompts if isinstance(prompts, list) else [prompts]
+        max_tokens = min(int(payload.get("max_tokens") or self.max_tokens), self.max_tokens)
+        choices = [canned_answer(prompt, max_tokens) for prompt in prompts]
+        return choices, sum(estimate_tokens(prompt) for prompt in prompts)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_text(self, status, text):
+                data = text.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self.send_text(200 if mock.healthy else 503, "")
+                elif self.path == "/metrics":
+                    with mock._lock:
+                        running = mock.running
+                    self.send_text(200, (
+                        "# TYPE vllm:num_requests_running gauge\n"
+                        f'vllm:num_requests_running{{model_name="mock"}} {running}\n'
+                        "# TYPE vllm:num_requests_waiting gauge\n"
+                        'vllm:num_requests_waiting{model_name="mock"} 0\n'
+                    ))
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/v1/completions":
+                    self.send_json(404, {"error": "not found"})
+                    return
+                mock._count("requests")
+                fault = mock.fault()
+                if fault is not None:
+                    mock._count({"error": "errors", "rate_limited": "rate_limited", "hang": "hangs"}[fault])
+                    if fault == "hang":
+                        time.sleep(mock.hang_s)
+                    status = 429 if fault == "rate_limited" else 500
+                    self.send_json(status, {"error": {"message": f"injected {fault}", "code": status}})
+                    return
+                choices, prompt_tokens = mock.completion(payload)
+                mock._count("prompts", len(choices))
+                with mock._lock:
+                    mock.running += len(choices)
+                try:
+                    if payload.get("stream"):
+                        self.stream(payload, choices, prompt_tokens)
+                    else:
+                        self.complete(payload, choices, prompt_tokens)
+                finally:
+                    with mock._lock:
+                        mock.running -= len(choices)
+
+            def usage(self, choices, prompt_tokens):
+                completion_tokens = sum(len(tokens) for tokens in choices)
+                mock._count("tokens", completion_tokens)
+                return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens}
+
+            def logprobs(self, tokens):
+                return {"tokens": tokens, "token_logprobs": [-mock.random.uniform(0.01, 0.7) for _ in tokens]}
+
+            def complete(self, payload, choices, prompt_tokens):
+                # A batch finishes when its longest sequence does
+                longest = max(len(tokens) for tokens in choices)
+                delay_ms = lognormal_ms(mock.ttft_ms, mock.ttft_sigma, mock.random)
+                delay_ms += sum(lognormal_ms(mock.token_ms, mock.token_sigma, mock.random) for _ in range(longest - 1))
+                time.sleep(delay_ms / 1000)
+                self.send_json(200, {
+                    "id": f"cmpl-mock-{time.time_ns()}",
+                    "object": "text_completion",
+                    "model": payload.get("model"),
+                    "choices": [
+                        {"index": i, "text": "".join(tokens), "logprobs": self.logprobs(tokens),
+                         "finish_reason": "length" if len(tokens) >= mock.max_tokens else "stop"}
+                        for i, tokens in enumerate(choices)
+                    ],
+                    "usage": self.usage(choices, prompt_tokens),
+                })
+
+            def chunk(self, data):
+                body = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+
+            def stream(self, payload, choices, prompt_tokens):
+                mock._count("streams")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                tokens = choices[0]
+                time.sleep(lognormal_ms(mock.ttft_ms, mock.ttft_sigma, mock.random) / 1000)
+                for n, token in enumerate(tokens):
+                    if n:
+                        time.sleep(lognormal_ms(mock.token_ms, mock.token_sigma, mock.random) / 1000)
+                    self.chunk(json.dumps({"choices": [{"index": 0, "text": token, "logprobs": self.logprobs([token])}]}))
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    self.chunk(json.dumps({"choices": [], "usage": self.usage([tokens], prompt_tokens)}))
+                self.chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+class MockGeminiError(Exception):
+    """Shaped like the SDK's API errors (a numeric `code`) so retries and the breaker react."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class MockGenAI:
+    """Stands in for google.genai.Client inside GeminiClient: models.generate_content, sync and aio.
+
+    Answers each prompt by its template: the classifier gets a domain (from `domains`, a
+    prompt -> domain name map, else a stable pick from the listed domains), judges get
+    well-formed JSON verdicts. Latency is lognormal; `error_rate` fails calls with 503.
+    """
+
+    def __init__(self, latency_ms=300.0, latency_sigma=0.4, error_rate=0.0, domains=None, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.domains = domains or {}
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "errors": 0, "by_prompt": {}}
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.agenerate_content))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, by_prompt=dict(self.stats["by_prompt"]))
+
+    def classify(self, contents):
+        listed = re.search(r"Domains:\n(.*?)\n\nPrompt to classify:\n\"(.*)\"$", contents, re.DOTALL)
+        names = [line[2:] for line in listed.group(1).splitlines() if line.startswith("- ")] if listed else []
+        prompt = unvary(listed.group(2) if listed else contents)
+        if prompt in self.domains:
+            return self.domains[prompt]
+        return names[sum(map(ord, prompt)) % len(names)] if names else ""
+
+    def batch_verdicts(self, contents):
+        listed = re.search(r"Items, one JSON object per line:\n(.*?)\n\nReturn the JSON array:", contents, re.DOTALL)
+        verdicts = []
+        for line in (listed.group(1).splitlines() if listed else []):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            accuracy = round(self.random.uniform(0.6, 1.0), 2)
+            verdicts.append({"id": item.get("id"), "accuracy": accuracy, "fluency": round(self.random.uniform(0.7, 1.0), 2),
+                             "passed": accuracy >= 0.7, "reason": "mock verdict"})
+        return json.dumps(verdicts)
+
+    def answer(self, contents):
+        if contents.startswith(DOMAIN_CLASSIFIER_PROMPT.static_prefix):
+            return "classifier", self.classify(contents)
+        if contents.startswith(BATCH_JUDGE_PROMPT.static_prefix):
+            return "batch_judge", self.batch_verdicts(contents)
+        if contents.startswith(ADVANCED_VERIFIER_PROMPT.static_prefix):
+            return "advanced_verifier", json.dumps({"reason": "mock", "accuracy": 0.9, "passed": True})
+        if contents.startswith(VERIFIER_PROMPT.static_prefix):
+            return "verifier", "true"
+        # Fluency and single-item accuracy judges
+        return "judge", json.dumps({"score": round(self.random.uniform(0.6, 1.0), 2), "reason": "mock"})
+
+    def respond(self, contents):
+        kind, text = self.answer(contents)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["by_prompt"][kind] = self.stats["by_prompt"].get(kind, 0) + 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+        if failed:
+            raise MockGeminiError(503, "UNAVAILABLE (injected)")
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(contents), cached_content_token_count=0,
+                                candidates_token_count=estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, model=None, contents=""):
+        time.sleep(lognormal_ms(self.latency_ms, self.latency_sigma, self.random) / 1000)
+        return self.respond(contents)
+
+    async def agenerate_content(self, model=None, contents=""):
+        await asyncio.sleep(lognormal_ms(self.latency_ms, self.latency_sigma, self.random) / 1000)
+        return self.respond(contents)
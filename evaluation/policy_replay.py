@@ -0,0 +1,136 @@
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db.client import cursor
+from agents.policies import BanditStats, GreedyPolicy, ThompsonPolicy, UCBPolicy, compute_reward
+from agents.scorer import fleet_latency_bounds
+from utils.router.config import load_config
+
+POLICIES = {
+    "greedy": lambda stats, seed: GreedyPolicy(stats, seed=seed),
+    "thompson": lambda stats, seed: ThompsonPolicy(stats, seed=seed),
+    "ucb": lambda stats, seed: UCBPolicy(stats, seed=seed),
+}
+
+
+def load_events(input_path=None, limit=None):
+    """Logged outcomes in time order: from a JSONL export or straight from model_metric_events."""
+    if input_path:
+        with open(input_path) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        return events[:limit]
+    with cursor() as cur:
+        cur.execute("""
+            SELECT model_id, domain_id, latency_ms, cost, success, correct
+            FROM model_metric_events
+            WHERE correct IS NOT NULL OR NOT success
+            ORDER BY id
+            LIMIT %s;
+        """, (limit,))
+        return [dict(row) for row in cur.fetchall()]
+
+
+def replay(policy, events, candidates, latency_weight, latency_bounds):
+    """Rejection-sampling replay: an event only counts when the policy's pick matches the logged model.
+
+    The policy learns only from matched events, so the result is an unbiased estimate of its
+    online reward as long as the logged traffic spread over the candidate models.
+    """
+    matched, reward_sum, latency_sum, cost_sum, passed_sum, share = 0, 0.0, 0.0, 0.0, 0, {}
+    for event in events:
+        domain_id = event["domain_id"]
+        if policy.rank(domain_id, candidates[domain_id], k=1)[0] != event["model_id"]:
+            continue
+        passed = bool(event["success"]) and bool(event["correct"])
+        reward = compute_reward(passed, event["latency_ms"] or 0.0, event["cost"] or 0.0, latency_weight, latency_bounds)
+        policy.update(event["model_id"], domain_id, reward)
+        matched += 1
+        reward_sum += reward
+        latency_sum += event["latency_ms"] or 0.0
+        cost_sum += event["cost"] or 0.0
+        passed_sum += passed
+        share[event["model_id"]] = share.get(event["model_id"], 0) + 1
+    return {
+        "matched": matched,
+        "mean_reward": reward_sum / matched if matched else None,
+        "pass_rate": passed_sum / matched if matched else None,
+        "mean_latency_ms": latency_sum / matched if matched else None,
+        "mean_cost": cost_sum / matched if matched else None,
+        "model_share": {model_id: n / matched for model_id, n in sorted(share.items())},
+        "explored": policy.counters["explored"] / (policy.counters["ranked"] or 1),
+    }
+
+
+def logged_baseline(events, latency_weight, latency_bounds):
+    rewards = [
+        compute_reward(
+            bool(e["success"]) and bool(e["correct"]), e["latency_ms"] or 0.0, e["cost"] or 0.0,
+            latency_weight, latency_bounds
+        )
+        for e in events
+    ]
+    return {"events": len(events), "mean_reward": sum(rewards) / len(rewards) if rewards else None}
+
+
+def average(runs):
+    keys = ("matched", "mean_reward", "pass_rate", "mean_latency_ms", "mean_cost", "explored")
+    report = {}
+    for key in keys:
+        values = [run[key] for run in runs if run[key] is not None]
+        report[key] = sum(values) / len(values) if values else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged routing outcomes to compare routing policies offline")
+    parser.add_argument("--input", help="JSONL of events (model_id, domain_id, latency_ms, cost, success, correct); default: the database")
+    parser.add_argument("--limit", type=int, help="Only the first N events")
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--runs", type=int, default=10, help="Replays per policy, each with its own seed")
+    parser.add_argument("--shuffle", action="store_true", help="Shuffle events per run instead of keeping log order")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    latency_weight = load_config()["weights"]["latency"]
+    events = load_events(args.input, args.limit)
+    if not events:
+        print("[REPLAY] No events with outcomes to replay.")
+        return
+    candidates = {}
+    for event in events:
+        candidates.setdefault(event["domain_id"], set()).add(event["model_id"])
+    candidates = {domain_id: sorted(model_ids) for domain_id, model_ids in candidates.items()}
+    # The router scores rewards on the fleet's latency scale; the logged latencies stand in for it here
+    latency_bounds = fleet_latency_bounds([event["latency_ms"] for event in events if event["latency_ms"]])
+
+    report = {"logged": logged_baseline(events, latency_weight, latency_bounds), "policies": {}}
+    print(f"[REPLAY] {len(events)} events, {len(candidates)} domains, logged mean reward {report['logged']['mean_reward']:.4f}")
+    for name in args.policies:
+        runs = []
+        for seed in range(args.runs):
+            run_events = list(events)
+            if args.shuffle:
+                random.Random(seed).shuffle(run_events)
+            policy = POLICIES[name](BanditStats(persist=False), seed)
+            runs.append(replay(policy, run_events, candidates, latency_weight, latency_bounds))
+        report["policies"][name] = dict(average(runs), last_run_model_share=runs[-1]["model_share"])
+        summary = report["policies"][name]
+        print(
+            f"[REPLAY] {name:<9} matched={summary['matched']:.0f} reward={summary['mean_reward'] or 0:.4f} "
+            f"pass={summary['pass_rate'] or 0:.3f} latency={summary['mean_latency_ms'] or 0:.0f}ms "
+            f"cost={summary['mean_cost'] or 0:.4f} explored={summary['explored']:.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[REPLAY] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import agents.prompts as agent_prompts
+import evaluation.prompts as evaluation_prompts
+from utils.prompt_template import estimate_tokens
+
+ROOT = Path(__file__).parent.parent
+EVAL_SET_PATH = Path(__file__).parent / "eval_set.json"
+PROMPT_FILES = ("evaluation/prompts.py", "agents/prompts.py")
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[k]
+
+
+def batch_items(items, indent):
+    entries = [{"id": i, "mode": "reference", "question": item["q"], "output": item["a"], "expected": item["a"]}
+               for i, item in enumerate(items)]
+    if indent:
+        # How build_batch_prompt formatted items before the prompt rendering layer
+        return json.dumps(entries, indent=1, ensure_ascii=False)
+    return "\n".join(json.dumps(entry, ensure_ascii=False) for entry in entries)
+
+
+def cases(items, batch_size, legacy):
+    """name -> (template name in agents/ or evaluation/prompts.py, [format values per call])."""
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    return {
+        "fluency_judge": ("FLUENCY_JUDGE_PROMPT", [{"output": item["a"]} for item in items]),
+        "accuracy_judge": ("ACCURARY_JUDGE_PROMPT", [
+            {"q": item["q"], "expected": item["a"], "output": item["a"]} for item in items
+        ]),
+        "subjective_accuracy_judge": ("SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT", [
+            {"q": item["q"], "output": item["a"]} for item in items
+        ]),
+        "advanced_verifier": ("ADVANCED_VERIFIER_PROMPT", [
+            {"q": item["q"], "model_output": item["a"]} for item in items
+        ]),
+        "batch_judge": ("BATCH_JUDGE_PROMPT", [{"items": batch_items(batch, indent=legacy)} for batch in batches]),
+    }
+
+
+def load_baseline(ref):
+    """Prompt constants as they were at git `ref`, rendered the way that revision rendered them."""
+    prompts = {}
+    for path in PROMPT_FILES:
+        source = subprocess.run(
+            ["git", "show", f"{ref}:{path}"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        namespace = {}
+        exec(compile(source, f"{ref}:{path}", "exec"), namespace)
+        for name, value in namespace.items():
+            if name.endswith("_PROMPT"):
+                prompts[name] = value.render if hasattr(value, "render") else value.format
+    return prompts
+
+
+def current_prompts():
+    return {
+        name: value.render
+        for module in (evaluation_prompts, agent_prompts)
+        for name, value in vars(module).items()
+        if name.endswith("_PROMPT")
+    }
+
+
+def render_all(prompts, items, batch_size, legacy):
+    rendered = {}
+    for case, (name, values) in cases(items, batch_size, legacy).items():
+        if name not in prompts:
+            # Older revisions predate some prompts (e.g. BATCH_JUDGE_PROMPT)
+            print(f"[PROMPTS] {name} not defined in this revision; skipping {case}")
+            continue
+        t1 = time.perf_counter()
+        texts = [prompts[name](**v) for v in values]
+        render_us = (time.perf_counter() - t1) * 1e6 / len(values)
+        rendered[case] = (texts, render_us)
+    return rendered
+
+
+def measure(texts, render_us):
+    """Size per call and the prefix every call shares, which is what a prompt cache can reuse."""
+    tokens = [estimate_tokens(text) for text in texts]
+    shared_prefix = os.path.commonprefix(texts)
+    return {
+        "calls": len(texts),
+        "avg_chars": sum(len(text) for text in texts) / len(texts),
+        "avg_tokens_est": sum(tokens) / len(tokens),
+        "shared_prefix_tokens_est": estimate_tokens(shared_prefix),
+        "shared_prefix_share": len(shared_prefix) / (sum(len(text) for text in texts) / len(texts)),
+        "render_us": render_us,
+    }
+
+
+def run_live(texts, samples):
+    """Send prompts to the Gemini judge model; latency plus the token usage Gemini reports."""
+    from utils.gemini.client import get_gemini_client
+
+    gemini_client = get_gemini_client()
+    latencies, prompt_tokens, cached_tokens, output_tokens, errors = [], [], [], [], 0
+    for text in texts[:samples]:
+        t1 = time.perf_counter()
+        try:
+            response = gemini_client.generate(text)
+        except Exception as e:
+            print(f"[ERROR] Judge call failed: {e}")
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - t1) * 1000)
+        usage = response.usage_metadata
+        prompt_tokens.append(usage.prompt_token_count or 0)
+        cached_tokens.append(usage.cached_content_token_count or 0)
+        output_tokens.append(usage.candidates_token_count or 0)
+    n = len(latencies) or 1
+    return {
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "prompt_tokens": sum(prompt_tokens) / n,
+        "cached_tokens": sum(cached_tokens) / n,
+        "output_tokens": sum(output_tokens) / n,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure judge prompt size, cacheable prefix and latency, before and after")
+    parser.add_argument("--baseline-ref", help="Git revision whose prompts to compare against, e.g. the commit before the prompt rendering layer")
+    parser.add_argument("--eval-set", default=str(EVAL_SET_PATH))
+    parser.add_argument("--batch-size", type=int, default=8, help="Answers per batch judge prompt")
+    parser.add_argument("--live", action="store_true", help="Also call Gemini and report latency and token usage (GOOGLE_API_KEY required)")
+    parser.add_argument("--samples", type=int, default=10, help="Gemini calls per prompt per variant with --live")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    with open(args.eval_set) as f:
+        items = json.load(f)
+
+    variants = {"current": render_all(current_prompts(), items, args.batch_size, legacy=False)}
+    if args.baseline_ref:
+        variants["baseline"] = render_all(load_baseline(args.baseline_ref), items, args.batch_size, legacy=True)
+    else:
+        print("[PROMPTS] No --baseline-ref given; reporting the current prompts only.")
+
+    report = {}
+    for variant, rendered in variants.items():
+        for case, (texts, render_us) in rendered.items():
+            entry = report.setdefault(case, {})
+            entry[variant] = measure(texts, render_us)
+            if args.live:
+                entry[variant]["live"] = run_live(texts, args.samples)
+
+    for case, entry in report.items():
+        for variant, stats in entry.items():
+            line = (f"[PROMPTS] {case:<26} {variant:<8} tokens~{stats['avg_tokens_est']:.0f} "
+                    f"shared prefix~{stats['shared_prefix_tokens_est']} ({stats['shared_prefix_share']:.0%}) "
+                    f"render={stats['render_us']:.1f}us")
+            if "live" in stats:
+                line += (f" p50={stats['live']['latency_ms_p50']:.0f}ms prompt_tokens={stats['live']['prompt_tokens']:.0f} "
+                         f"cached={stats['live']['cached_tokens']:.0f}")
+            print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[PROMPTS] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
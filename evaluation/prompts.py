@@ -1,4 +1,14 @@
-FLUENCY_JUDGE_PROMPT = """
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.prompt_template import PromptTemplate
+
+# Static instructions come first and the evaluated text last, so the instruction block is a
+# shared prefix that prompt caching can reuse across calls.
+
+FLUENCY_JUDGE_PROMPT = PromptTemplate("fluency_judge", """
     You are a fluency evaluation model. Score how fluent, clear, and grammatically correct the text is.
 
     Rules:
@@ -11,18 +21,15 @@ FLUENCY_JUDGE_PROMPT = """
     - Score 0.0-0.3 only for text that is very hard to read.
 
     Return ONLY this JSON object:
-    {{
-    "score": <number between 0 and 1>,
-    "reason": "<short reason>"
-    }}
+    {{"score": <number between 0 and 1>, "reason": "<short reason>"}}
 
     Text to evaluate:
     "{output}"
 
     Return the JSON:
-"""
+""")
 
-ACCURARY_JUDGE_PROMPT = """
+ACCURARY_JUDGE_PROMPT = PromptTemplate("accuracy_judge", """
     You are an evaluation model. Score how correct the model's answer is.
 
     Rules:
@@ -33,21 +40,17 @@ ACCURARY_JUDGE_PROMPT = """
     - If the expected answer is missing or wrong, score 0.0.
 
     Return ONLY a JSON object:
-    {{
-    "score": <number between 0 and 1>,
-    "reason": "<short reason>"
-    }}
+    {{"score": <number between 0 and 1>, "reason": "<short reason>"}}
 
     Evaluate:
-
     Question: "{q}"
     Expected Answer: "{expected}"
     Model Output: "{output}"
 
     Return the JSON:
-"""
+""")
 
-SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT = """
+SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT = PromptTemplate("subjective_accuracy_judge", """
     You are an evaluation model for subjective or open-ended questions.
     Your task is to judge whether the model's answer makes reasonable sense, even if there is no single correct answer.
 
@@ -60,14 +63,38 @@ SUBJECTIVE_DOMAIN_ACCURACY_JUDGE_PROMPT = """
     - Ignore grammar, fluency, factual accuracy, or depth. This score is ONLY about whether it “makes sense” for the question.
 
     Return ONLY this JSON object:
-    {{
-    "score": <number between 0 and 1>,
-    "reason": "<short reason>"
-    }}
+    {{"score": <number between 0 and 1>, "reason": "<short reason>"}}
 
     Evaluate:
     Question: "{q}"
     Model Output: "{output}"
 
     Return the JSON:
-"""
\ No newline at end of file
+""")
+
+BATCH_JUDGE_PROMPT = PromptTemplate("batch_judge", """
+    You are an evaluation model. Score every item below for accuracy and fluency.
+
+    Each item has an "id", a "question", a "mode", the "output" to evaluate and, for mode "reference", an "expected" answer.
+
+    Accuracy rules by mode:
+    - "reference": Only the presence and correctness of the expected answer matters. Ignore formatting, punctuation or extra explanation.
+      Score close to 1.0 if the expected answer appears clearly, 0.3-0.7 if partially correct or unclear, 0.0 if missing or wrong.
+    - "subjective": There is no single correct answer; judge whether the output makes sense for the question.
+      0.8-1.0 coherent and relevant, 0.4-0.8 relevant but shallow, 0.2-0.4 vague, 0.0-0.2 nonsensical or off-topic.
+    - "verify": Use your own knowledge to check facts, numbers, dates and entities, and that every part of the question is answered.
+      1.0 correct and complete, 0.5-0.9 minor errors or omissions, 0.0-0.4 incorrect, hallucinated or irrelevant.
+
+    Fluency rules (all modes): readability, clarity and grammar only; ignore correctness.
+    1.0 very clear and natural, 0.6-0.9 minor issues, 0.3-0.6 awkward or error-filled, 0.0-0.3 very hard to read.
+
+    "passed" is true only if the output is factually accurate and sufficient for the question.
+
+    Judge every item independently. Return ONLY a JSON array with exactly one object per item, no markdown:
+    [{{"id": <item id>, "accuracy": <number between 0 and 1>, "fluency": <number between 0 and 1>, "passed": <boolean>, "reason": "<short reason>"}}]
+
+    Items, one JSON object per line:
+    {items}
+
+    Return the JSON array:
+""")
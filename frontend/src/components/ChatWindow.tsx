@@ -14,6 +14,7 @@ export default function ChatWindow({ chat, onUpdateMessages, onLogsUpdate }: Cha
   const [logs, setLogs] = useState<string[]>([]);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const pollIntervalRef = useRef<NodeJS.Timeout | null>(null);
+  const eventSourceRef = useRef<EventSource | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -42,64 +43,101 @@ export default function ChatWindow({ chat, onUpdateMessages, onLogsUpdate }: Cha
       const sessionId = sessionData.session_id;
 
       // Step 2: Start the routing process
-      await fetch("http://localhost:5000/api/start_routing", {
+      const startRes = await fetch("http://localhost:5000/api/start_routing", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ query: input, session_id: sessionId }),
       });
+      if (!startRes.ok) {
+        // 503: every routing slot is busy and the session was never started
+        const data = await startRes.json().catch(() => ({}));
+        const retryAfter = data.retry_after_s ?? startRes.headers.get("Retry-After") ?? 1;
+        const content =
+          startRes.status === 503
+            ? `Server busy, retry in ${retryAfter}s`
+            : `Error: ${data.error || startRes.statusText}`;
+        onUpdateMessages([...updatedMessages, { role: "assistant", content }]);
+        setLoading(false);
+        return;
+      }
+
+      // Step 3: Receive logs and result pushed over Server-Sent Events,
+      // falling back to cursor-based polling if the stream breaks
+      const cursor = { value: 0 };
+      let finished = false;
+
+      const appendLogs = (newLogs: string[]) => {
+        if (newLogs.length === 0) return;
+        setLogs((prev) => {
+          const updated = [...prev, ...newLogs];
+          onLogsUpdate?.(updated);
+          return updated;
+        });
+      };
 
-      // Step 3: Poll for logs and result
-      const lastLogCount = { count: 0 };
+      const finish = (content: string) => {
+        if (finished) return;
+        finished = true;
+        onUpdateMessages([...updatedMessages, { role: "assistant", content }]);
+        setLoading(false);
+        eventSourceRef.current?.close();
+        eventSourceRef.current = null;
+        if (pollIntervalRef.current) {
+          clearInterval(pollIntervalRef.current);
+          pollIntervalRef.current = null;
+        }
+      };
 
       const pollLogs = async () => {
         try {
-          const res = await fetch(`http://localhost:5000/api/get_logs/${sessionId}`);
+          const res = await fetch(
+            `http://localhost:5000/api/get_logs/${sessionId}?cursor=${cursor.value}`
+          );
           const data = await res.json();
+          appendLogs(data.logs);
+          cursor.value = data.cursor;
 
-          // Update logs if there are new ones
-          if (data.logs.length > lastLogCount.count) {
-            const newLogs = data.logs.slice(lastLogCount.count);
-            setLogs((prev) => {
-              const updated = [...prev, ...newLogs];
-              onLogsUpdate?.(updated);
-              return updated;
-            });
-            lastLogCount.count = data.logs.length;
-          }
-
-          // Check if routing is complete
           if (data.status === "complete") {
-            const botMsg: Message = {
-              role: "assistant",
-              content: data.result?.output || "No response received",
-            };
-            onUpdateMessages([...updatedMessages, botMsg]);
-            setLoading(false);
-            if (pollIntervalRef.current) {
-              clearInterval(pollIntervalRef.current);
-              pollIntervalRef.current = null;
-            }
+            finish(data.result?.output || "No response received");
           } else if (data.status === "error") {
-            const botMsg: Message = {
-              role: "assistant",
-              content: `Error: ${data.error}`,
-            };
-            onUpdateMessages([...updatedMessages, botMsg]);
-            setLoading(false);
-            if (pollIntervalRef.current) {
-              clearInterval(pollIntervalRef.current);
-              pollIntervalRef.current = null;
-            }
+            finish(`Error: ${data.error}`);
+          } else if (data.status === "overloaded") {
+            finish(`Server busy, retry in ${data.retry_after_s}s`);
           }
         } catch (error) {
           console.error("Polling error:", error);
         }
       };
 
-      // Poll every 500ms
-      pollIntervalRef.current = setInterval(pollLogs, 500);
-      // Also poll immediately
-      pollLogs();
+      const events = new EventSource(`http://localhost:5000/api/events/${sessionId}`);
+      eventSourceRef.current = events;
+      events.addEventListener("log", (e) => {
+        const message = e as MessageEvent;
+        appendLogs([JSON.parse(message.data)]);
+        // The server's cursor, which skips logs it trimmed
+        cursor.value = Number(message.lastEventId) || cursor.value + 1;
+      });
+      events.addEventListener("complete", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(data.result?.output || "No response received");
+      });
+      events.addEventListener("overloaded", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(`Server busy, retry in ${data.retry_after_s}s`);
+      });
+      events.addEventListener("error", (e) => {
+        const data = (e as MessageEvent).data;
+        if (data) {
+          finish(`Error: ${JSON.parse(data).error}`);
+          return;
+        }
+        // Connection-level failure: stop the stream and poll from where it left off
+        events.close();
+        if (!finished && !pollIntervalRef.current) {
+          pollIntervalRef.current = setInterval(pollLogs, 500);
+          pollLogs();
+        }
+      });
     } catch (error) {
       console.error("Error:", error);
       const botMsg: Message = {
@@ -0,0 +1 @@
+# This file makes the server folder a Python package, so the API can be imported as server.server
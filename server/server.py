@@ -1,47 +1,100 @@
 import sys
 import json
+import queue
+import threading
 from pathlib import Path
-from threading import Thread
-import uuid
 
 # Add parent directory to path so we can import evaluation module
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from utils.router.router import route
+from utils.router.router import (
+    route, aroute, metrics_writer, event_sink, classification_cache, response_cache, evaluation_pool,
+    batcher, policy, load_tracker, generation_profiles, gemini_client, judges
+)
+from utils.router.load import Overloaded
+from utils.prompt_template import template_stats
+from agents.local_verifier import get_local_verifier
+from db.client import pool_stats
+from agents.model_registry import get_registry
+from utils.aio import submit
+from utils.router.config import load_config
+from server.sessions import SessionStore, FINISHED
 
 app = Flask(__name__)
 CORS(app)
 
-# Store active sessions and their logs
-sessions = {}
+server_config = load_config()["server"]
+sessions = SessionStore(
+    ttl_s=server_config["sessions"]["ttl_s"],
+    max_sessions=server_config["sessions"]["max_sessions"],
+    max_logs=server_config["sessions"]["max_logs"],
+)
+# Routing runs as coroutines on the shared event loop; this caps how many are in flight
+routing_slots = threading.BoundedSemaphore(server_config["max_inflight_routes"])
+
+def start_route(query, event_callback=None, on_token=None):
+    """Schedule aroute() on the shared loop; returns None when every routing slot is busy"""
+    if not routing_slots.acquire(blocking=False):
+        return None
+    future = submit(aroute(query, event_callback=event_callback, on_token=on_token))
+    future.add_done_callback(lambda f: routing_slots.release())
+    return future
+
+def busy(retry_after_s=1):
+    # Also in the body: browsers only expose Retry-After to scripts if CORS lists it
+    return (jsonify({'error': 'Server busy, retry shortly', 'retry_after_s': retry_after_s}), 503,
+            {'Retry-After': str(retry_after_s)})
 
 @app.route('/api/start_session', methods=['POST'])
 def start_session():
     """Create a new routing session"""
-    session_id = str(uuid.uuid4())
-    sessions[session_id] = {
-        'logs': [],
-        'result': None,
-        'status': 'pending',
-        'error': None
-    }
-    return jsonify({'session_id': session_id})
+    return jsonify({'session_id': sessions.create()})
 
 @app.route('/api/get_logs/<session_id>', methods=['GET'])
 def get_logs(session_id):
-    """Poll for logs and result"""
-    if session_id not in sessions:
+    """Poll for logs after ?cursor=N (default 0) and the result"""
+    cursor = request.args.get('cursor', default=0, type=int)
+    snapshot = sessions.snapshot(session_id, cursor)
+    if snapshot is None:
         return jsonify({'error': 'Session not found'}), 404
-    
-    session = sessions[session_id]
-    return jsonify({
-        'logs': session['logs'],
-        'status': session['status'],
-        'result': session['result'],
-        'error': session['error']
-    })
+    return jsonify(snapshot)
+
+@app.route('/api/events/<session_id>', methods=['GET'])
+def session_events(session_id):
+    """Push session logs and the final result as Server-Sent Events"""
+    if not sessions.exists(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    # EventSource reconnects send the id of the last log they received
+    cursor = request.args.get('cursor', default=request.headers.get('Last-Event-ID', 0, type=int), type=int)
+    keepalive_s = server_config["sse_keepalive_s"]
+
+    def generate():
+        position = cursor
+        while True:
+            snapshot = sessions.wait(session_id, position, timeout=keepalive_s)
+            if snapshot is None:
+                yield sse('error', {'error': 'Session expired'})
+                return
+            # Each log's id is the server cursor just past it, which stays right when old logs are trimmed
+            first = snapshot['cursor'] - len(snapshot['logs'])
+            for n, log in enumerate(snapshot['logs'], start=first + 1):
+                yield sse('log', log, event_id=n)
+            position = snapshot['cursor']
+            if snapshot['status'] in FINISHED:
+                yield sse(snapshot['status'], {
+                    'result': snapshot['result'], 'error': snapshot['error'], 'retry_after_s': snapshot['retry_after_s']
+                })
+                return
+            if not snapshot['logs']:
+                yield ": keepalive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/start_routing', methods=['POST'])
 def start_routing():
@@ -49,31 +102,71 @@ def start_routing():
     data = request.json
     query = data.get('query')
     session_id = data.get('session_id')
-    
-    if session_id not in sessions:
+
+    if not sessions.exists(session_id):
         return jsonify({'error': 'Session not found'}), 404
-    
+
     def event_callback(msg):
-        # Add log to session
-        sessions[session_id]['logs'].append(msg)
+        sessions.append_log(session_id, msg)
         print(f"[LOG] {msg}")
-    
-    def router_thread_func():
+
+    def on_done(future):
         try:
-            result = route(query, event_callback=event_callback)
-            sessions[session_id]['result'] = result
-            sessions[session_id]['status'] = 'complete'
+            sessions.update(session_id, result=future.result(), status='complete')
+        except Overloaded as e:
+            sessions.update(session_id, error=str(e), retry_after_s=e.retry_after_s, status='overloaded')
         except Exception as e:
-            sessions[session_id]['error'] = str(e)
-            sessions[session_id]['status'] = 'error'
-    
-    # Run routing in background thread
-    thread = Thread(target=router_thread_func, daemon=True)
-    thread.start()
-    
-    sessions[session_id]['status'] = 'running'
+            sessions.update(session_id, error=str(e), status='error')
+
+    sessions.update(session_id, status='running')
+    future = start_route(query, event_callback=event_callback)
+    if future is None:
+        sessions.update(session_id, status='pending')
+        return busy()
+    future.add_done_callback(on_done)
     return jsonify({'status': 'started'})
 
+def sse(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/stream', methods=['POST'])
+def stream_routing():
+    """Stream tokens as Server-Sent Events; logs interleave and the routing result comes last"""
+    data = request.json
+    query = data.get('query')
+    events = queue.Queue()
+
+    def on_token(text, confidence):
+        events.put(('token', {'text': text, 'confidence': confidence}))
+
+    def event_callback(msg):
+        events.put(('log', msg))
+
+    future = start_route(query, event_callback=event_callback, on_token=on_token)
+    if future is None:
+        return busy()
+    future.add_done_callback(lambda f: events.put(('done', None)))
+
+    def generate():
+        while True:
+            kind, payload = events.get()
+            if kind == 'done':
+                try:
+                    yield sse('result', future.result())
+                except Overloaded as e:
+                    yield sse('overloaded', {'error': str(e), 'retry_after_s': e.retry_after_s})
+                except Exception as e:
+                    yield sse('error', {'error': str(e)})
+                return
+            yield sse(kind, payload)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/generate_answer', methods=['POST'])
 def generate_answer():
     """Legacy endpoint for backward compatibility"""
@@ -86,8 +179,40 @@ def generate_answer():
         
         result = route(query, event_callback=dummy_callback)
         return jsonify(result)
+    except Overloaded as e:
+        return busy(e.retry_after_s)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/verification/<verification_id>', methods=['GET'])
+def get_verification(verification_id):
+    """Status and result of a background verification job returned by routing"""
+    record = evaluation_pool.get(verification_id)
+    if record is None:
+        return jsonify({'error': 'Verification not found'}), 404
+    return jsonify(record)
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Internal counters for the DB pool and metrics write-behind queue"""
+    return jsonify({
+        'db_pool': pool_stats(),
+        'metrics_writer': metrics_writer.get_stats(),
+        'event_sink': event_sink.get_stats(),
+        'classification_cache': classification_cache.get_stats(),
+        'response_cache': response_cache.get_stats(),
+        'evaluation_pool': evaluation_pool.get_stats(),
+        'batcher': batcher.get_stats(),
+        'policy': policy.get_stats(),
+        'load': load_tracker.get_stats(),
+        'generation': generation_profiles.get_stats(),
+        'prompts': template_stats(),
+        'gemini': gemini_client.get_stats(),
+        'judges': judges.get_stats(),
+        'local_verifier': get_local_verifier().get_stats(),
+        'inference_endpoints': get_registry().get_stats(),
+        'sessions': sessions.get_stats()
+    })
+
 if __name__ == '__main__':
     app.run(host='localhost', port=5000, debug=False)
\ No newline at end of file
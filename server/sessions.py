@@ -0,0 +1,125 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# Statuses after which a session gets no more logs; "overloaded" means the request was shed
+FINISHED = ("complete", "error", "overloaded")
+
+
+class SessionStore:
+    """Routing sessions with TTL expiry, a session cap and per-session log cursors.
+
+    Each session keeps at most `max_logs` entries; older ones are dropped but cursors stay
+    absolute, so a client that fell behind simply skips what was trimmed.
+    """
+
+    def __init__(self, ttl_s=900, max_sessions=10000, max_logs=500):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.max_logs = max_logs
+        self._sessions = OrderedDict()  # session_id -> session, least recently touched first
+        self._cond = threading.Condition()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "logs_trimmed": 0}
+
+    def create(self):
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        with self._cond:
+            self._prune(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+            self._sessions[session_id] = {
+                "logs": [],
+                "log_offset": 0,
+                "result": None,
+                "status": "pending",
+                "error": None,
+                "retry_after_s": None,
+                "touched_at": now,
+            }
+            self.stats["created"] += 1
+        return session_id
+
+    def _prune(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["touched_at"] < self.ttl_s:
+                break
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session["touched_at"] = time.time()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def exists(self, session_id):
+        with self._cond:
+            self._prune(time.time())
+            return session_id in self._sessions
+
+    def append_log(self, session_id, message):
+        with self._cond:
+            session = self._touch(session_id)
+            if session is None:
+                return
+            session["logs"].append(message)
+            overflow = len(session["logs"]) - self.max_logs
+            if overflow > 0:
+                del session["logs"][:overflow]
+                session["log_offset"] += overflow
+                self.stats["logs_trimmed"] += overflow
+            self._cond.notify_all()
+
+    def update(self, session_id, **fields):
+        with self._cond:
+            session = self._touch(session_id)
+            if session is not None:
+                session.update(fields)
+                self._cond.notify_all()
+
+    def snapshot(self, session_id, cursor=0):
+        """Logs after `cursor` plus status/result; None if the session is unknown or expired."""
+        with self._cond:
+            self._prune(time.time())
+            session = self._touch(session_id)
+            if session is None:
+                return None
+            return self._snapshot(session, cursor)
+
+    def _snapshot(self, session, cursor):
+        start = max(cursor - session["log_offset"], 0)
+        logs = session["logs"][start:]
+        return {
+            "logs": logs,
+            "cursor": session["log_offset"] + len(session["logs"]),
+            "status": session["status"],
+            "result": session["result"],
+            "error": session["error"],
+            "retry_after_s": session["retry_after_s"],
+        }
+
+    def wait(self, session_id, cursor, timeout):
+        """Block until there are logs past `cursor` or the session finishes, then snapshot it."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    return None
+                end = session["log_offset"] + len(session["logs"])
+                remaining = deadline - time.monotonic()
+                if end > cursor or session["status"] in FINISHED or remaining <= 0:
+                    session["touched_at"] = time.time()
+                    return self._snapshot(session, cursor)
+                self._cond.wait(remaining)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["active"] = len(self._sessions)
+        return stats
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.cache.cache import MemoryBackend, PromptCache, normalize_prompt
+
+
+def test_normalize_prompt_keeps_case_when_asked():
+    assert normalize_prompt("  What is  NaN ?") == "what is nan?"
+    assert normalize_prompt("  What is  NaN ?", casefold=False) == "What is NaN?"
+
+
+def test_response_cache_separates_prompts_by_case():
+    cache = PromptCache(MemoryBackend(), casefold=False)
+    cache.set("Define NaN in IEEE 754", "not a number")
+    assert cache.get("define nan in ieee 754") is None
+    assert cache.get("Define NaN  in IEEE 754") == "not a number"
+
+
+def test_oversized_values_are_not_indexed():
+    cache = PromptCache(MemoryBackend(max_bytes=200), near_duplicates=True, similarity_threshold=0.5)
+    cache.set("What is the capital of France?", "x" * 500)
+    assert cache.stats["oversized"] == 1
+    assert cache.index.query(normalize_prompt("What is the capital of France??")) is None
+
+    cache.set("What is the capital of France?", "Paris")
+    assert cache.get("What is the capital of France??") == "Paris"
+    assert cache.stats["near_hits"] == 1
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from utils.router.load import LoadTracker, Overloaded
+
+
+class Registry:
+    def healthy_endpoints(self, model_name):
+        return []
+
+
+def tracker_with_load(in_flight, **settings):
+    tracker = LoadTracker(Registry(), max_in_flight=10, **settings)
+    for model_id, n in in_flight.items():
+        for _ in range(n):
+            tracker.begin(model_id)
+    return tracker
+
+
+CHEAP = {"id": 1, "model_name": "cheap", "cost": 0.1}
+PRICEY = {"id": 2, "model_name": "pricey", "cost": 1.0}
+
+
+def test_downgrade_prefers_the_less_loaded_model_over_the_cheaper_one():
+    tracker = tracker_with_load({1: 18, 2: 11})  # saturation 1.8 vs 1.1
+    models, decision = tracker.admit([CHEAP, PRICEY], max_attempts=2)
+    assert (models, decision) == ([PRICEY], "downgraded")
+
+
+def test_downgrade_picks_the_cheaper_of_similarly_loaded_models():
+    tracker = tracker_with_load({1: 12, 2: 11})  # 1.2 vs 1.1, same bucket
+    models, decision = tracker.admit([CHEAP, PRICEY], max_attempts=2)
+    assert (models, decision) == ([CHEAP], "downgraded")
+
+
+def test_unsaturated_models_keep_their_ranked_order():
+    tracker = tracker_with_load({1: 12, 2: 3})
+    models, decision = tracker.admit([CHEAP, PRICEY], max_attempts=2)
+    assert (models, decision) == ([PRICEY, CHEAP], "admitted")
+
+
+def test_sheds_past_shed_above():
+    tracker = tracker_with_load({1: 25, 2: 30}, shed_above=2.0, retry_after_s=3)
+    with pytest.raises(Overloaded) as error:
+        tracker.admit([CHEAP, PRICEY], max_attempts=2)
+    assert error.value.retry_after_s == 3
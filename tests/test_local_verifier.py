@@ -0,0 +1,121 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from agents.local_verifier import LocalVerifier, arithmetic_expression, extract_number, safe_eval
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("17 * 23", 391.0),
+    ("45 / 5 + 9", 18.0),
+    ("(144) ** 0.5", 12.0),
+    ("-2 ** 2", -4.0),
+    ("7 // 2 + 7 % 2", 4.0),
+])
+def test_safe_eval(expr, expected):
+    assert safe_eval(expr) == expected
+
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os')",
+    "abs(-1)",
+    "(1).real",
+    "1 / 0",
+    "2 ** 1000",
+    "10 ** 99 * 10 ** 99 * 10 ** 99 * 10 ** 99",
+    "1 +",
+])
+def test_safe_eval_rejects(expr):
+    assert safe_eval(expr) is None
+
+
+def test_safe_eval_refuses_huge_integers():
+    # Every exponent is within max_exponent, but the result would have ~10^8 digits
+    started = time.perf_counter()
+    assert safe_eval("(((10**100)**100)**100)**100") is None
+    assert safe_eval("((10**100)**100)**100") is None
+    assert time.perf_counter() - started < 0.1
+
+
+@pytest.mark.parametrize("prompt, value", [
+    ("What is 17 * 23?", 391.0),
+    ("What is 100 / 4?", 25.0),
+    ("256 divided by 8", 32.0),
+    ("What is the square root of 144?", 12.0),
+    ("What is 12 squared?", 144.0),
+    ("Calculate 3 times 4 minus 2", 10.0),
+])
+def test_arithmetic_expression(prompt, value):
+    assert safe_eval(arithmetic_expression(prompt)) == value
+
+
+@pytest.mark.parametrize("prompt", ["What is 42?", "What happened in 1969?", "Who wrote Hamlet?"])
+def test_arithmetic_expression_rejects(prompt):
+    assert arithmetic_expression(prompt) is None
+
+
+@pytest.mark.parametrize("output, number", [
+    ("17 * 23 = 391", 391.0),
+    ("The answer is 1,234.", 1234.0),
+    ("\\boxed{3/4}, i.e. = 0.75", 0.75),
+    ("Roughly 75% of them", 0.75),
+    ("First 2, then 3, finally 5", 5.0),
+    ("No numbers here", None),
+])
+def test_extract_number(output, number):
+    assert extract_number(output) == number
+
+
+@pytest.fixture
+def verifier():
+    return LocalVerifier()
+
+
+@pytest.mark.parametrize("q, output, expected, decision", [
+    ("What is 17 * 23?", "17 * 23 = 391", None, (1.0, "arithmetic")),
+    ("What is 17 * 23?", "17 * 23 = 392", None, (0.0, "arithmetic")),
+    ("What is 100 / 4?", "100 / 4 = 25", None, (1.0, "arithmetic")),
+    ("256 divided by 8", "The result is 32.", None, (1.0, "arithmetic")),
+    ("What is the square root of 144?", "The square root of 144 is 12.", None, (1.0, "arithmetic")),
+    ("How many apples?", "There are 12 apples.", "12", (1.0, "numeric")),
+    ("Is A > C?", "Yes, by transitivity.", "yes", (1.0, "yes_no")),
+    ("Is A > C?", "No.", "yes", (0.0, "yes_no")),
+    ("Which planet is red?", "The answer is (C) Mars", "C", (1.0, "choice")),
+    ("Which planet is red?", "It is a planet; the answer is B", "C", (0.0, "choice")),
+    ("Capital of France?", "It is Paris.", "Paris", (1.0, "phrase")),
+    ("Capital of France?", "Paris, not Lyon.", "Paris", (1.0, "phrase")),
+    ("Anything", "   ", "Paris", (0.0, "empty")),
+])
+def test_decide(verifier, q, output, expected, decision):
+    assert verifier.decide(q, output, expected) == decision
+
+
+@pytest.mark.parametrize("q, output, expected", [
+    # The target is there, but the working ends on another number
+    ("What is 100 / 4?", "It is 25, since 4 x 25 = 100", None),
+    ("How many?", "6 * 4 = 24, and 24 / 2 = 12", "24"),
+    # Negated matches are rejections, not answers
+    ("Capital of France?", "not Paris, it's Lyon", "Paris"),
+    ("What is 17 * 23?", "I don't know. Not 391", "391"),
+    ("What is 17 * 23?", "I don't know. Not 391", None),
+    # Too large for a float
+    ("What is 10^99 * 10^99 * 10^99 * 10^99?", "1e396", None),
+    # Not arithmetic and nothing to compare against
+    ("Summarize the text.", "Plants turn light into food.", None),
+    # Long expected answers may be paraphrased
+    ("Summarize the text.", "Plants turn light into food.", "Photosynthesis is how plants convert sunlight into energy."),
+])
+def test_decide_escalates(verifier, q, output, expected):
+    assert verifier.decide(q, output, expected) is None
+
+
+def test_verify_counts_decisions(verifier):
+    verifier.verify("What is 17 * 23?", "17 * 23 = 391")
+    verifier.verify("Summarize the text.", "Plants turn light into food.")
+    stats = verifier.get_stats()
+    assert (stats["checked"], stats["decided"], stats["escalated"]) == (2, 1, 1)
+    assert stats["by_method"]["arithmetic"] == 1
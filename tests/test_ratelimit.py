@@ -0,0 +1,58 @@
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from utils.ratelimit import CircuitBreaker, CircuitOpen
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=0)
+    breaker.record_failure()
+    breaker.allow()  # the single trial call
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_half_open_admits_one_trial():
+    breaker = half_open_breaker()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+
+def test_released_trial_lets_the_next_call_try():
+    breaker = half_open_breaker()
+    breaker.release_trial()
+    breaker.allow()
+    assert breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_release_trial_leaves_a_closed_circuit_alone():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=60)
+    breaker.release_trial()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_gemini_trial_is_released():
+    pytest.importorskip("google.genai")
+    from evaluation.mocks import MockGenAI
+    from utils.gemini.client import GeminiClient
+
+    client = GeminiClient(rpm=6000, failure_threshold=1, reset_timeout_s=0, client=MockGenAI(latency_ms=1000))
+    client.breaker.record_failure()
+
+    async def cancel_trial():
+        call = asyncio.ensure_future(client.agenerate("What is 2 + 2?"))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(cancel_trial())
+    assert client.breaker.state == "open"
+    client.breaker.allow()  # would raise CircuitOpen if the cancelled trial still held the slot
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """Process-wide event loop running in a daemon thread, shared by all sync callers."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="aio-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the shared loop from synchronous code and wait for its result.
+
+    Unlike asyncio.run() this keeps one loop (and its keep-alive HTTP clients) alive for the
+    life of the process instead of creating and tearing one down per call.
+    """
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() called from the shared loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def submit(coro):
+    """Schedule a coroutine on the shared loop without waiting; returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
@@ -0,0 +1,348 @@
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+WHITESPACE_RE = re.compile(r"\s+")
+SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([?.!,;:])")
+
+
+def normalize_prompt(prompt, casefold=True):
+    """Unicode, case and whitespace folding so trivially different prompts share a key.
+
+    Turn `casefold` off where case changes the answer (code, identifiers, acronyms).
+    """
+    text = unicodedata.normalize("NFKC", prompt)
+    if casefold:
+        text = text.casefold()
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    return SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+
+
+def _size_of(key, value):
+    return len(key) + len(json.dumps(value, default=str))
+
+
+class MinHashIndex:
+    """MinHash signatures with LSH banding for near-duplicate prompt lookup."""
+
+    MERSENNE_PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm=64, bands=16, shingle_size=5, threshold=0.9, seed=1):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, self.MERSENNE_PRIME), rng.randrange(0, self.MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._buckets = {}  # (band, band_hash) -> set of keys
+        self._signatures = {}  # key -> signature
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        n = self.shingle_size
+        shingles = {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        p = self.MERSENNE_PRIME
+        return tuple(min((a * h + b) % p for h in hashes) for a, b in self._perms)
+
+    def _bands(self, signature):
+        for band in range(self.bands):
+            yield band, hash(signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key):
+        signature = self.signature(key)
+        with self._lock:
+            self._signatures[key] = signature
+            for band_key in self._bands(signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            signature = self._signatures.pop(key, None)
+            if signature is None:
+                return
+            for band_key in self._bands(signature):
+                bucket = self._buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band_key]
+
+    def query(self, key):
+        """Return the indexed key most similar to `key` above the threshold, if any."""
+        signature = self.signature(key)
+        with self._lock:
+            candidates = set()
+            for band_key in self._bands(signature):
+                candidates |= self._buckets.get(band_key, set())
+            best_key, best_sim = None, self.threshold
+            for candidate in candidates:
+                other = self._signatures[candidate]
+                sim = sum(a == b for a, b in zip(signature, other)) / self.num_perm
+                if sim >= best_sim:
+                    best_key, best_sim = candidate, sim
+            return best_key
+
+
+class MemoryBackend:
+    """Per-process store bounded by an approximate memory budget, evicting LRU or LFU."""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy '{policy}'")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._entries = OrderedDict()  # key -> [value, expires_at, size, hits]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry[1] <= now:
+                self._delete(key)
+                return None, True
+            entry[3] += 1
+            self._entries.move_to_end(key)
+            return entry[0], False
+
+    def set(self, key, value, expires_at):
+        """Store the value; returns the keys evicted to make room, or None if it is too large to store."""
+        size = _size_of(key, value)
+        if size > self.max_bytes:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+            self._entries[key] = [value, expires_at, size, 0]
+            self._bytes += size
+            evicted = []
+            while self._bytes > self.max_bytes:
+                victim = self._victim()
+                self._delete(victim)
+                evicted.append(victim)
+            return evicted
+
+    def _victim(self):
+        if self.policy == "lru":
+            return next(iter(self._entries))
+        # LFU: least hits, oldest access breaks ties (OrderedDict is in access order)
+        return min(self._entries, key=lambda k: self._entries[k][3])
+
+    def _delete(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk store shared by every worker process on the host (WAL mode)."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy '{policy}'")
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, now):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?;", (key,)).fetchone()
+        if row is None:
+            return None, False
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache WHERE key = ?;", (key,))
+            conn.commit()
+            return None, True
+        conn.execute("UPDATE cache SET hits = hits + 1, last_access = ? WHERE key = ?;", (now, key))
+        conn.commit()
+        return json.loads(row[0]), False
+
+    def set(self, key, value, expires_at):
+        payload = json.dumps(value, default=str)
+        size = len(key) + len(payload)
+        if size > self.max_bytes:
+            return None
+        conn = self._conn()
+        now = time.time()
+        conn.execute("""
+            INSERT INTO cache (key, value, expires_at, size, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value, expires_at = excluded.expires_at,
+                size = excluded.size, last_access = excluded.last_access;
+        """, (key, payload, expires_at, size, now))
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?;", (now,))
+        evicted = []
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache;").fetchone()[0]
+        if total > self.max_bytes:
+            order = "last_access" if self.policy == "lru" else "hits, last_access"
+            for victim, victim_size in conn.execute(f"SELECT key, size FROM cache ORDER BY {order};").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM cache WHERE key = ?;", (victim,))
+                evicted.append(victim)
+                total -= victim_size
+        conn.commit()
+        return evicted
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE key = ?;", (key,))
+        conn.commit()
+
+    def size_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM cache;").fetchone()[0]
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache;").fetchone()[0]
+
+
+class PromptCache:
+    """Prompt-keyed cache with normalization, TTL, optional near-duplicate matching and counters."""
+
+    def __init__(self, backend, ttl_s=3600, near_duplicates=False, similarity_threshold=0.9, name="cache",
+                 casefold=True):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.name = name
+        self.casefold = casefold
+        self.index = MinHashIndex(threshold=similarity_threshold) if near_duplicates else None
+        self.stats = {
+            "hits": 0, "near_hits": 0, "misses": 0, "sets": 0, "rejected": 0, "oversized": 0, "evictions": 0,
+            "expirations": 0,
+        }
+
+    def get(self, prompt):
+        key = normalize_prompt(prompt, self.casefold)
+        now = time.time()
+        value, expired = self.backend.get(key, now)
+        if expired:
+            self._forget(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+        if self.index is not None:
+            near_key = self.index.query(key)
+            if near_key is not None:
+                value, expired = self.backend.get(near_key, now)
+                if expired:
+                    self._forget(near_key)
+                if value is not None:
+                    self.stats["near_hits"] += 1
+                    return value
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, prompt, value, cacheable=True):
+        """Store a result; pass cacheable=False for negative results (fallbacks, failures)."""
+        if not cacheable or value is None:
+            self.stats["rejected"] += 1
+            return
+        key = normalize_prompt(prompt, self.casefold)
+        evicted = self.backend.set(key, value, time.time() + self.ttl_s)
+        if evicted is None:
+            self.stats["oversized"] += 1
+            return
+        self.stats["sets"] += 1
+        self.stats["evictions"] += len(evicted)
+        if self.index is not None:
+            for victim in evicted:
+                self.index.remove(victim)
+            # Only keys that are actually stored, or near-duplicate lookups would point at nothing
+            if key not in evicted:
+                self.index.add(key)
+
+    def _forget(self, key):
+        self.stats["expirations"] += 1
+        if self.index is not None:
+            self.index.remove(key)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        stats["entries"] = len(self.backend)
+        stats["bytes"] = self.backend.size_bytes()
+        return stats
+
+
+class NullCache:
+    """Stand-in used when a cache is disabled in config."""
+
+    def get(self, prompt):
+        return None
+
+    def set(self, prompt, value, cacheable=True):
+        pass
+
+    def get_stats(self):
+        return {"enabled": False}
+
+
+def build_cache(settings, name="cache"):
+    if not settings or not settings.get("enabled", False):
+        return NullCache()
+    policy = settings.get("policy", "lru")
+    max_bytes = settings.get("max_bytes", 8 * 1024 * 1024)
+    if settings.get("backend", "memory") == "sqlite":
+        default_path = Path(__file__).parent / "data" / f"{name}.sqlite3"
+        backend = SQLiteBackend(settings.get("path") or default_path, max_bytes=max_bytes, policy=policy)
+    else:
+        backend = MemoryBackend(max_bytes=max_bytes, policy=policy)
+    return PromptCache(
+        backend,
+        ttl_s=settings.get("ttl_s", 3600),
+        near_duplicates=settings.get("near_duplicates", False),
+        similarity_threshold=settings.get("similarity_threshold", 0.9),
+        name=name,
+        casefold=settings.get("casefold", True),
+    )
@@ -1,17 +1,171 @@
 import os
+import sys
+import asyncio
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 
+from utils.ratelimit import TokenBucket, CircuitBreaker, is_retryable, retry, aretry
+from utils.prompt_template import estimate_tokens
+from utils.router.config import load_config
+
 load_dotenv()
 
+# How often an async caller re-checks the shared concurrency limit while it is full
+SLOT_POLL_S = 0.01
+
+
+def is_timeout(exc):
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(exc).__name__
+
+
+def is_unavailable(exc):
+    """Errors that say Gemini is down or overloaded (as opposed to a bad request)."""
+    return is_retryable(exc) or is_timeout(exc)
+
+
 class GeminiClient:
-    def __init__(self):
-        self.model = "gemini-2.0-flash-lite"
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    """Process-wide Gemini client: rate limited, concurrency bounded, retrying, circuit broken.
 
-    def generate_content(self, prompt):
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt,
+    Every call takes one request from the RPM bucket and its estimated prompt size from the
+    TPM bucket, then waits for one of `max_concurrency` slots (shared by sync and async
+    callers). 429 / 5xx / timeouts are retried with jittered exponential backoff; when calls
+    keep failing the circuit opens and calls raise CircuitOpen at once until it recovers.
+    Use get_gemini_client() rather than constructing one per module.
+    """
+
+    def __init__(self, model="gemini-2.0-flash-lite", rpm=30, tpm=1000000, max_concurrency=8, timeout_s=30,
+                 retries=4, backoff_base_s=1.0, backoff_max_s=30.0, failure_threshold=5, reset_timeout_s=30, client=None):
+        self.model = model
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        # `client` stands in for the SDK (see evaluation/mocks.py); limits and retries still apply
+        self.client = client or genai.Client(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            http_options=types.HttpOptions(timeout=int(timeout_s * 1000)),
         )
-        return response.text
+        self.requests = TokenBucket.per_minute(rpm, burst=max(rpm / 6, 1))
+        self.tokens = TokenBucket.per_minute(tpm, burst=tpm / 6)
+        self.breaker = CircuitBreaker("gemini", failure_threshold, reset_timeout_s)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "succeeded": 0, "failed": 0, "retried": 0, "timeouts": 0, "in_flight": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _on_retry(self, e, attempt, delay):
+        self._count("retried")
+        print(f"[GEMINI] Attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+
+    def _finish(self, error=None):
+        self._count("in_flight", -1)
+        if error is None:
+            self._count("succeeded")
+            self.breaker.record_success()
+            return
+        self._count("failed")
+        if is_timeout(error):
+            self._count("timeouts")
+        if is_unavailable(error):
+            self.breaker.record_failure()
+        else:
+            # Gemini answered (e.g. rejected a bad request), so it is up
+            self.breaker.record_success()
+
+    def _call(self, prompt):
+        self.requests.acquire()
+        self.tokens.acquire(estimate_tokens(prompt))
+        with self._slots:
+            return self.client.models.generate_content(model=self.model, contents=prompt)
+
+    async def _acall(self, prompt):
+        await self.requests.aacquire()
+        await self.tokens.aacquire(estimate_tokens(prompt))
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(SLOT_POLL_S)
+        try:
+            return await asyncio.wait_for(
+                self.client.aio.models.generate_content(model=self.model, contents=prompt), self.timeout_s
+            )
+        finally:
+            self._slots.release()
+
+    def generate(self, prompt):
+        """The full response (text, usage_metadata); raises CircuitOpen while Gemini is failing."""
+        self.breaker.allow()
+        self._count("calls")
+        self._count("in_flight")
+        try:
+            response = retry(
+                self._call, prompt, retries=self.retries, base_s=self.backoff_base_s, max_s=self.backoff_max_s,
+                retry_on=is_unavailable, on_retry=self._on_retry
+            )
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return response
+
+    async def agenerate(self, prompt):
+        self.breaker.allow()
+        self._count("calls")
+        self._count("in_flight")
+        try:
+            response = await aretry(
+                self._acall, prompt, retries=self.retries, base_s=self.backoff_base_s, max_s=self.backoff_max_s,
+                retry_on=is_unavailable, on_retry=self._on_retry
+            )
+        except asyncio.CancelledError:
+            # Hedging and evaluation timeouts cancel calls; never leave a half-open trial taken
+            self._count("in_flight", -1)
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return response
+
+    def generate_content(self, prompt):
+        return self.generate(prompt).text
+
+    async def agenerate_content(self, prompt):
+        return (await self.agenerate(prompt)).text
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["rpm_throttled"] = self.requests.stats["throttled"]
+        stats["tpm_throttled"] = self.tokens.stats["throttled"]
+        stats["throttle_wait_s"] = self.requests.stats["wait_s_total"] + self.tokens.stats["wait_s_total"]
+        stats["circuit"] = self.breaker.get_stats()
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_gemini_client(config=None):
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = (config or load_config()).get("gemini", {})
+                _client = GeminiClient(**settings)
+    return _client
+
+
+def set_gemini_client(client):
+    """Install the process-wide client before anything calls get_gemini_client() (load tests)."""
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,71 @@
+import re
+import string
+import threading
+
+SPACES_RE = re.compile(r"[ \t]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+_templates = {}  # name -> PromptTemplate, for stats
+
+
+def estimate_tokens(text):
+    """Rough token count: about 4 characters per token for English text with BPE tokenizers."""
+    return (len(text) + 3) // 4
+
+
+def compact(text):
+    """Drop indentation, repeated spaces and runs of blank lines; line breaks are kept as structure."""
+    lines = [SPACES_RE.sub(" ", line).strip() for line in text.strip().splitlines()]
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(lines))
+
+
+class PromptTemplate:
+    """A prompt compacted and parsed once at import, rendered by joining precompiled parts.
+
+    Write templates with every static instruction before the first {field}: that text is an
+    identical prefix on every call, which Gemini's implicit cache and vLLM's prefix cache can
+    reuse. Values are inserted verbatim (never compacted) and literal braces are written {{ }}
+    as with str.format. Render counts and estimated token sizes are kept per template.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = compact(text)
+        self._parts = []  # (literal text, field name or None)
+        for literal, field, spec, conversion in string.Formatter().parse(self.text):
+            if spec or conversion:
+                raise ValueError(f"Prompt '{name}': format specs are not supported in {{{field}}}")
+            self._parts.append((literal, field))
+        self.fields = [field for _, field in self._parts if field is not None]
+        self.static_prefix = self._parts[0][0] if self.fields else self.text
+        self.stats = {"renders": 0, "tokens": 0, "max_tokens": 0}
+        self._lock = threading.Lock()
+        _templates[name] = self
+
+    def render(self, **values):
+        missing = set(self.fields) - set(values)
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing {sorted(missing)}")
+        parts = []
+        for literal, field in self._parts:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        text = "".join(parts)
+        tokens = estimate_tokens(text)
+        with self._lock:
+            self.stats["renders"] += 1
+            self.stats["tokens"] += tokens
+            self.stats["max_tokens"] = max(self.stats["max_tokens"], tokens)
+        return text
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_tokens"] = stats.pop("tokens") / (stats["renders"] or 1)
+        stats["static_prefix_tokens"] = estimate_tokens(self.static_prefix)
+        return stats
+
+
+def template_stats():
+    return {name: template.get_stats() for name, template in _templates.items()}
@@ -0,0 +1,172 @@
+import time
+import random
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "throttled": 0, "wait_s_total": 0.0}
+
+    @classmethod
+    def per_minute(cls, per_minute, burst=None):
+        return cls(per_minute / 60.0, capacity=burst if burst is not None else max(per_minute / 60.0, 1))
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; otherwise return the seconds to wait before retrying."""
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.stats["acquired"] += 1
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                break
+            time.sleep(wait)
+            waited += wait
+        self._record_wait(waited)
+        return waited
+
+    async def aacquire(self, tokens=1):
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        self._record_wait(waited)
+        return waited
+
+    def _record_wait(self, waited):
+        if waited > 0:
+            with self._lock:
+                self.stats["throttled"] += 1
+                self.stats["wait_s_total"] += waited
+
+
+def is_retryable(exc):
+    """429 / RESOURCE_EXHAUSTED and transient 5xx errors from Gemini or HTTP backends."""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    if code is None and response is not None:
+        code = getattr(response, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or 500 <= code < 600
+    message = str(exc)
+    return any(marker in message for marker in ("429", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "503"))
+
+
+def backoff_delay(attempt, base_s=1.0, max_s=60.0):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+
+
+def retry(fn, *args, retries=5, base_s=1.0, max_s=60.0, retry_on=is_retryable, on_retry=None, **kwargs):
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not retry_on(e):
+                raise
+            delay = backoff_delay(attempt, base_s, max_s)
+            if on_retry:
+                on_retry(e, attempt, delay)
+            time.sleep(delay)
+
+
+async def aretry(fn, *args, retries=5, base_s=1.0, max_s=60.0, retry_on=is_retryable, on_retry=None, **kwargs):
+    """retry() for coroutine functions; backs off with asyncio.sleep so the loop keeps running."""
+    for attempt in range(retries + 1):
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not retry_on(e):
+                raise
+            delay = backoff_delay(attempt, base_s, max_s)
+            if on_retry:
+                on_retry(e, attempt, delay)
+            await asyncio.sleep(delay)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a backend that has been failing; retry after `retry_after_s`."""
+
+    def __init__(self, name, retry_after_s):
+        super().__init__(f"{name} circuit open, retry in {retry_after_s:.1f}s")
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    """Stops calls to a failing backend so callers fail fast instead of piling up on timeouts.
+
+    Opens after `failure_threshold` consecutive failures. After `reset_timeout_s` one trial
+    call is let through (half-open): success closes the circuit, failure opens it again, and a
+    trial abandoned without an outcome (e.g. cancelled) must call release_trial() so the next
+    call can try instead.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout_s=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_timeout_s - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+                return
+            self.stats["rejected"] += 1
+            raise CircuitOpen(self.name, max(remaining, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                    print(f"[CIRCUIT] {self.name} open for {self.reset_timeout_s:.0f}s after {self._failures} failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The call let through by allow() ended without a verdict; re-arm a half-open circuit."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.reset_timeout_s
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, state=self.state, consecutive_failures=self._failures)
@@ -0,0 +1,123 @@
+import sys
+import time
+import uuid
+import random
+import asyncio
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from utils.aio import get_loop
+
+
+class EvaluationPool:
+    """Bounded background pool for post-response work (verification, fluency, metric updates).
+
+    Queued jobs are drained by `workers` coroutines on the shared event loop, up to
+    `batch_size` at a time, so `evaluate` receives a list of jobs and returns one result per
+    job. Once `max_queue` jobs are waiting new submissions are shed instead of queued.
+    """
+
+    def __init__(self, evaluate, workers=4, max_queue=1000, max_results=10000,
+                 sample_rate=1.0, domain_sample_rates=None, seed=None, batch_size=1, batch_wait_ms=0):
+        self.evaluate = evaluate
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_results = max_results
+        self.sample_rate = sample_rate
+        self.domain_sample_rates = domain_sample_rates or {}
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait_ms = batch_wait_ms
+        self._rng = random.Random(seed)
+        self._queue = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._results = OrderedDict()  # job_id -> status record
+        self.stats = {
+            "submitted": 0, "sampled_out": 0, "shed": 0, "completed": 0, "errors": 0,
+            "batches": 0, "eval_ms_total": 0.0,
+        }
+
+    def should_sample(self, domain):
+        rate = self.domain_sample_rates.get(domain, self.sample_rate)
+        return rate >= 1.0 or self._rng.random() < rate
+
+    def submit(self, domain, job):
+        """Queue `job` for evaluation; returns (job_id, status) with status queued, skipped or shed."""
+        if not self.should_sample(domain):
+            self.stats["sampled_out"] += 1
+            return None, "skipped"
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.stats["shed"] += 1
+                return None, "shed"
+            self._pending += 1
+            job_id = str(uuid.uuid4())
+            self._store(job_id, {"status": "queued", "result": None, "error": None, "submitted_at": time.time()})
+        self.stats["submitted"] += 1
+        get_loop().call_soon_threadsafe(self._enqueue, job_id, job)
+        return job_id, "queued"
+
+    def _enqueue(self, job_id, job):
+        # Runs on the shared loop, so the queue and workers are created there
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            for _ in range(self.workers):
+                asyncio.ensure_future(self._worker())
+        self._queue.put_nowait((job_id, job))
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_size > 1 and self._queue.empty() and self.batch_wait_ms:
+                # Give a burst a moment to fill the batch before paying for a judge call
+                await asyncio.sleep(self.batch_wait_ms / 1000)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._run(batch)
+
+    async def _run(self, batch):
+        try:
+            for job_id, _ in batch:
+                self._update(job_id, status="running")
+            t0 = time.perf_counter()
+            try:
+                results = await self.evaluate([job for _, job in batch])
+                for (job_id, _), result in zip(batch, results):
+                    self._update(job_id, status="complete", result=result)
+                self.stats["completed"] += len(batch)
+            except Exception as e:
+                print(f"[EVALUATION] Batch of {len(batch)} failed: {e}")
+                for job_id, _ in batch:
+                    self._update(job_id, status="error", error=str(e))
+                self.stats["errors"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["eval_ms_total"] += (time.perf_counter() - t0) * 1000
+        finally:
+            with self._lock:
+                self._pending -= len(batch)
+
+    def _store(self, job_id, record):
+        self._results[job_id] = record
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            record = self._results.get(job_id)
+            if record is not None:
+                record.update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            record = self._results.get(job_id)
+            return dict(record) if record is not None else None
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queue_depth"] = self._pending
+        stats["avg_eval_ms"] = stats["eval_ms_total"] / (stats["batches"] or 1)
+        stats["avg_batch"] = (stats["completed"] + stats["errors"]) / (stats["batches"] or 1)
+        return stats
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """Recent inference latencies per model, used to set hedging deadlines."""
+
+    def __init__(self, window=256, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}  # model_id -> deque of latency_ms
+        self._lock = threading.Lock()
+
+    def record(self, model_id, latency_ms):
+        with self._lock:
+            samples = self._samples.get(model_id)
+            if samples is None:
+                samples = self._samples[model_id] = deque(maxlen=self.window)
+            samples.append(latency_ms)
+
+    def percentile(self, model_id, q):
+        """The q-th percentile (0-100) of recent latencies, or None until min_samples are seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(model_id, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * q / 100), len(samples) - 1)]
+
+    def get_stats(self):
+        with self._lock:
+            model_ids = list(self._samples)
+        return {model_id: {"p50": self.percentile(model_id, 50), "p95": self.percentile(model_id, 95)} for model_id in model_ids}
+
+
+async def run_hedged(candidates, call, delay_for, max_attempts=2, max_hedges=1, should_failover=None,
+                     on_launch=None, on_failure=None):
+    """Run `call(candidate)` for the best candidate, hedging and failing over to the next ones.
+
+    A hedge starts the next candidate when the newest attempt has not finished within
+    `delay_for(candidate)` seconds; a failover starts it as soon as an attempt fails and nothing
+    else is still running. The first successful result wins and every other attempt is
+    cancelled. Returns (candidate, result, stats); if all attempts fail the last failure is
+    returned. `on_failure(candidate, result)` is called for every failed attempt that is not
+    the one returned.
+    """
+    should_failover = should_failover or (lambda result: result["failed"])
+    queue = list(candidates[:max_attempts])
+    running = {}  # task -> (candidate, started_at)
+    stats = {"attempts": 0, "hedges": 0, "failovers": 0}
+    loop = asyncio.get_running_loop()
+    failures = []
+    newest = None
+
+    def launch(reason=None):
+        nonlocal newest
+        candidate = queue.pop(0)
+        task = asyncio.ensure_future(call(candidate))
+        newest = task
+        running[task] = (candidate, loop.time())
+        stats["attempts"] += 1
+        if reason:
+            stats[reason] += 1
+        if on_launch:
+            on_launch(candidate, reason)
+
+    launch()
+    try:
+        while running:
+            timeout = None
+            if queue and stats["hedges"] < max_hedges and newest in running:
+                candidate, started_at = running[newest]
+                timeout = max(delay_for(candidate) - (loop.time() - started_at), 0)
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch("hedges")
+                continue
+            for task in done:
+                candidate, _ = running.pop(task)
+                result = task.result()
+                if not result["failed"] or not should_failover(result):
+                    return candidate, result, stats
+                failures.append((candidate, result))
+            if queue and not running:
+                launch("failovers")
+        candidate, result = failures.pop()
+        return candidate, result, stats
+    finally:
+        for task in running:
+            task.cancel()
+        if on_failure:
+            for candidate, result in failures:
+                on_failure(candidate, result)
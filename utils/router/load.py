@@ -0,0 +1,124 @@
+import math
+import time
+import threading
+
+# Saturation levels this close count as equally loaded when downgrading, so cost decides among them
+SATURATION_BUCKET = 0.25
+
+
+class Overloaded(Exception):
+    """Every candidate model is saturated and the request was shed instead of queued."""
+
+    def __init__(self, message, retry_after_s=1):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class LoadTracker:
+    """Live saturation per model, folded into routing scores and used for admission control.
+
+    Saturation is the largest of three signals, each scaled so that 1.0 means "full":
+      - requests this router has in flight to the model / (max_in_flight x healthy endpoints)
+      - recent queueing delay (latency above the model's usual p50, smoothed) / queue_delay_slo_ms;
+        the average starts at 0 and halves every delay_half_life_s without new samples, so a
+        model that stops getting traffic after a few slow requests is tried again
+      - sequences waiting in vLLM's own scheduler / max_waiting, on the least loaded endpoint
+        (only when the registry scrapes /metrics)
+    """
+
+    def __init__(self, registry, max_in_flight=32, queue_delay_slo_ms=1000, max_waiting=8, ewma_alpha=0.2,
+                 delay_half_life_s=30, penalty_weight=0.5, on_saturated="downgrade", shed_above=2.0, retry_after_s=1):
+        self.registry = registry
+        self.max_in_flight = max_in_flight
+        self.queue_delay_slo_ms = queue_delay_slo_ms
+        self.max_waiting = max_waiting
+        self.ewma_alpha = ewma_alpha
+        self.delay_half_life_s = delay_half_life_s
+        self.penalty_weight = penalty_weight
+        self.on_saturated = on_saturated
+        self.shed_above = shed_above
+        self.retry_after_s = retry_after_s
+        self._in_flight = {}    # model_id -> routed requests not yet finished
+        self._queue_delay = {}  # model_id -> (EWMA of queueing delay in ms, monotonic time of last sample)
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "downgraded": 0, "shed": 0}
+
+    def begin(self, model_id):
+        with self._lock:
+            self._in_flight[model_id] = self._in_flight.get(model_id, 0) + 1
+
+    def end(self, model_id):
+        with self._lock:
+            self._in_flight[model_id] -= 1
+
+    def record_latency(self, model_id, latency_ms, baseline_ms):
+        """Treat latency above the model's usual p50 as time spent queueing."""
+        delay_ms = max(latency_ms - baseline_ms, 0.0) if baseline_ms else 0.0
+        with self._lock:
+            previous = self._decayed_delay(model_id)
+            self._queue_delay[model_id] = (
+                self.ewma_alpha * delay_ms + (1 - self.ewma_alpha) * previous, time.monotonic()
+            )
+
+    def _decayed_delay(self, model_id):
+        # Caller holds the lock
+        if model_id not in self._queue_delay:
+            return 0.0
+        delay_ms, updated_at = self._queue_delay[model_id]
+        if not self.delay_half_life_s:
+            return delay_ms
+        return delay_ms * 0.5 ** ((time.monotonic() - updated_at) / self.delay_half_life_s)
+
+    def saturation(self, model):
+        endpoints = self.registry.healthy_endpoints(model["model_name"])
+        with self._lock:
+            in_flight = self._in_flight.get(model["id"], 0)
+            queue_delay_ms = self._decayed_delay(model["id"])
+        signals = [
+            in_flight / (self.max_in_flight * max(len(endpoints), 1)),
+            queue_delay_ms / self.queue_delay_slo_ms,
+        ]
+        waiting = [e.waiting for e in endpoints if e.waiting is not None]
+        if waiting:
+            signals.append(min(waiting) / self.max_waiting)
+        return max(signals)
+
+    def penalty(self, model):
+        """Fraction to take off the model's routing score, up to penalty_weight when saturated."""
+        return self.penalty_weight * min(self.saturation(model), 1.0)
+
+    def admit(self, candidates, max_attempts):
+        """(models to try, decision) for policy-ranked candidates; raises Overloaded to shed.
+
+        Unsaturated models keep their ranked order ahead of saturated ones. When all are
+        saturated the request is shed, or with on_saturated=downgrade sent to the cheapest of
+        the least loaded models (saturation compared in SATURATION_BUCKET steps), unless even
+        that one is past shed_above.
+        """
+        saturation = {model["id"]: self.saturation(model) for model in candidates}
+        available = [model for model in candidates if saturation[model["id"]] < 1.0]
+        if available:
+            self.stats["admitted"] += 1
+            saturated = [model for model in candidates if saturation[model["id"]] >= 1.0]
+            return (available + saturated)[:max_attempts], "admitted"
+        least = min(saturation.values())
+        if self.on_saturated == "downgrade" and least < self.shed_above:
+            self.stats["downgraded"] += 1
+            fallback = min(
+                (model for model in candidates if saturation[model["id"]] < self.shed_above),
+                key=lambda model: (
+                    math.floor(saturation[model["id"]] / SATURATION_BUCKET), model["cost"], saturation[model["id"]]
+                )
+            )
+            return [fallback], "downgraded"
+        self.stats["shed"] += 1
+        raise Overloaded(f"All {len(candidates)} candidate models are saturated", self.retry_after_s)
+
+    def get_stats(self):
+        with self._lock:
+            models = set(self._in_flight) | set(self._queue_delay)
+            per_model = {
+                model_id: {"in_flight": self._in_flight.get(model_id, 0), "queue_delay_ms": self._decayed_delay(model_id)}
+                for model_id in models
+            }
+        return dict(self.stats, models=per_model)
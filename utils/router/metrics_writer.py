@@ -0,0 +1,353 @@
+import sys
+import math
+import time
+import queue
+import atexit
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db.client import connection
+from utils.router.sketch import DDSketch
+
+# One statement per flush: rolling averages are computed in SQL from the stored values,
+# so concurrent writers never read-modify-write in Python. Passed observations update the
+# averages; failed verifications count as penalties (scores * multiplier^penalties).
+# Unverified observations (not sampled for judging) update only the judge-independent
+# averages (latency, confidence, tokens), so accuracy and fluency carry their own weight,
+# verified_weight. Fluency averages only the observations that carry one (rule-decided
+# verdicts do not). Failures are backend errors (e.g. an inference timeout) and only bump
+# failure_count. The stored averages carry decay_weight observations' worth of weight, which
+# decays as exp(-decay_rate * seconds since decayed_at), so recent behaviour outweighs old history.
+UPSERT_SQL = """
+    WITH batch (model_id, domain_id, n, acc_n, sum_acc, flu_n, sum_flu, sum_lat, sum_conf, sum_tok, penalties, mult,
+                stream_n, sum_ttft, itl_n, sum_itl, failures, decay_rate) AS (
+        VALUES %s
+    ),
+    decayed AS (
+        SELECT b.*, COALESCE(mm.decay_weight, mm.usage_count) * f.decay AS w,
+                    COALESCE(mm.verified_weight, mm.decay_weight, mm.usage_count) * f.decay AS vw
+        FROM batch b
+        JOIN model_metrics mm ON mm.model_id = b.model_id AND mm.domain_id = b.domain_id
+        CROSS JOIN LATERAL (
+            SELECT exp(-b.decay_rate * GREATEST(
+                EXTRACT(EPOCH FROM NOW() - COALESCE(mm.decayed_at, mm.last_updated, NOW()))::float8, 0)) AS decay
+        ) f
+    ),
+    updated AS (
+        UPDATE model_metrics mm
+        SET accuracy_score   = COALESCE((COALESCE(mm.accuracy_score * d.vw, 0) + d.sum_acc)
+                                        / NULLIF(CASE WHEN mm.accuracy_score IS NULL THEN 0 ELSE d.vw END
+                                                 + d.acc_n, 0), mm.accuracy_score)
+                               * power(d.mult, d.penalties),
+            fluency_score    = COALESCE((COALESCE(mm.fluency_score * d.vw, 0) + d.sum_flu)
+                                        / NULLIF(CASE WHEN mm.fluency_score IS NULL THEN 0 ELSE d.vw END
+                                                 + d.flu_n, 0), mm.fluency_score)
+                               * power(d.mult, d.penalties),
+            confidence       = COALESCE((COALESCE(mm.confidence, 0) * d.w + d.sum_conf)
+                                        / NULLIF(d.w + d.n, 0), mm.confidence)
+                               * power(d.mult, d.penalties),
+            latency_ms       = COALESCE((COALESCE(mm.latency_ms, 0) * d.w + d.sum_lat)
+                                        / NULLIF(d.w + d.n, 0), mm.latency_ms),
+            tokens_per_query = COALESCE((COALESCE(mm.tokens_per_query, 0) * d.w + d.sum_tok)
+                                        / NULLIF(d.w + d.n, 0), mm.tokens_per_query),
+            decay_weight     = d.w + d.n,
+            verified_weight  = d.vw + d.acc_n,
+            decayed_at       = NOW(),
+            ttft_ms          = COALESCE((COALESCE(mm.ttft_ms, 0) * COALESCE(mm.stream_count, 0) + d.sum_ttft)
+                                        / NULLIF(COALESCE(mm.stream_count, 0) + d.stream_n, 0), mm.ttft_ms),
+            inter_token_ms   = COALESCE((COALESCE(mm.inter_token_ms, 0) * COALESCE(mm.stream_count, 0)
+                                         + d.sum_itl / NULLIF(d.itl_n, 0) * d.stream_n)
+                                        / NULLIF(COALESCE(mm.stream_count, 0) + d.stream_n, 0), mm.inter_token_ms),
+            stream_count     = COALESCE(mm.stream_count, 0) + d.stream_n,
+            usage_count      = mm.usage_count + d.n,
+            failure_count    = mm.failure_count + d.penalties + d.failures,
+            last_updated     = NOW()
+        FROM decayed d
+        WHERE mm.model_id = d.model_id AND mm.domain_id = d.domain_id
+        RETURNING mm.model_id, mm.domain_id
+    )
+    INSERT INTO model_metrics
+    (model_id, domain_id, accuracy_score, fluency_score, confidence, latency_ms,
+    tokens_per_query, ttft_ms, inter_token_ms, stream_count, usage_count, failure_count,
+    decay_weight, verified_weight, decayed_at, last_updated)
+    SELECT b.model_id, b.domain_id,
+        b.sum_acc  / NULLIF(b.acc_n, 0) * power(b.mult, b.penalties),
+        b.sum_flu  / NULLIF(b.flu_n, 0) * power(b.mult, b.penalties),
+        b.sum_conf / NULLIF(b.n, 0) * power(b.mult, b.penalties),
+        b.sum_lat  / NULLIF(b.n, 0),
+        b.sum_tok  / NULLIF(b.n, 0),
+        b.sum_ttft / NULLIF(b.stream_n, 0),
+        b.sum_itl  / NULLIF(b.itl_n, 0),
+        b.stream_n, b.n, b.penalties + b.failures,
+        b.n, b.acc_n, NOW(), NOW()
+    FROM batch b
+    WHERE NOT EXISTS (
+        SELECT 1 FROM updated u WHERE u.model_id = b.model_id AND u.domain_id = b.domain_id
+    )
+    ON CONFLICT (model_id, domain_id) DO NOTHING;
+"""
+
+# Latency and tokens/s sketches: rows are created empty first so that every writer can lock
+# them, then each is decayed, merged with the batch and written back in the same transaction.
+SKETCH_KEYS_SQL = """
+    INSERT INTO model_metric_sketches (model_id, domain_id, metric)
+    VALUES %s
+    ON CONFLICT (model_id, domain_id, metric) DO NOTHING;
+"""
+
+SKETCH_SELECT_SQL = """
+    SELECT model_id, domain_id, metric, sketch,
+        EXTRACT(EPOCH FROM NOW() - updated_at)::float8 AS age_s
+    FROM model_metric_sketches
+    WHERE (model_id, domain_id, metric) IN (SELECT * FROM UNNEST(%s::int[], %s::int[], %s::text[]))
+    FOR UPDATE;
+"""
+
+SKETCH_UPDATE_SQL = """
+    UPDATE model_metric_sketches s
+    SET sketch = v.sketch, updated_at = NOW()
+    FROM (VALUES %s) AS v (model_id, domain_id, metric, sketch)
+    WHERE s.model_id = v.model_id AND s.domain_id = v.domain_id AND s.metric = v.metric;
+"""
+
+PERCENTILES_SQL = """
+    UPDATE model_metrics mm
+    SET latency_p50_ms   = COALESCE(v.p50, mm.latency_p50_ms),
+        latency_p95_ms   = COALESCE(v.p95, mm.latency_p95_ms),
+        latency_p99_ms   = COALESCE(v.p99, mm.latency_p99_ms),
+        tokens_per_s_p50 = COALESCE(v.tps, mm.tokens_per_s_p50),
+        completion_tokens_p95 = COALESCE(v.ctp95, mm.completion_tokens_p95),
+        last_updated     = NOW()
+    FROM (VALUES %s) AS v (model_id, domain_id, p50, p95, p99, tps, ctp95)
+    WHERE mm.model_id = v.model_id AND mm.domain_id = v.domain_id;
+"""
+
+SKETCH_METRICS = ("latency_ms", "tokens_per_s", "completion_tokens")
+
+UPSERT_TEMPLATE = (
+    "(%s::int, %s::int, %s::int, %s::int, %s::float8, %s::int, %s::float8, %s::float8, %s::float8, %s::float8, %s::int, %s::float8,"
+    " %s::int, %s::float8, %s::int, %s::float8, %s::int, %s::float8)"
+)
+
+
+def _empty_aggregate(relative_accuracy):
+    return {
+        "n": 0, "acc_n": 0, "acc": 0.0, "flu_n": 0, "flu": 0.0, "lat": 0.0, "conf": 0.0, "tok": 0.0, "penalties": 0,
+        "stream_n": 0, "ttft": 0.0, "itl_n": 0, "itl": 0.0, "failures": 0,
+        "latency_ms": DDSketch(relative_accuracy), "tokens_per_s": DDSketch(relative_accuracy),
+        "completion_tokens": DDSketch(relative_accuracy),
+    }
+
+
+class MetricsWriter:
+    """Write-behind queue that aggregates metric observations and flushes them in batches."""
+
+    def __init__(self, penalty_multiplier, flush_interval_s=2.0, max_batch=500, queue_size=10000, on_flush=None,
+                 half_life_s=None, sketch_relative_accuracy=0.01):
+        self.penalty_multiplier = penalty_multiplier
+        # Per-second decay of stored averages and sketches; 0 keeps lifetime averages
+        self.decay_rate = math.log(2) / half_life_s if half_life_s else 0.0
+        self.sketch_relative_accuracy = sketch_relative_accuracy
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self.on_flush = on_flush
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {}  # (model_id, domain_id) -> aggregate
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            "recorded": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "rows_flushed": 0,
+            "observations_flushed": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def record(self, model_id, domain_id, metrics, passed, failed=False):
+        """Queue one observation; never blocks the caller. passed=None when it was not verified."""
+        try:
+            self._queue.put_nowait((model_id, domain_id, metrics, passed, failed))
+            self.stats["recorded"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+            print(f"[METRICS WRITER] Queue full, dropped observation for model={model_id} domain={domain_id}")
+
+    def _aggregate(self, item):
+        model_id, domain_id, metrics, passed, failed = item
+        with self._lock:
+            agg = self._pending.setdefault((model_id, domain_id), _empty_aggregate(self.sketch_relative_accuracy))
+            # passed=None: not sampled for verification, so there is no accuracy or fluency
+            if passed or passed is None:
+                agg["n"] += 1
+                agg["lat"] += metrics["latency_ms"]
+                agg["conf"] += metrics["confidence"]
+                agg["tok"] += metrics["tokens"]
+            if passed:
+                agg["acc_n"] += 1
+                agg["acc"] += metrics["accuracy"]
+                if metrics.get("fluency") is not None:
+                    agg["flu_n"] += 1
+                    agg["flu"] += metrics["fluency"]
+            elif passed is not None:
+                agg["penalties"] += 1
+            if failed:
+                agg["failures"] += 1
+            else:
+                # Latency percentiles describe the backend, so verification failures count too
+                agg["latency_ms"].add(metrics["latency_ms"])
+                completion_tokens = metrics.get("completion_tokens")
+                if completion_tokens and metrics["latency_ms"] > 0:
+                    agg["tokens_per_s"].add(completion_tokens / (metrics["latency_ms"] / 1000))
+                if completion_tokens is not None:
+                    agg["completion_tokens"].add(completion_tokens)
+            # Streaming timings describe the backend, not answer quality, so they count either way
+            if metrics.get("ttft_ms") is not None:
+                agg["stream_n"] += 1
+                agg["ttft"] += metrics["ttft_ms"]
+                if metrics.get("inter_token_ms") is not None:
+                    agg["itl_n"] += 1
+                    agg["itl"] += metrics["inter_token_ms"]
+            self._pending_count += 1
+
+    def _drain_queue(self):
+        while True:
+            try:
+                self._aggregate(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def flush(self):
+        with self._flush_lock:
+            self._drain_queue()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                count, self._pending_count = self._pending_count, 0
+            if not pending:
+                return 0
+            rows = [
+                (model_id, domain_id, agg["n"], agg["acc_n"], agg["acc"], agg["flu_n"], agg["flu"], agg["lat"],
+                 agg["conf"], agg["tok"], agg["penalties"], self.penalty_multiplier,
+                 agg["stream_n"], agg["ttft"], agg["itl_n"], agg["itl"], agg["failures"], self.decay_rate)
+                for (model_id, domain_id), agg in pending.items()
+            ]
+            t0 = time.monotonic()
+            try:
+                with connection() as conn:
+                    cur = conn.cursor()
+                    execute_values(cur, UPSERT_SQL, rows, template=UPSERT_TEMPLATE)
+                    self._flush_sketches(cur, pending)
+                    cur.close()
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                print(f"[METRICS WRITER] Flush failed, will retry: {e}")
+                self._restore(pending, count)
+                return 0
+            elapsed_ms = (time.monotonic() - t0) * 1000
+            self.stats["flushes"] += 1
+            self.stats["rows_flushed"] += len(rows)
+            self.stats["observations_flushed"] += count
+            self.stats["last_flush_ms"] = elapsed_ms
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+            self.stats["total_flush_ms"] += elapsed_ms
+        if self.on_flush:
+            self.on_flush()
+        return count
+
+    def _flush_sketches(self, cur, pending):
+        batch = {
+            (model_id, domain_id, metric): agg[metric]
+            for (model_id, domain_id), agg in pending.items()
+            for metric in SKETCH_METRICS
+            if agg[metric].count > 0
+        }
+        if not batch:
+            return
+        keys = sorted(batch)
+        execute_values(cur, SKETCH_KEYS_SQL, keys)
+        cur.execute(SKETCH_SELECT_SQL, tuple(map(list, zip(*keys))))
+        merged = {}
+        for row in cur.fetchall():
+            key = (row["model_id"], row["domain_id"], row["metric"])
+            sketch = DDSketch(self.sketch_relative_accuracy)
+            if row["sketch"] is not None:
+                stored = DDSketch.from_bytes(row["sketch"])
+                if stored.relative_accuracy == sketch.relative_accuracy:
+                    sketch = stored.decay(math.exp(-self.decay_rate * row["age_s"]))
+            merged[key] = sketch.merge(batch[key])
+        execute_values(
+            cur, SKETCH_UPDATE_SQL,
+            [(*key, psycopg2.Binary(sketch.to_bytes())) for key, sketch in merged.items()],
+            template="(%s::int, %s::int, %s::text, %s::bytea)"
+        )
+        percentiles = []
+        for model_id, domain_id in {(m, d) for m, d, _ in merged}:
+            latency = merged.get((model_id, domain_id, "latency_ms"))
+            tps = merged.get((model_id, domain_id, "tokens_per_s"))
+            completion_tokens = merged.get((model_id, domain_id, "completion_tokens"))
+            percentiles.append((
+                model_id, domain_id,
+                latency.quantile(0.50) if latency else None,
+                latency.quantile(0.95) if latency else None,
+                latency.quantile(0.99) if latency else None,
+                tps.quantile(0.50) if tps else None,
+                completion_tokens.quantile(0.95) if completion_tokens else None,
+            ))
+        execute_values(
+            cur, PERCENTILES_SQL, percentiles,
+            template="(%s::int, %s::int, %s::float8, %s::float8, %s::float8, %s::float8, %s::float8)"
+        )
+
+    def _restore(self, pending, count):
+        with self._lock:
+            for key, agg in pending.items():
+                current = self._pending.setdefault(key, _empty_aggregate(self.sketch_relative_accuracy))
+                for field, value in agg.items():
+                    current[field] += value
+            self._pending_count += count
+
+    def queue_depth(self):
+        return self._queue.qsize() + self._pending_count
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queue_depth"] = self.queue_depth()
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / (stats["flushes"] or 1)
+        return stats
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval_s
+        while not self._stop.is_set():
+            timeout = max(next_flush - time.monotonic(), 0)
+            try:
+                self._aggregate(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            if self._pending_count >= self.max_batch or time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_interval_s
+
+    def close(self):
+        """Stop the background thread and flush whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval_s + 1)
+        self.flush()
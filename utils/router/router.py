@@ -1,103 +1,159 @@
 import sys
 import time
-import asyncio
 from pathlib import Path
-from functools import lru_cache
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from langfuse_config.tracer import langfuse
 
 from utils.router.config import load_config
-from utils.gemini.client import GeminiClient
+from utils.gemini.client import get_gemini_client
+
+from agents.domain_classifier import aclassify_with_source
+from agents.policies import build_policy, compute_reward
+from agents.scorer import get_engine
+from utils.router.routing_table import get_routing_table
+from utils.router.metrics_writer import MetricsWriter
+from utils.router.evaluation_pool import EvaluationPool
+from db.events import get_event_sink
+from utils.cache.cache import build_cache
+from agents.inference import astream
+from agents.batcher import MicroBatcher
+from agents.generation import GenerationProfiles
+from utils.router.hedging import LatencyTracker, run_hedged
+from utils.router.load import LoadTracker, Overloaded
+from agents.model_registry import get_registry
+from utils.aio import run_sync
+
+from evaluation.judges import get_judges
 
-from db.client import get_connection
+config = load_config()
+gemini_client = get_gemini_client(config)
+judges = get_judges(config)
+routing_table = get_routing_table(config)
+metrics_writer = MetricsWriter(
+    penalty_multiplier=config["penalties"]["verification_fail_multiplier"],
+    flush_interval_s=config["metrics_writer"]["flush_interval_s"],
+    max_batch=config["metrics_writer"]["max_batch"],
+    queue_size=config["metrics_writer"]["queue_size"],
+    on_flush=routing_table.mark_stale,
+    half_life_s=config["metrics_writer"]["half_life_s"],
+    sketch_relative_accuracy=config["metrics_writer"]["sketch_relative_accuracy"],
+)
+metrics_writer.start()
+event_sink = get_event_sink(config)
+classification_cache = build_cache(config["cache"]["classification"], name="classification")
+response_cache = build_cache(config["cache"]["response"], name="response")
+evaluation_pool = EvaluationPool(
+    evaluate=lambda jobs: evaluate(jobs),
+    workers=config["evaluation"]["workers"],
+    max_queue=config["evaluation"]["max_queue"],
+    max_results=config["evaluation"]["max_results"],
+    sample_rate=config["evaluation"]["sample_rate"],
+    domain_sample_rates=config["evaluation"].get("domain_sample_rates"),
+    batch_size=config["evaluation"]["batch_size"],
+    batch_wait_ms=config["evaluation"]["batch_wait_ms"],
+)
+policy = build_policy(config["policy"], config)
+hedging = config["hedging"]
+latency_tracker = LatencyTracker(window=hedging["window"], min_samples=hedging["min_samples"])
+batcher = MicroBatcher(
+    max_batch_size=config["inference"]["batching"]["max_batch_size"],
+    max_wait_ms=config["inference"]["batching"]["max_wait_ms"],
+)
+load_tracker = LoadTracker(get_registry(config), **config["load"])
+generation_profiles = GenerationProfiles(config["generation"], routing_table)
+
+def hedge_delay_s(model):
+    """How long to wait on a model before hedging: its recent p95, floored at min_delay_ms."""
+    delay_ms = latency_tracker.percentile(model["id"], hedging["percentile"])
+    if delay_ms is None:
+        delay_ms = hedging["default_delay_ms"]
+    return max(delay_ms, hedging["min_delay_ms"]) / 1000
+
+
+async def classify(prompt: str):
+    domain = classification_cache.get(prompt)
+    if domain is None:
+        domain, source = await aclassify_with_source(prompt)
+        # Never cache the fallback domain returned when classification failed
+        classification_cache.set(prompt, domain, cacheable=source != "fallback")
+    return domain
+
+
+def update_metrics(model_id, domain_id, metrics, passed):
+    # Reward (rolling averages), penalize, or with passed=None record only judge-independent
+    # metrics; written behind in batches by metrics_writer
+    metrics_writer.record(model_id, domain_id, metrics, passed)
+
+
+def record_event(job, correct):
+    result = job["result"]
+    event_sink.record(
+        job["model_id"], job["domain_id"], job["metrics"]["latency_ms"],
+        result["prompt_tokens"], result["completion_tokens"],
+        job["cost"], not result["failed"], result["confidence"],
+        correct=correct
+    )
 
-from agents.domain_classifier import classify as raw_classify
-from agents.scorer import get_best_model
-from agents.advanced_verifier import verify as advanced_verify
-from agents.inference import run
 
-from evaluation.evaluator import judge_fluency
+def finish_evaluation(job, verdict):
+    """Apply one verdict from the batch judge to metrics, events and the trace."""
+    trace = job["trace"]
+    accuracy = verdict["accuracy"]
+    fluency = verdict["fluency"]
+    passed = verdict["passed"]
+    verify_span = trace.start_span(name="verification_and_fluency")
+    verify_span.update(
+        output={
+            "accuracy": accuracy,
+            "fluency": fluency,
+            "passed": passed
+        }
+    )
+    verify_span.end()
+
+    metrics = dict(job["metrics"], accuracy=accuracy, fluency=fluency)
+    eval_span = trace.start_span(name="metrics_summary")
+    eval_span.update(output=metrics)
+    eval_span.end()
 
-config = load_config()
-gemini_client = GeminiClient()
-
-@lru_cache(maxsize=5000)
-def classify(prompt: str):
-    return raw_classify(prompt)
-
-
-def update_metrics(conn, model_id, domain_id, metrics, passed):
-    penalties = config["penalties"]
-    multiplier = penalties["verification_fail_multiplier"]
-
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT accuracy_score, fluency_score, latency_ms, confidence,
-        tokens_per_query, usage_count, failure_count
-        FROM model_metrics
-        WHERE model_id = %s AND domain_id = %s;
-    """, (model_id, domain_id))
-    existing = cur.fetchone()
-
-    new_accuracy  = metrics["accuracy"]
-    new_fluency   = metrics["fluency"]
-    new_latency   = metrics["latency_ms"]
-    new_conf      = metrics["confidence"]
-    new_tokens    = metrics["tokens"]
-    new_failures  = 0
-
-    if passed:
-        # reward model by updating rolling averages
-        old_acc = existing["accuracy_score"]
-        old_flu = existing["fluency_score"]
-        old_lat = existing["latency_ms"]
-        old_conf= existing["confidence"]
-        old_tokens = existing["tokens_per_query"]
-        old_usage = existing["usage_count"]
-        old_failures = existing["failure_count"]
-
-        new_usage = old_usage + 1
-        updated_acc   = (old_acc   * old_usage + new_accuracy) / new_usage
-        updated_flu   = (old_flu   * old_usage + new_fluency) / new_usage
-        updated_lat   = (old_lat   * old_usage + new_latency) / new_usage
-        updated_conf  = (old_conf  * old_usage + new_conf) / new_usage
-        updated_tokens= (old_tokens* old_usage + new_tokens) / new_usage
-        cur.execute("""
-            UPDATE model_metrics
-            SET accuracy_score   = %s,
-                fluency_score    = %s,
-                latency_ms       = %s,
-                confidence       = %s,
-                tokens_per_query = %s,
-                usage_count      = usage_count + 1,
-                last_updated     = NOW()
-            WHERE model_id = %s AND domain_id = %s;
-        """, (
-            updated_acc, updated_flu, updated_lat,
-            updated_conf, updated_tokens,
-            model_id, domain_id
-        ))
-    else:
-        # penalize model by multiplying existing scores
-        cur.execute("""
-            UPDATE model_metrics
-            SET accuracy_score = accuracy_score * %s,
-                fluency_score  = fluency_score  * %s,
-                confidence     = confidence     * %s,
-                failure_count  = failure_count + 1,
-                last_updated   = NOW()
-            WHERE model_id = %s AND domain_id = %s;
-        """, (
-            multiplier, multiplier, multiplier,
-            model_id, domain_id
-        ))
-    conn.commit()
-    cur.close()
-
-
-def route(prompt, event_callback=None):
+    update_metrics(job["model_id"], job["domain_id"], metrics, passed)
+    policy.update(
+        job["model_id"], job["domain_id"],
+        compute_reward(
+            passed, metrics["latency_ms"], job["cost"], config["weights"]["latency"],
+            get_engine(config).latency_scale()
+        )
+    )
+    record_event(job, correct=passed)
+    trace.end()
+    print(f"[ROUTER] Verification complete: accuracy={accuracy} fluency={fluency} passed={passed}")
+    return {"accuracy": accuracy, "fluency": fluency, "verified": passed}
+
+
+def skip_evaluation(job):
+    """The judge was unavailable: keep the event and judge-independent metrics, leave the policy untouched."""
+    update_metrics(job["model_id"], job["domain_id"], job["metrics"], passed=None)
+    record_event(job, correct=None)
+    job["trace"].end()
+    print("[ROUTER] Verification skipped: judge unavailable")
+    return {"accuracy": None, "fluency": None, "verified": None}
+
+
+async def evaluate(jobs):
+    """Background verification of routed answers; each domain's judges score the batch together."""
+    verdicts = await judges.ajudge_batch([
+        {"domain": job["domain"], "q": job["prompt"], "output": job["text"]} for job in jobs
+    ])
+    return [
+        finish_evaluation(job, verdict) if verdict is not None else skip_evaluation(job)
+        for job, verdict in zip(jobs, verdicts)
+    ]
+
+
+async def aroute(prompt, event_callback=None, on_token=None):
+    t0 = time.time()
     trace = langfuse.start_span(
         name="route",
         input=prompt,
@@ -109,8 +165,16 @@ def route(prompt, event_callback=None):
         if event_callback:
             event_callback(message)
 
+    cached = response_cache.get(prompt)
+    if cached is not None:
+        log_event(f"[ROUTER] Served from response cache (model = {cached['model']})")
+        trace.update(output=cached)
+        trace.end()
+        return dict(cached, cached=True, timings={"total_ms": (time.time() - t0) * 1000})
+
     # Domain Classification
-    domain = classify(prompt)
+    domain = await classify(prompt)
+    t_classified = time.time()
     log_msg = f"[ROUTER] Classified domain = {domain}"
     log_event(log_msg)
     domain_span = trace.start_span(
@@ -120,43 +184,106 @@ def route(prompt, event_callback=None):
     domain_span.update(output=domain)
     domain_span.end()
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM domains WHERE name = %s;", (domain,))
-    row = cur.fetchone()
-    if not row:
+    domain_id = routing_table.domain_id(domain)
+    if domain_id is None:
         raise Exception(f"Unknown domain '{domain}'")
-    domain_id = row['id']
-
-    # Model Selection
-    model_id = get_best_model(domain_id, config)
-    cur.execute("SELECT model_name, provider FROM models WHERE id = %s", (model_id,))
-    row = cur.fetchone()
-    model_name, provider = row['model_name'], row['provider']
-    log_msg = f"[ROUTER] Selected model = {model_name}"
+
+    # Model Selection: the policy's ranking, discounted by each model's live load
+    rows = routing_table.candidates(domain_id)
+    baseline_ms = {row["id"]: row["latency_p50_ms"] or row["latency_ms"] for row in rows}
+    ranked = policy.rank(
+        domain_id, [row["id"] for row in rows],
+        penalty=lambda model_id: load_tracker.penalty(routing_table.model(model_id))
+    )
+    try:
+        candidates, admission = load_tracker.admit(
+            [routing_table.model(model_id) for model_id in ranked], hedging["max_attempts"]
+        )
+    except Overloaded as e:
+        log_event(f"[ROUTER] Shedding request: {e}")
+        trace.update(output={"error": str(e)})
+        trace.end()
+        raise
+    t_selected = time.time()
+    log_msg = f"[ROUTER] Selected model = {candidates[0]['model_name']} (policy = {policy.name})"
+    if admission == "downgraded":
+        log_msg += " (every model saturated, downgraded)"
+    if len(candidates) > 1:
+        log_msg += f" (fallbacks: {', '.join(m['model_name'] for m in candidates[1:])})"
     log_event(log_msg)
     model_span = trace.start_span(
         name="model_selection"
     )
-    model_span.update(output={"model_id": model_id, "model_name": model_name, "provider": provider})
+    model_span.update(output={"ranked": [(m["id"], m["model_name"], m["provider"]) for m in candidates]})
     model_span.end()
 
 
     # Inference
-    log_msg = f"[ROUTER] Starting inference with {model_name}..."
-    log_event(log_msg)
+    async def attempt(model):
+        t = time.time()
+        profile = generation_profiles.get(model["id"], domain_id)
+        load_tracker.begin(model["id"])
+        try:
+            if on_token is not None:
+                # Stream tokens to the caller as they arrive; verification still runs after the last one
+                attempt_result = await astream(
+                    model["model_name"], model["provider"], prompt, on_token=on_token, profile=profile
+                )
+            else:
+                # Concurrent routes to the same model share one batched vLLM request
+                attempt_result = await batcher.run(model["model_name"], model["provider"], prompt, profile)
+        finally:
+            load_tracker.end(model["id"])
+        attempt_result["latency_ms"] = (time.time() - t) * 1000
+        if not attempt_result["failed"]:
+            latency_tracker.record(model["id"], attempt_result["latency_ms"])
+            load_tracker.record_latency(model["id"], attempt_result["latency_ms"], baseline_ms.get(model["id"]))
+        return attempt_result
+
+    def on_launch(model, reason):
+        if reason == "hedges":
+            log_event(f"[ROUTER] No response within deadline, hedging with {model['model_name']}...")
+        elif reason == "failovers":
+            log_event(f"[ROUTER] Inference failed, failing over to {model['model_name']}...")
+        else:
+            log_event(f"[ROUTER] Starting inference with {model['model_name']}...")
+
+    def on_failure(model, failed):
+        # Rewards for answers only arrive for sampled requests, so failures are sampled at the
+        # same rate; otherwise zeros would outnumber them and bias the policy against failing models
+        if evaluation_pool.should_sample(domain):
+            policy.update(model["id"], domain_id, 0.0)
+        record_event({
+            "model_id": model["id"], "domain_id": domain_id, "cost": model["cost"],
+            "result": failed, "metrics": {"latency_ms": failed["latency_ms"]},
+        }, correct=None)
+
     t1 = time.time()
-    inference_span = trace.start_span(name="inference", input={"prompt": prompt, "model": model_name})
-    result = run(model_name, provider, prompt)
+    inference_span = trace.start_span(name="inference", input={"prompt": prompt, "model": candidates[0]["model_name"]})
+    model, result, attempts = await run_hedged(
+        candidates, attempt, hedge_delay_s,
+        max_attempts=hedging["max_attempts"],
+        # Once tokens have reached the caller another model cannot take over the stream,
+        # and hedging a downgraded request would only add load to saturated backends
+        max_hedges=0 if on_token is not None or admission != "admitted" else hedging["max_hedges"],
+        should_failover=lambda failed: failed.get("ttft_ms") is None,
+        on_launch=on_launch,
+        on_failure=on_failure,
+    )
     t2 = time.time()
+    model_id, model_name, provider = model["id"], model["model_name"], model["provider"]
 
 
-    latency_ms = (t2 - t1) * 1000
-    inference_span.update(output=result)
+    latency_ms = result["latency_ms"]
+    inference_span.update(output=dict(result, model=model_name, **attempts))
     inference_span.end()
     
-    log_msg = f"[ROUTER] Inference completed in {latency_ms:.2f}ms"
+    log_msg = f"[ROUTER] Inference completed by {model_name} in {latency_ms:.2f}ms"
+    if attempts["attempts"] > 1:
+        log_msg += f" ({attempts['attempts']} attempts, {(t2 - t1)*1000:.2f}ms total)"
     log_event(log_msg)
+    if result.get("ttft_ms") is not None:
+        log_event(f"[ROUTER] Time to first token {result['ttft_ms']:.2f}ms")
 
     text = result["response_text"]
     confidence = result["confidence"]
@@ -167,60 +294,62 @@ def route(prompt, event_callback=None):
 
     print(f"[INFERENCE] Total inference time: {latency_ms:.2f} ms")
 
-    async def evaluate_parallel():
-        task_verify = asyncio.create_task(
-            advanced_verify(prompt, text)
-        )
-        task_fluency = asyncio.create_task(
-            judge_fluency(text)
-        )
-        verify_result = await task_verify
-        fluency_score = await task_fluency
-        return verify_result, fluency_score
-
-    verify_span = trace.start_span(name="verification_and_fluency")
-    verify_result, fluency_score = asyncio.run(evaluate_parallel())
-
-    accuracy = verify_result["accuracy"]
-    fluency = fluency_score
-    passed = verify_result["passed"]
-    verify_span.update(
-        output={
-            "accuracy": accuracy,
-            "fluency": fluency,
-            "passed": passed
-        }
-    )
-    verify_span.end()
-
     metrics = {
-        "accuracy": accuracy,
-        "fluency": fluency,
         "confidence": confidence,
         "latency_ms": latency_ms,
-        "tokens": tokens
+        "tokens": tokens,
+        "completion_tokens": result["completion_tokens"],
+        "ttft_ms": result.get("ttft_ms"),
+        "inter_token_ms": result.get("inter_token_ms")
     }
 
-    eval_span = trace.start_span(name="metrics_summary")
-    eval_span.update(output=metrics)
-    eval_span.end()
-
-
-    # Update metrics (reward or penalize)
-    update_metrics(conn, model_id, domain_id, metrics, passed)
-
-    trace.end()
-
-    conn.close()
-
-    return {
+    # Verification, fluency and metric updates happen off the critical path
+    job = {
+        "trace": trace,
+        "prompt": prompt,
+        "domain": domain,
+        "text": text,
+        "model_id": model_id,
+        "domain_id": domain_id,
+        "cost": model["cost"],
+        "result": result,
+        "metrics": metrics,
+    }
+    verification_id, verification_status = evaluation_pool.submit(domain, job)
+    log_event(f"[ROUTER] Verification {verification_status}")
+    if verification_id is None:
+        # Not judged, but latency, tokens and timings still describe the model
+        update_metrics(model_id, domain_id, metrics, passed=None)
+        record_event(job, correct=None)
+        trace.end()
+
+    response = {
         "domain": domain,
         "model": model_name,
         "provider": provider,
         "output": text,
         "metrics": metrics,
-        "verified": passed
+        "verified": None,
+        "verification_id": verification_id,
+        "verification_status": verification_status,
+        "attempts": attempts,
+        "admission": admission,
+        # Wall time per pipeline stage, for load tests and latency breakdowns
+        "timings": {
+            "classification_ms": (t_classified - t0) * 1000,
+            "selection_ms": (t_selected - t_classified) * 1000,
+            "inference_ms": (t2 - t1) * 1000,
+            "total_ms": (time.time() - t0) * 1000,
+        }
     }
+    # Failed or empty inferences are not cached so the next request retries them
+    response_cache.set(prompt, response, cacheable=not result["failed"] and bool(text))
+    return response
+
+
+def route(prompt, event_callback=None, on_token=None):
+    # Synchronous entry point: runs aroute() on the process-wide event loop
+    return run_sync(aroute(prompt, event_callback=event_callback, on_token=on_token))
 
 
 if __name__ == "__main__":
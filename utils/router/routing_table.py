@@ -0,0 +1,222 @@
+import sys
+import time
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from db.client import cursor
+
+# Defaults used by the scorer when a model has no metrics row for a domain yet
+METRIC_DEFAULTS = {
+    "accuracy_score": 0.5,
+    "fluency_score": 0.5,
+    "confidence": 0.5,
+    "latency_ms": 1000,
+}
+
+METRIC_COLUMNS = """
+    model_id, domain_id, accuracy_score, fluency_score, latency_ms, confidence, tokens_per_query,
+    usage_count, failure_count, latency_p50_ms, latency_p95_ms, latency_p99_ms, tokens_per_s_p50,
+    completion_tokens_p95, last_updated
+"""
+
+# Percentile columns are None until the metrics writer has flushed a latency sketch
+PERCENTILE_COLUMNS = (
+    "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "tokens_per_s_p50", "completion_tokens_p95"
+)
+
+# Rows written in a transaction that began before the last watermark can commit after it,
+# so each incremental refresh re-reads a small overlap window. Re-applying a row is idempotent.
+WATERMARK_OVERLAP_S = 5
+
+
+class RoutingTable:
+    """In-process copy of domains, models and model_metrics used on the routing hot path."""
+
+    def __init__(self, refresh_interval_s=30):
+        self.refresh_interval_s = refresh_interval_s
+        self.version = 0
+        self._lock = threading.RLock()
+        self._domains_by_name = {}
+        self._domains_by_id = {}
+        self._models = {}
+        self._metrics = {}  # (model_id, domain_id) -> row
+        self._watermark = None
+        self._loaded = False
+        self._stale = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"full_loads": 0, "refreshes": 0, "rows_refreshed": 0, "errors": 0}
+
+    def load(self):
+        with cursor() as cur:
+            cur.execute("SELECT id, name FROM domains;")
+            domains = cur.fetchall()
+            cur.execute("SELECT id, model_name, provider, cost FROM models;")
+            models = cur.fetchall()
+            cur.execute(f"SELECT {METRIC_COLUMNS} FROM model_metrics;")
+            metrics = cur.fetchall()
+        with self._lock:
+            self._set_catalog(domains, models)
+            self._metrics = {}
+            self._apply_metrics(metrics)
+            self._loaded = True
+            self.version += 1
+            self.stats["full_loads"] += 1
+
+    def refresh(self):
+        """Reload the catalog and pick up metrics rows changed since the watermark."""
+        if not self._loaded:
+            return self.load()
+        with cursor() as cur:
+            cur.execute("SELECT id, name FROM domains;")
+            domains = cur.fetchall()
+            cur.execute("SELECT id, model_name, provider, cost FROM models;")
+            models = cur.fetchall()
+            if self._watermark is None:
+                cur.execute(f"SELECT {METRIC_COLUMNS} FROM model_metrics;")
+            else:
+                cur.execute(f"""
+                    SELECT {METRIC_COLUMNS} FROM model_metrics
+                    WHERE last_updated > %s - make_interval(secs => %s);
+                """, (self._watermark, WATERMARK_OVERLAP_S))
+            metrics = cur.fetchall()
+        with self._lock:
+            catalog_changed = self._set_catalog(domains, models)
+            metrics_changed = self._apply_metrics(metrics)
+            if catalog_changed or metrics_changed:
+                self.version += 1
+            self.stats["refreshes"] += 1
+            self.stats["rows_refreshed"] += len(metrics)
+
+    def _set_catalog(self, domains, models):
+        domains_by_id = {row["id"]: row["name"] for row in domains}
+        models_by_id = {
+            row["id"]: {
+                "id": row["id"],
+                "model_name": row["model_name"],
+                "provider": row["provider"],
+                "cost": row["cost"] or 0.0,
+            }
+            for row in models
+        }
+        changed = domains_by_id != self._domains_by_id or models_by_id != self._models
+        self._domains_by_id = domains_by_id
+        self._domains_by_name = {name: domain_id for domain_id, name in domains_by_id.items()}
+        self._models = models_by_id
+        return changed
+
+    def _apply_metrics(self, rows):
+        changed = False
+        for row in rows:
+            key = (row["model_id"], row["domain_id"])
+            row = dict(row)
+            if self._metrics.get(key) != row:
+                self._metrics[key] = row
+                changed = True
+            if self._watermark is None or row["last_updated"] > self._watermark:
+                self._watermark = row["last_updated"]
+        return changed
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def domain_id(self, name):
+        self.ensure_loaded()
+        return self._domains_by_name.get(name)
+
+    def domain_name(self, domain_id):
+        self.ensure_loaded()
+        return self._domains_by_id.get(domain_id)
+
+    def domain_names(self):
+        self.ensure_loaded()
+        return list(self._domains_by_name)
+
+    def model(self, model_id):
+        self.ensure_loaded()
+        return self._models.get(model_id)
+
+    def model_by_name(self, model_name):
+        self.ensure_loaded()
+        for model in self._models.values():
+            if model["model_name"] == model_name:
+                return model
+        return None
+
+    def metrics(self, model_id, domain_id):
+        """The raw model_metrics row for the pair, or None if the model has not served the domain yet."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._metrics.get((model_id, domain_id))
+
+    def candidates(self, domain_id):
+        """Every model with its metrics for the domain, defaults filled in for missing rows."""
+        self.ensure_loaded()
+        with self._lock:
+            rows = []
+            for model_id, model in self._models.items():
+                metrics = self._metrics.get((model_id, domain_id)) or {}
+                row = dict(model)
+                for key, default in METRIC_DEFAULTS.items():
+                    value = metrics.get(key)
+                    row[key] = default if value is None else value
+                row["tokens_per_query"] = metrics.get("tokens_per_query")
+                row["usage_count"] = metrics.get("usage_count") or 0
+                for key in PERCENTILE_COLUMNS:
+                    row[key] = metrics.get(key)
+                rows.append(row)
+            return rows
+
+    def snapshot(self):
+        """(version, {domain_id: candidates}) read under one lock, for consumers that score every domain."""
+        self.ensure_loaded()
+        with self._lock:
+            return self.version, {domain_id: self.candidates(domain_id) for domain_id in self._domains_by_id}
+
+    def mark_stale(self):
+        """Ask the refresher to pick up new metrics now instead of waiting for the interval."""
+        self._stale.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="routing-table-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._stale.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self._stale.wait(self.refresh_interval_s)
+            self._stale.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[ROUTING TABLE] Refresh failed: {e}")
+                time.sleep(1)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+def get_routing_table(config=None):
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                settings = (config or {}).get("routing_table", {})
+                table = RoutingTable(refresh_interval_s=settings.get("refresh_interval_s", 30))
+                table.load()
+                table.start()
+                _table = table
+    return _table
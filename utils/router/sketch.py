@@ -0,0 +1,103 @@
+import math
+import struct
+
+# Values at or below this are counted in the zero bucket (DDSketch only indexes positive values)
+MIN_VALUE = 1e-9
+
+HEADER = struct.Struct("<BdddI")  # version, relative accuracy, count, zero count, number of bins
+BIN = struct.Struct("<if")        # bucket key, weight
+VERSION = 1
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees (Masson et al., DDSketch).
+
+    Values fall into logarithmic buckets of width gamma = (1 + a) / (1 - a), so any quantile is
+    returned within relative accuracy `a`. Weights are floats, which lets the sketch decay
+    exponentially: scale it down with decay() and old observations fade out.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}  # bucket key -> weight
+        self.count = 0.0
+        self.zero_count = 0.0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, weight=1.0):
+        if value <= MIN_VALUE:
+            self.zero_count += weight
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0.0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += weight
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, weight in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0.0) + weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    __iadd__ = merge
+
+    def _collapse(self):
+        # Fold the lowest buckets together; only the smallest quantiles lose accuracy
+        keys = sorted(self.bins)
+        overflow = keys[:len(keys) - self.max_bins + 1]
+        folded = sum(self.bins.pop(key) for key in overflow)
+        self.bins[overflow[-1]] = self.bins.get(overflow[-1], 0.0) + folded
+
+    def decay(self, factor, prune_below=1e-3):
+        """Scale every weight by `factor` (e.g. 0.5 after one half-life) and drop negligible buckets."""
+        self.bins = {key: weight * factor for key, weight in self.bins.items() if weight * factor >= prune_below}
+        self.zero_count *= factor
+        self.count = self.zero_count + sum(self.bins.values())
+        return self
+
+    def quantile(self, q):
+        if self.count <= 0:
+            return None
+        rank = q * self.count
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                return self._value(key)
+        return self._value(max(self.bins)) if self.bins else 0.0
+
+    def to_bytes(self):
+        """Compact binary form: a 29-byte header plus 8 bytes per non-empty bucket."""
+        parts = [HEADER.pack(VERSION, self.relative_accuracy, self.count, self.zero_count, len(self.bins))]
+        parts.extend(BIN.pack(key, weight) for key, weight in sorted(self.bins.items()))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, max_bins=2048):
+        data = bytes(data)
+        version, relative_accuracy, count, zero_count, n_bins = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        sketch = cls(relative_accuracy, max_bins=max_bins)
+        sketch.count = count
+        sketch.zero_count = zero_count
+        for i in range(n_bins):
+            key, weight = BIN.unpack_from(data, HEADER.size + i * BIN.size)
+            sketch.bins[key] = weight
+        return sketch